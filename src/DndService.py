@@ -1,9 +1,12 @@
+import asyncio
 import logging
-from typing import Dict, List
+import os
+from typing import Dict, List, Optional
 
 import aiohttp
 
 from model.APIResource import APIResource
+from srd_cache import SRD_CACHE
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +15,21 @@ class DndService:
     DOMAIN = "https://www.dnd5eapi.co"
     API = "https://www.dnd5eapi.co/api"
 
+    # Connection tuning, every value can be overridden with an environment variable
+    TOTAL_TIMEOUT = float(os.getenv("DND_API_TOTAL_TIMEOUT", "20"))
+    CONNECT_TIMEOUT = float(os.getenv("DND_API_CONNECT_TIMEOUT", "5"))
+    READ_TIMEOUT = float(os.getenv("DND_API_READ_TIMEOUT", "15"))
+    CONNECTIONS_LIMIT = int(os.getenv("DND_API_CONNECTIONS_LIMIT", "100"))
+    CONNECTIONS_PER_HOST_LIMIT = int(os.getenv("DND_API_CONNECTIONS_PER_HOST_LIMIT", "20"))
+    DNS_CACHE_TTL = int(os.getenv("DND_API_DNS_CACHE_TTL", "600"))
+    KEEPALIVE_TIMEOUT = float(os.getenv("DND_API_KEEPALIVE_TIMEOUT", "60"))
+
+    # Application-lifetime session shared by every DndService instance
+    _shared_session: Optional[aiohttp.ClientSession] = None
+
+    # Local SRD snapshot (srd_snapshot.SrdSnapshot). When set, every request is answered offline from it
+    snapshot = None
+
     def __init__(self):
         """
         Initialize the DndService with the base API URL, payload, and headers.
@@ -22,23 +40,76 @@ class DndService:
             'Accept': 'application/json'
         }
         self.__session = None
+        self.__owns_session = False
+
+    @classmethod
+    def create_session(cls) -> aiohttp.ClientSession:
+        """
+        Create an aiohttp session with a pooled, keep-alive connector and the configured timeouts.
+
+        Returns:
+            aiohttp.ClientSession: The new session.
+        """
+        connector = aiohttp.TCPConnector(
+            limit=cls.CONNECTIONS_LIMIT,
+            limit_per_host=cls.CONNECTIONS_PER_HOST_LIMIT,
+            ttl_dns_cache=cls.DNS_CACHE_TTL,
+            keepalive_timeout=cls.KEEPALIVE_TIMEOUT
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=cls.TOTAL_TIMEOUT,
+            connect=cls.CONNECT_TIMEOUT,
+            sock_read=cls.READ_TIMEOUT
+        )
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    @classmethod
+    async def open_shared_session(cls) -> None:
+        """
+        Open the session shared by every DndService instance.
+        It must be called from a running event loop, usually in the application post_init.
+        """
+        if cls._shared_session is None or cls._shared_session.closed:
+            cls._shared_session = cls.create_session()
+            logger.info("DndService shared session opened")
+
+    @classmethod
+    async def close_shared_session(cls) -> None:
+        """
+        Close the session shared by every DndService instance, usually in the application post_stop.
+        """
+        if cls._shared_session is not None and not cls._shared_session.closed:
+            await cls._shared_session.close()
+            logger.info("DndService shared session closed")
+        cls._shared_session = None
 
     async def __aenter__(self):
         """
-        Async context manager entry. Initialize the aiohttp session.
+        Async context manager entry. Use the shared aiohttp session if it's open,
+        otherwise initialize a session owned by this instance.
         """
-        self.__session = aiohttp.ClientSession()
+        if DndService._shared_session is not None and not DndService._shared_session.closed:
+            self.__session = DndService._shared_session
+            self.__owns_session = False
+        else:
+            self.__session = self.create_session()
+            self.__owns_session = True
         return self
 
     async def __aexit__(self, exc_type, exc_value, traceback):
         """
-        Async context manager exit. Close the aiohttp session.
+        Async context manager exit. Close the aiohttp session only if it's owned by this instance.
         """
-        await self.__session.close()
+        if self.__owns_session:
+            await self.__session.close()
+        self.__session = None
 
     async def __do_get(self, url: str) -> Dict:
         """
         Fetch data from a specific API URL.
+        If a local snapshot is loaded and contains the URL the response comes from it, otherwise responses
+        are served from the SRD cache while fresh, revalidated with their ETag once expired
+        and served stale if the API is unreachable.
 
         Args:
             url (str): The API URL to fetch data from.
@@ -46,10 +117,37 @@ class DndService:
         Returns:
             dict: The JSON response from the API.
         """
-        async with self.__session.get(url, headers=self.__headers) as response:
-            response.raise_for_status()
-            response = await response.json()
-            return response
+        if DndService.snapshot is not None:
+            try:
+                return DndService.snapshot.get_document(url)
+            except LookupError as e:
+                # e.g. a resource added to the SRD after the import, ask the API
+                logger.info(f"{e}, requesting it to the API")
+
+        key = SRD_CACHE.make_key(url)
+        cache_entry = SRD_CACHE.get(key)
+        if cache_entry is not None and SRD_CACHE.is_fresh(cache_entry):
+            return cache_entry.value
+
+        headers = dict(self.__headers)
+        if cache_entry is not None and cache_entry.etag:
+            headers['If-None-Match'] = cache_entry.etag
+
+        try:
+            async with self.__session.get(url, headers=headers) as response:
+                if response.status == 304 and cache_entry is not None:
+                    SRD_CACHE.refresh(key)
+                    return cache_entry.value
+
+                response.raise_for_status()
+                data = await response.json()
+                SRD_CACHE.set(key, data, response.headers.get('ETag'))
+                return data
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if cache_entry is None:
+                raise
+            logger.warning(f"Serving stale SRD content for {url}: {e}")
+            return SRD_CACHE.serve_stale(cache_entry)
 
     async def get_all_resources(self) -> Dict:
         """
@@ -0,0 +1,95 @@
+"""
+Micro-benchmark of the bag operations of a Character holding thousands of items.
+
+Usage, from the repository root:
+    python -m src.benchmarks.bag --items 5000
+"""
+import argparse
+import random
+import timeit
+from typing import List
+
+from src.character_creator.models.Character import Character
+from src.character_creator.models.Item import Item
+
+
+class LegacyBag:
+    """The bag used before, kept as the baseline: a list scanned on every operation."""
+
+    def __init__(self):
+        self.bag: List[Item] = []
+        self.encumbrance = 0
+
+    def add_item(self, item: Item):
+        for existing_item in self.bag:
+            if existing_item == item:
+                existing_item.quantity += item.quantity
+                self.encumbrance += item.weight * item.quantity
+                return
+
+        self.bag.append(item)
+        self.encumbrance += item.weight * item.quantity
+
+    def increment_item_quantity(self, item_name: str, quantity: int = 1):
+        for item in self.bag:
+            if item.name == item_name:
+                item.quantity += quantity
+                self.encumbrance += item.weight * quantity
+                return
+
+    def decrement_item_quantity(self, item: str, quantity: int = 1):
+        for existing_item in self.bag:
+            if existing_item.name == item:
+                if existing_item.quantity > quantity:
+                    existing_item.quantity -= quantity
+                    self.encumbrance -= existing_item.weight * quantity
+                else:
+                    self.bag.remove(existing_item)
+                    self.encumbrance -= existing_item.weight * existing_item.quantity
+                break
+
+    def get_item(self, item_name: str):
+        return next((item for item in self.bag if item_name == item.name), None)
+
+
+def fill(bag, names: List[str]) -> None:
+    for name in names:
+        bag.add_item(Item(name, quantity=2, weight=1))
+
+
+def run_operations(bag, names: List[str]) -> None:
+    """A session of the bag menu: look up an item, add one, remove one."""
+    for name in names:
+        bag.get_item(name)
+        bag.increment_item_quantity(name)
+        bag.decrement_item_quantity(name)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the bag operations of a character")
+    parser.add_argument('--items', type=int, default=5000, help="Number of different items in the bag")
+    parser.add_argument('--operations', type=int, default=1000, help="Items looked up, incremented and decremented")
+    parser.add_argument('--number', type=int, default=5, help="Times every measure is repeated")
+    args = parser.parse_args()
+
+    names = [f"item {i}" for i in range(args.items)]
+    targets = random.choices(names, k=args.operations)
+
+    print(f"{'operation':<20} {'legacy ms':>10} {'new ms':>8} {'speedup':>8}")
+
+    legacy = timeit.timeit(lambda: fill(LegacyBag(), names), number=args.number) / args.number
+    new = timeit.timeit(lambda: fill(Character(), names), number=args.number) / args.number
+    print(f"{'fill':<20} {legacy * 1000:>10.3f} {new * 1000:>8.3f} {legacy / new:>7.1f}x")
+
+    legacy_bag, character = LegacyBag(), Character()
+    fill(legacy_bag, names)
+    fill(character, names)
+    legacy = timeit.timeit(lambda: run_operations(legacy_bag, targets), number=args.number) / args.number
+    new = timeit.timeit(lambda: run_operations(character, targets), number=args.number) / args.number
+    print(f"{'lookup/inc/dec':<20} {legacy * 1000:>10.3f} {new * 1000:>8.3f} {legacy / new:>7.1f}x")
+
+    assert legacy_bag.encumbrance == character.encumbrance
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Micro-benchmark of the dice rolls: the randint loop of the dice menu against dice_roller.DiceRoller.
+
+Usage, from the src directory:
+    python -m benchmarks.dice --number 200
+"""
+import argparse
+import timeit
+from random import randint
+from typing import List
+
+from dice_roller import MAX_EXPLOSIONS, DiceRoller, parse_dice_expression
+
+EXPRESSIONS = ['1d20+5', '8d6+3', '1000d6', '100x4d6kh3', '20d10!']
+
+
+def legacy_roll(expression: str) -> List[int]:
+    """The loop used by the dice menu, extended with keep highest and explosions: one randint call per die."""
+    parsed = parse_dice_expression(expression)
+    totals = []
+    for _ in range(parsed.repetitions):
+        total = parsed.modifier
+        for term in parsed.terms:
+            rolls = []
+            for _ in range(term.count):
+                roll = last = randint(1, term.sides)
+                explosions = 0
+                while term.explode and last == term.sides and explosions < MAX_EXPLOSIONS:
+                    last = randint(1, term.sides)
+                    roll += last
+                    explosions += 1
+                rolls.append(roll)
+            if term.keep:
+                mode, amount = term.keep
+                rolls = sorted(rolls, reverse=mode == 'h')[:amount]
+            total += term.sign * sum(rolls)
+        totals.append(total)
+    return totals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the dice rolls")
+    parser.add_argument('--number', type=int, default=200, help="Rolls timed for each expression")
+    args = parser.parse_args()
+
+    roller = DiceRoller(seed=0)
+    print(f"{'expression':<15} {'dice':>7} {'legacy ms':>10} {'numpy ms':>9} {'speedup':>8}")
+    for expression in EXPRESSIONS:
+        parsed = parse_dice_expression(expression)
+        legacy = timeit.timeit(lambda: legacy_roll(expression), number=args.number) / args.number
+        new = timeit.timeit(lambda: roller.evaluate(parsed), number=args.number) / args.number
+        print(f"{expression:<15} {parsed.dice_count:>7} {legacy * 1000:>10.3f} {new * 1000:>9.3f} "
+              f"{legacy / new:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Micro-benchmark of util.split_html_text over the biggest SRD entries.
+
+Usage, from the src directory:
+    python -m benchmarks.split_text --snapshot files/srd_snapshot.sqlite
+
+Without a snapshot (see srd_snapshot.py) a synthetic monster page is used.
+"""
+import argparse
+import re
+import timeit
+from typing import List, Tuple
+
+from graphql_queries import CATEGORY_TO_QUERY_MAP
+from model import models
+from srd_snapshot import SrdSnapshot
+from util import split_html_text
+
+CATEGORY_MODELS = {
+    'monsters': models.Monster,
+    'classes': models.Class,
+    'spells': models.Spell,
+    'races': models.Race
+}
+
+
+def legacy_split_html_text(text: str, max_length: int = 4096) -> List[str]:
+    """The splitter used before, kept as the baseline: regex compiled on each call and string concatenation."""
+    if len(text) <= max_length:
+        return [text]
+
+    tag_regex = re.compile(r'(<!--.*?-->|<[^>]*>)')
+    chunks = []
+    current_chunk = ""
+    current_length = 0
+    open_tags = []
+
+    for part in tag_regex.split(text):
+        if not part:
+            continue
+
+        if part.startswith('<') and part.endswith('>'):
+            tag_name = part[1:-1].split(' ')[0].replace('/', '')
+
+            if current_length + len(part) > max_length:
+                chunks.append(current_chunk + ''.join([f"</{tag}>" for tag in open_tags[::-1]]))
+                current_chunk = ''.join([f"<{tag}>" for tag in open_tags])
+                current_length = len(current_chunk)
+
+            if part.startswith('</'):
+                if open_tags and open_tags[-1] == tag_name:
+                    open_tags.pop()
+            elif not part.endswith('/>'):
+                open_tags.append(tag_name)
+
+            current_chunk += part
+            current_length += len(part)
+        else:
+            while len(part) > 0:
+                remaining_length = max_length - current_length
+                if len(part) <= remaining_length:
+                    current_chunk += part
+                    current_length += len(part)
+                    part = ""
+                else:
+                    split_point = part.rfind(' ', 0, remaining_length)
+                    if split_point == -1:
+                        split_point = remaining_length
+
+                    current_chunk += part[:split_point]
+                    part = part[split_point:].strip()
+
+                    chunks.append(current_chunk + ''.join([f"</{tag}>" for tag in open_tags[::-1]]))
+                    current_chunk = ''.join([f"<{tag}>" for tag in open_tags])
+                    current_length = len(current_chunk)
+
+    if current_chunk:
+        chunks.append(current_chunk + ''.join([f"</{tag}>" for tag in open_tags[::-1]]))
+
+    return chunks
+
+
+def load_biggest_entries(snapshot_path: str, count: int) -> List[Tuple[str, str]]:
+    """Render every entry of the categories in CATEGORY_MODELS and return the biggest ones."""
+    snapshot = SrdSnapshot(snapshot_path)
+    entries = []
+    for category, model in CATEGORY_MODELS.items():
+        query = CATEGORY_TO_QUERY_MAP[category]
+        for index in snapshot.get_graphql_indexes(category):
+            data = snapshot.get_graphql(query, {'index': index})
+            key = next(iter(data))
+            entries.append((f"{category}/{index}", str(model(**data[key]))))
+    snapshot.close()
+
+    entries.sort(key=lambda entry: len(entry[1]), reverse=True)
+    return entries[:count]
+
+
+def synthetic_entry(sections: int = 120) -> Tuple[str, str]:
+    """A long monster-like page, used when no snapshot is available."""
+    section = ("<b>Multiattack.</b> The dragon can use its <i>Frightful Presence</i>. It then makes three attacks: "
+               "one with its bite and two with its claws &amp; tail.\n<blockquote>Bite. <i>Melee Weapon Attack:</i> "
+               "+14 to hit, reach 10 ft., one target. <b>Hit: 19 (2d10 + 8) piercing damage plus 9 (2d8) fire "
+               "damage.</b></blockquote>\n")
+    return 'synthetic/dragon', f"<b>Ancient Red Dragon</b>\n{section * sections}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the HTML message splitter")
+    parser.add_argument('--snapshot', default=None, help="SRD snapshot used to find the biggest entries")
+    parser.add_argument('--entries', type=int, default=10, help="Number of entries benchmarked")
+    parser.add_argument('--number', type=int, default=200, help="Splits timed for each entry")
+    args = parser.parse_args()
+
+    entries = load_biggest_entries(args.snapshot, args.entries) if args.snapshot else [synthetic_entry()]
+
+    print(f"{'entry':<40} {'chars':>8} {'chunks':>7} {'legacy ms':>10} {'new ms':>8} {'speedup':>8}")
+    for name, text in entries:
+        legacy = timeit.timeit(lambda: legacy_split_html_text(text), number=args.number) / args.number
+        new = timeit.timeit(lambda: split_html_text(text), number=args.number) / args.number
+        print(f"{name:<40} {len(text):>8} {len(split_html_text(text)):>7} {legacy * 1000:>10.3f} "
+              f"{new * 1000:>8.3f} {legacy / new:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
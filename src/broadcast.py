@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Union
+
+from telegram import Bot
+from telegram.constants import ParseMode
+from telegram.error import RetryAfter, Forbidden, BadRequest, TelegramError
+
+logger = logging.getLogger(__name__)
+
+# Telegram limits: about 30 messages per second overall and 1 message per second in the same chat
+GLOBAL_MESSAGES_PER_SECOND = 30
+CHAT_MESSAGES_PER_SECOND = 1
+# Maximum number of messages being sent at the same time
+BROADCAST_CONCURRENCY = 10
+# Maximum number of attempts after a RetryAfter
+BROADCAST_MAX_RETRIES = 3
+# Number of messages between two progress logs
+BROADCAST_PROGRESS_STEP = 100
+
+# BadRequest messages meaning that the chat doesn't exist anymore
+UNREACHABLE_CHAT_ERRORS = ('chat not found', 'user not found', 'chat_write_forbidden', 'user is deactivated')
+
+
+class TokenBucket:
+    """Token bucket rate limiter: up to `capacity` tokens, refilled at `rate` tokens per second."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.__tokens = self.capacity
+        self.__updated_at = time.monotonic()
+        self.__lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and consume it."""
+        async with self.__lock:
+            while True:
+                now = time.monotonic()
+                self.__tokens = min(self.capacity, self.__tokens + (now - self.__updated_at) * self.rate)
+                self.__updated_at = now
+
+                if self.__tokens >= 1:
+                    self.__tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.__tokens) / self.rate)
+
+
+@dataclass
+class BroadcastReport:
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    pruned: List[int] = field(default_factory=list)
+    retries: int = 0
+    elapsed: float = 0
+
+    def __str__(self):
+        return (f"📣 <b>Broadcast completato</b> in {self.elapsed:.1f}s\n"
+                f"Chat totali: {self.total}\n"
+                f"Inviati: {self.sent}\n"
+                f"Falliti: {self.failed}\n"
+                f"Chat rimosse: {len(self.pruned)}\n"
+                f"Retry per flood control: {self.retries}")
+
+
+def _retry_after_seconds(retry_after: Union[int, timedelta]) -> float:
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+async def broadcast_message(bot: Bot, chat_ids: Iterable[int], text: str,
+                            parse_mode: Optional[str] = None) -> BroadcastReport:
+    """
+    Send the same message to many chats, respecting the Telegram global and per-chat limits.
+    Chats that blocked the bot or don't exist anymore are reported in BroadcastReport.pruned.
+
+    Args:
+        bot (Bot): The bot used to send the messages.
+        chat_ids (Iterable[int]): The recipients.
+        text (str): The message text.
+        parse_mode (str): Optional parse mode of the message.
+
+    Returns:
+        BroadcastReport: The summary of the broadcast.
+    """
+    chat_ids = list(chat_ids)
+    report = BroadcastReport(total=len(chat_ids))
+    global_bucket = TokenBucket(GLOBAL_MESSAGES_PER_SECOND)
+    chat_buckets: Dict[int, TokenBucket] = {}
+    semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+    started_at = time.monotonic()
+
+    async def send(chat_id: int) -> None:
+        chat_bucket = chat_buckets.setdefault(chat_id, TokenBucket(CHAT_MESSAGES_PER_SECOND))
+
+        async with semaphore:
+            for attempt in range(BROADCAST_MAX_RETRIES + 1):
+                await global_bucket.acquire()
+                await chat_bucket.acquire()
+                try:
+                    await bot.send_message(chat_id, text, parse_mode=parse_mode)
+                    report.sent += 1
+                    break
+                except RetryAfter as e:
+                    report.retries += 1
+                    if attempt == BROADCAST_MAX_RETRIES:
+                        logger.error(f"CHAT_ID: {chat_id} flood control exceeded too many times")
+                        report.failed += 1
+                        break
+                    await asyncio.sleep(_retry_after_seconds(e.retry_after))
+                except Forbidden as e:
+                    logger.warning(f"CHAT_ID: {chat_id} the bot can't write in the chat anymore: {e}")
+                    report.pruned.append(chat_id)
+                    break
+                except BadRequest as e:
+                    if any(error in e.message.lower() for error in UNREACHABLE_CHAT_ERRORS):
+                        report.pruned.append(chat_id)
+                    else:
+                        report.failed += 1
+                    logger.error(f"CHAT_ID: {chat_id} Telegram error during the broadcast: {e}")
+                    break
+                except TelegramError as e:
+                    logger.error(f"CHAT_ID: {chat_id} Telegram error during the broadcast: {e}")
+                    report.failed += 1
+                    break
+
+        done = report.sent + report.failed + len(report.pruned)
+        if done % BROADCAST_PROGRESS_STEP == 0:
+            logger.info(f"Broadcast progress: {done}/{report.total}")
+
+    await asyncio.gather(*(send(chat_id) for chat_id in chat_ids))
+    report.elapsed = time.monotonic() - started_at
+    logger.info(f"Broadcast completed: {report.sent} sent, {report.failed} failed, {len(report.pruned)} pruned "
+                f"in {report.elapsed:.1f}s")
+
+    return report
+
+
+async def send_broadcast_report(bot: Bot, dev_chat_id: Optional[str], report: BroadcastReport) -> None:
+    """Send the broadcast summary to the developer chat."""
+    if not dev_chat_id:
+        return
+
+    try:
+        await bot.send_message(dev_chat_id, str(report), parse_mode=ParseMode.HTML)
+    except TelegramError as e:
+        logger.error(f"Unable to send the broadcast report: {e}")
@@ -68,6 +68,8 @@ TEMP_ABILITY_KEY = 'temp_ability'
 TEMP_HEALING_KEY = 'temp_healing'
 CURRENT_SPELL_KEY = 'current_spell'
 LAST_MENU_MESSAGES = 'last_menu_message'
+# Maximum number of menu messages tracked for each user as (chat_id, message_id)
+LAST_MENU_MESSAGES_MAX_LENGTH = 100
 # Keys to store the data allowing a rollback in the case user use /stop command before ending the multiclass deleting
 PENDING_REASSIGNMENT = 'pending_reassignment'
 REMOVED_CLASS_LEVEL = 'removed_class_level'
@@ -8,7 +8,7 @@ from src.util import chunk_list
 from . import *
 from .models import Character, Ability
 from .models.Ability import RestorationType
-from .utilities import send_and_save_message, generate_abilities_list_keyboard
+from .utilities import send_and_save_message, generate_abilities_list_keyboard, save_message
 
 
 async def create_abilities_menu(character: Character, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -122,7 +122,7 @@ async def character_abilities_menu_query_handler(update: Update, context: Contex
         await query.answer()
         _, ability_name = data.split('|', maxsplit=1)
         character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
-        ability: Ability = next((ability for ability in character.abilities if ability.name == ability_name), None)
+        ability: Ability = character.get_ability(ability_name)
 
         message_str, reply_markup = create_ability_menu(ability)
         await query.edit_message_text(message_str, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
@@ -238,7 +238,7 @@ async def character_ability_new_query_handler(update: Update, context: ContextTy
 
 async def character_ability_text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     ability_info = update.effective_message.text
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(update.effective_message)
+    save_message(context, update.effective_message)
 
     try:
         ability_name, ability_desc, ability_max_uses = ability_info.split("#", 2)
@@ -319,7 +319,7 @@ async def character_ability_insert_query_handler(update: Update, context: Contex
     )
     character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
 
-    if any(ability_name == ability.name for ability in character.abilities):
+    if character.get_ability(ability_name):
         await send_and_save_message(
             update,
             context,
@@ -336,7 +336,7 @@ async def character_ability_insert_query_handler(update: Update, context: Contex
 
 async def character_ability_edit_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     ability_info = update.effective_message.text
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(update.effective_message)
+    save_message(context, update.effective_message)
 
     try:
         ability_name, ability_desc, ability_max_uses = ability_info.split("#", 2)
@@ -367,12 +367,7 @@ async def character_ability_edit_handler(update: Update, context: ContextTypes.D
     old_ability: Ability = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_ABILITY_KEY]
     character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
 
-    for ability in character.abilities:
-        if ability == old_ability:
-            ability.name = ability_name
-            ability.description = ability_desc
-            ability.max_uses = int(ability_max_uses)
-            break
+    character.edit_ability(old_ability.name, ability_name, ability_desc, int(ability_max_uses))
 
     await send_and_save_message(update, context, "Azione modificata con successo!")
 
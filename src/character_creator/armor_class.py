@@ -6,7 +6,7 @@ from telegram.ext import ContextTypes
 
 from . import *
 from .models import Character
-from .utilities import send_and_save_message
+from .utilities import send_and_save_message, save_message
 
 AC_KIND_AC = 'ac'
 AC_KIND_SHIELD = 'shield'
@@ -96,7 +96,7 @@ async def edit_magic_armor_callback(update: Update, context: ContextTypes.DEFAUL
 async def armor_class_text_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     message = update.effective_message
     text = message.text
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(message)
+    save_message(context, message)
 
     # check user input
     try:
@@ -6,13 +6,24 @@ from telegram.ext import ContextTypes
 
 from . import *
 from .models import Character, Item, Currency
-from .utilities import send_and_save_message
+from .utilities import send_and_save_message, save_message
 
+BAG_INSERT_ITEM_BUTTON = InlineKeyboardButton('Inserisci nuovo oggetto', callback_data=BAG_ITEM_INSERTION_CALLBACK_DATA)
+BAG_EDIT_ITEMS_BUTTON = InlineKeyboardButton('Modifica oggetti', callback_data=BAG_ITEM_EDIT_CALLBACK_DATA)
+BAG_MANAGE_CURRENCY_BUTTON = InlineKeyboardButton('Gestisci valuta', callback_data=BAG_MANAGE_CURRENCY_CALLBACK_DATA)
+# the bag keyboards only depend on the bag being empty, they are built once
+BAG_KEYBOARD = InlineKeyboardMarkup([[BAG_INSERT_ITEM_BUTTON], [BAG_EDIT_ITEMS_BUTTON, BAG_MANAGE_CURRENCY_BUTTON]])
+EMPTY_BAG_KEYBOARD = InlineKeyboardMarkup([[BAG_INSERT_ITEM_BUTTON], [BAG_MANAGE_CURRENCY_BUTTON]])
 
-def create_bag_menu(character: Character, context: ContextTypes.DEFAULT_TYPE) -> Tuple[str, InlineKeyboardMarkup]:
+
+def create_bag_menu(character: Character) -> Tuple[str, InlineKeyboardMarkup]:
+    """Text and keyboard of the bag, rendered again only if the character has changed."""
+    return character.cached_render('bag_menu', lambda: _render_bag_menu(character))
+
+
+def _render_bag_menu(character: Character) -> Tuple[str, InlineKeyboardMarkup]:
     # Determine the max length of the quantity string for alignment
-    max_quantity_length = max((len(str(item.quantity)) for item in character.bag), default=0)
-    character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
+    max_quantity_length = max((len(str(item.quantity)) for item in character.bag.values()), default=0)
     currency_mangement = character.settings.get('special_currency_management', 'common_values')
 
     # Create the message string with aligned quantities
@@ -22,25 +33,10 @@ def create_bag_menu(character: Character, context: ContextTypes.DEFAULT_TYPE) ->
         f"<b>Peso:</b> {character.encumbrance}/{character.carry_capacity}Lb\n"
         f"🟡 {character.currency.gold} ⚪ {character.currency.silver} ️🟤 {character.currency.bronze}\n"
         f"{f'⚡️ {character.currency.electrum} 💠 {character.currency.platinum}\n\n' if currency_mangement == 'special_values' else '\n\n'}"
-        f"{''.join(f'<code>• Pz {str(item.quantity).ljust(max_quantity_length)}</code>   <code>{item.name}</code>\n' for item in character.bag) if character.bag else 'Lo zaino è ancora vuoto'}"
+        f"{''.join(f'<code>• Pz {str(item.quantity).ljust(max_quantity_length)}</code>   <code>{item.name}</code>\n' for item in character.bag.values()) if character.bag else 'Lo zaino è ancora vuoto'}"
     )
 
-    # Create the keyboard with action buttons
-    keyboard = [[InlineKeyboardButton('Inserisci nuovo oggetto', callback_data=BAG_ITEM_INSERTION_CALLBACK_DATA)]]
-
-    second_row = []
-    if character.bag:
-        second_row.append(
-            InlineKeyboardButton('Modifica oggetti', callback_data=BAG_ITEM_EDIT_CALLBACK_DATA)
-        )
-
-    second_row.append(
-        InlineKeyboardButton('Gestisci valuta', callback_data=BAG_MANAGE_CURRENCY_CALLBACK_DATA)
-    )
-
-    keyboard.extend([second_row])
-
-    return message_str, InlineKeyboardMarkup(keyboard)
+    return message_str, BAG_KEYBOARD if character.bag else EMPTY_BAG_KEYBOARD
 
 
 def create_item_menu(item: Item) -> Tuple[str, InlineKeyboardMarkup]:
@@ -134,7 +130,7 @@ async def character_bag_query_handler(update: Update, context: ContextTypes.DEFA
     await query.answer()
 
     character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
-    message_str, reply_markup = create_bag_menu(character, context)
+    message_str, reply_markup = create_bag_menu(character)
 
     await send_and_save_message(
         update,
@@ -164,9 +160,8 @@ async def character_bag_new_object_query_handler(update: Update, context: Contex
 
 
 async def character_bag_item_insert(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(update.effective_message)
+    save_message(context, update.effective_message)
     item_info = update.effective_message.text
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(update.effective_message)
 
     # Split the input, allowing up to 3 splits
     components = item_info.split('#', maxsplit=3)
@@ -252,10 +247,10 @@ async def character_bag_edit_object_query_handler(update: Update, context: Conte
 
 async def character_bag_item_edit_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     item_name = update.effective_message.text
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(update.effective_message)
+    save_message(context, update.effective_message)
 
     character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
-    item: Item = next((item for item in character.bag if item_name == item.name), None)
+    item: Item = character.get_item(item_name)
 
     if not item:
         await send_and_save_message(
@@ -280,7 +275,7 @@ async def character_bag_item_delete_one_handler(update: Update, context: Context
     item_name = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_ITEM_KEY]
     character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
     character.decrement_item_quantity(item_name)
-    item: Item = next((item for item in character.bag if item_name == item.name), None)
+    item: Item = character.get_item(item_name)
 
     if item:
         await query.answer()
@@ -303,7 +298,7 @@ async def character_bag_item_add_one_handler(update: Update, context: ContextTyp
     item_name = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_ITEM_KEY]
     character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
     character.increment_item_quantity(item_name)
-    item: Item = next((item for item in character.bag if item_name == item.name), None)
+    item: Item = character.get_item(item_name)
 
     message_str, reply_markup = create_item_menu(item)
     await query.edit_message_text(message_str, parse_mode=ParseMode.HTML, reply_markup=reply_markup)
@@ -317,7 +312,7 @@ async def character_bag_item_delete_all_handler(update: Update, context: Context
 
     item_name = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_ITEM_KEY]
     character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
-    item: Item = next((item for item in character.bag if item_name == item.name), None)
+    item: Item = character.get_item(item_name)
     character.remove_item(item)
     context.user_data[CHARACTERS_CREATOR_KEY].pop(CURRENT_ITEM_KEY, None)
 
@@ -423,7 +418,7 @@ async def character_bag_currency_edit_quantity_query_handler(update: Update, con
 
 async def character_bag_currency_edit_quantity_text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     quantity = update.effective_message.text
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(update.effective_message)
+    save_message(context, update.effective_message)
 
     try:
         quantity = int(quantity)
@@ -443,7 +438,8 @@ async def character_bag_currency_edit_quantity_text_handler(update: Update, cont
     await send_and_save_message(update, context, message_str, parse_mode=ParseMode.HTML)
 
     character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
-    message_str, reply_markup = create_bag_menu(character, context)
+    character.touch()
+    message_str, reply_markup = create_bag_menu(character)
     await send_and_save_message(update, context, message_str, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
 
     return BAG_MANAGEMENT
@@ -500,7 +496,7 @@ async def character_currency_convert_menu_query_handler(update: Update, context:
 
 async def character_currency_convert_quantity_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     currency_quantity_text = update.effective_message.text
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(update.effective_message)
+    save_message(context, update.effective_message)
 
     try:
         currency_quantity = int(currency_quantity_text)
@@ -568,6 +564,7 @@ async def character_currency_convert_quantity_handler(update: Update, context: C
         remainder_message = f"\nHai ricevuto {remainder_cp} pezzi di bronzo come resto."
     else:
         remainder_message = ""
+    character.touch()
 
     # Conferma la conversione all'utente
     await send_and_save_message(
@@ -582,7 +579,7 @@ async def character_currency_convert_quantity_handler(update: Update, context: C
     currency_data[SELECTED_TARGET_CURRENCY] = None
 
     # Aggiorna il menu principale o termina la conversazione
-    message_str, reply_markup = create_bag_menu(character, context)
+    message_str, reply_markup = create_bag_menu(character)
     await send_and_save_message(update, context, message_str, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
 
     return BAG_MANAGEMENT
@@ -590,7 +587,7 @@ async def character_currency_convert_quantity_handler(update: Update, context: C
 
 async def character_ask_item_overwrite_quantity(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     text = update.effective_message.text
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(update.effective_message)
+    save_message(context, update.effective_message)
 
     try:
         item_quantity = int(text)
@@ -602,7 +599,7 @@ async def character_ask_item_overwrite_quantity(update: Update, context: Context
 
     item_name = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_ITEM_KEY]
     character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
-    item: Item = next((item for item in character.bag if item_name == item.name), None)
+    item: Item = character.get_item(item_name)
 
     if item.quantity + item_quantity < 0:
         await send_and_save_message(update, context, f'Non hai almeno {item_quantity * -1} Pz di {item_name}')
@@ -621,7 +618,7 @@ async def character_ask_item_overwrite_quantity(update: Update, context: Context
     else:
         await send_and_save_message(update, context, "🔴 La quantità inviata è uguale a quella presente!")
 
-    message_str, reply_markup = create_bag_menu(character, context)
+    message_str, reply_markup = create_bag_menu(character)
     await send_and_save_message(update, context, message_str, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
 
     return BAG_MANAGEMENT
@@ -0,0 +1,255 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Mapping, MutableMapping, Optional, Tuple
+
+from file_id_registry import FILE_ID_REGISTRY
+from . import *
+from .models import Character
+
+logger = logging.getLogger(__name__)
+
+BLOBS_DIR_PATH = os.getenv('DND_BLOBS_DIR', FILES_DIR_PATH + 'blobs')
+# directories of the files uploaded before the blob store, cleaned by the garbage collection too
+LEGACY_FILES_DIRS = (FILES_DIR_PATH + 'maps', FILES_DIR_PATH + 'voice_notes')
+# files younger than this are never collected, they could belong to an upload in progress
+GC_MIN_AGE = float(os.getenv('DND_BLOBS_GC_MIN_AGE', '3600'))
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class BlobStore:
+    """
+    Content addressed storage: every file is stored once, named after its SHA-256 hash
+    in directories sharded by the first bytes of the hash, e.g. blobs/ab/cd/abcd...ef.png
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.tmp_dir = os.path.join(root, 'tmp')
+        # references to every file from all the users, loaded at startup and kept updated by the handlers
+        self.references: Counter = Counter()
+
+    def load_references(self, references: Mapping[str, int]) -> None:
+        """Replace the reference counts, see count_references."""
+        self.references = Counter({os.path.normpath(path): count for path, count in references.items() if count > 0})
+
+    def add_reference(self, path: str) -> None:
+        """Count a new reference to a file, call it when a path is saved in the user data."""
+        self.references[os.path.normpath(path)] += 1
+
+    def remove_reference(self, path: str) -> int:
+        """
+        Forget a reference to a file.
+
+        Args:
+            path (str): The file path.
+
+        Returns:
+            int: The references left.
+        """
+        path = os.path.normpath(path)
+        count = self.references[path] - 1
+        if count > 0:
+            self.references[path] = count
+        else:
+            self.references.pop(path, None)
+        return max(count, 0)
+
+    def temp_path(self, name: str) -> str:
+        """Path where an upload can be written before being added to the store."""
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        return os.path.join(self.tmp_dir, name)
+
+    def blob_path(self, digest: str, extension: str = '') -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}{extension.lower()}")
+
+    @staticmethod
+    def hash_file(path: str) -> str:
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as file:
+            while chunk := file.read(HASH_CHUNK_SIZE):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def put_file(self, path: str) -> str:
+        """
+        Move a file into the store. If the same content is already stored, the file is deleted.
+        Blocking, run it in a thread for big files.
+
+        Args:
+            path (str): The file to store, its extension is kept.
+
+        Returns:
+            str: The path of the blob.
+        """
+        blob_path = self.blob_path(self.hash_file(path), os.path.splitext(path)[1])
+        if os.path.exists(blob_path):
+            os.remove(path)
+            logger.info(f"{path} already stored as {blob_path}")
+        else:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            os.replace(path, blob_path)
+
+        return blob_path
+
+    def iter_files(self, directories: Iterable[str]) -> Iterator[str]:
+        for directory in directories:
+            for dir_path, _, file_names in os.walk(directory):
+                for file_name in file_names:
+                    yield os.path.join(dir_path, file_name)
+
+    def collect_garbage(self, references: Mapping[str, int], min_age: float = GC_MIN_AGE) -> Tuple[List[str], int]:
+        """
+        Delete the stored files, and the legacy ones, which are not referenced anymore.
+        Blocking, run it in a thread.
+
+        Args:
+            references (Mapping[str, int]): Reference count of every referenced file, see count_references.
+            min_age (float): Seconds since the last modification before a file can be deleted.
+
+        Returns:
+            Tuple[List[str], int]: The deleted files and the freed bytes.
+        """
+        referenced = {os.path.normpath(path) for path, count in references.items() if count > 0}
+        now = time.time()
+        deleted = []
+        freed = 0
+
+        for path in self.iter_files((self.root, *LEGACY_FILES_DIRS)):
+            if os.path.normpath(path) in referenced:
+                continue
+            try:
+                stat = os.stat(path)
+                if now - stat.st_mtime < min_age:
+                    continue
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Unable to collect {path}: {e}")
+                continue
+
+            deleted.append(path)
+            freed += stat.st_size
+
+        logger.info(f"Blob store garbage collection: {len(deleted)} files deleted, {freed} bytes freed")
+        return deleted, freed
+
+
+BLOB_STORE = BlobStore(BLOBS_DIR_PATH)
+
+
+def is_managed_file(path: str) -> bool:
+    """Check if a path belongs to the files uploaded by the users, in the blob store or in the legacy directories."""
+    path = os.path.abspath(path)
+    return any(os.path.commonpath((path, os.path.abspath(directory))) == os.path.abspath(directory)
+               for directory in (BLOB_STORE.root, *LEGACY_FILES_DIRS))
+
+
+def get_character_files(character: Character) -> List[str]:
+    """Paths of the maps and of the voice notes of a character."""
+    files = [str(path) for maps_paths in character.maps.values() for path in maps_paths]
+    files += [str(note) for note in character.notes.values()
+              if is_managed_file(str(note)) and (os.path.isfile(note) or note in FILE_ID_REGISTRY)]
+    return files
+
+
+def get_user_files(user_data: Mapping) -> List[str]:
+    """Paths of the files referenced by a user: maps and voice notes of the characters and pending uploads."""
+    creator_data = user_data.get(CHARACTERS_CREATOR_KEY) or {}
+    characters = list(creator_data.get(CHARACTERS_KEY) or [])
+    current_character: Optional[Character] = creator_data.get(CURRENT_CHARACTER_KEY)
+    if current_character is not None and all(current_character is not character for character in characters):
+        characters.append(current_character)
+
+    files = [path for character in characters for path in get_character_files(character)]
+    files += [str(path) for path in creator_data.get(TEMP_MAPS_PATHS) or []]
+    if creator_data.get(TEMP_VOICE_MESSAGE_PATH):
+        files.append(str(creator_data[TEMP_VOICE_MESSAGE_PATH]))
+    return files
+
+
+def count_references(users_data: Mapping[int, Mapping]) -> Counter:
+    """
+    Count the references to every file from all the users.
+
+    Args:
+        users_data (Mapping[int, Mapping]): The user_data of all the users, e.g. application.user_data.
+
+    Returns:
+        Counter: Number of references of every file path.
+    """
+    return Counter(os.path.normpath(path) for user_data in users_data.values() for path in get_user_files(user_data))
+
+
+async def collect_garbage() -> None:
+    """Delete the files nobody references in a worker thread, call BLOB_STORE.load_references first."""
+    deleted, _ = await asyncio.to_thread(BLOB_STORE.collect_garbage, BLOB_STORE.references.copy())
+    # the registry is used by the handlers, it's updated in the event loop
+    for path in deleted:
+        FILE_ID_REGISTRY.discard(path)
+
+
+def release_file(path: str) -> bool:
+    """
+    Forget a reference to a file and delete it if no user references it anymore.
+    Call it after removing a map or a voice note.
+
+    Args:
+        path (str): The file path.
+
+    Returns:
+        bool: True if the file has been deleted.
+    """
+    path = str(path)
+    if not is_managed_file(path) or BLOB_STORE.remove_reference(path) or not os.path.isfile(path):
+        return False
+
+    os.remove(path)
+    FILE_ID_REGISTRY.discard(path)
+    return True
+
+
+def release_character_files(character: Character) -> None:
+    """Release the maps and the voice notes of a character, call it when the character is deleted."""
+    for path in get_character_files(character):
+        release_file(path)
+
+
+def release_temp_files(creator_data: MutableMapping) -> None:
+    """
+    Remove the maps and the voice note of an upload not completed from the user data and release them.
+
+    Args:
+        creator_data (MutableMapping): The character creator data of the user.
+    """
+    for path in creator_data.pop(TEMP_MAPS_PATHS, None) or []:
+        release_file(path)
+    if voice_message_path := creator_data.pop(TEMP_VOICE_MESSAGE_PATH, None):
+        release_file(voice_message_path)
+
+
+def get_user_disk_usage(user_data: Mapping) -> int:
+    """Bytes used by the files referenced by a user."""
+    return sum(os.path.getsize(path) for path in set(get_user_files(user_data)) if os.path.isfile(path))
+
+
+def disk_usage_report(users_data: Mapping[int, Mapping]) -> Dict[int, int]:
+    """
+    Compute the bytes used by every user. A file shared by different users is counted for each of them.
+
+    Args:
+        users_data (Mapping[int, Mapping]): The user_data of all the users.
+
+    Returns:
+        Dict[int, int]: Bytes used by every user with at least one file, the biggest first.
+    """
+    usage = {}
+    for user_id, user_data in users_data.items():
+        total = get_user_disk_usage(user_data)
+        if total:
+            usage[user_id] = total
+
+    return dict(sorted(usage.items(), key=lambda item: item[1], reverse=True))
@@ -4,13 +4,13 @@ from typing import List
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.constants import ParseMode, ChatType
-from telegram.error import TelegramError
 from telegram.ext import ContextTypes, ConversationHandler
 
 from . import *
 from .abilities import character_abilities_query_handler
 from .armor_class import armor_class_main_menu_callback
 from .bag import character_bag_query_handler
+from .blob_store import release_character_files, release_temp_files
 from .damage_healing import character_damage_query_handler, character_healing_query_handler
 from .dice import dice_handler
 from .feature_points import character_feature_point_query_handler
@@ -24,7 +24,8 @@ from .rest import character_long_rest_warning_query_handler, character_short_res
 from .settings import character_creator_settings
 from .spell_slots import character_spells_slots_query_handler
 from .spells import character_spells_query_handler
-from .utilities import send_and_save_message, create_main_menu_message
+from .utilities import send_and_save_message, create_main_menu_message, pop_last_menu_messages, \
+    delete_messages_in_background
 
 logger = logging.getLogger(__name__)
 
@@ -41,9 +42,8 @@ async def character_creator_stop_submenu(update: Update, context: ContextTypes.D
             # Automatically reassign levels if only one class is left
             remaining_class_name = remaining_classes[0]
             character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
-            multi_class = character.multi_class
 
-            multi_class.add_class(remaining_class_name, removed_class_level)
+            character.add_class(remaining_class_name, removed_class_level)
 
             message_str = f"Il comando /stop è stato ricevuto.\n" \
                           f"I {removed_class_level} livelli rimossi sono stati aggiunti automaticamente alla classe {remaining_class_name}."
@@ -60,18 +60,14 @@ async def character_creator_stop_submenu(update: Update, context: ContextTypes.D
         if CURRENT_CHARACTER_KEY in context.user_data[CHARACTERS_CREATOR_KEY]:
             character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
 
-            # Delete messages sent by bot and user
-            messages = context.user_data[CHARACTERS_CREATOR_KEY].get(LAST_MENU_MESSAGES, [])
-            for message in messages:
-                try:
-                    await context.bot.delete_message(chat_id=message.chat_id, message_id=message.message_id)
-                except TelegramError as e:
-                    logger.warning(f"Errore durante la cancellazione del messaggio: {e}")
-            context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].clear()
+            messages = pop_last_menu_messages(context)
 
             msg, reply_markup = create_main_menu_message(character)
             await update.effective_message.reply_text(msg, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
 
+            # Delete messages sent by bot and user once the new menu has been sent
+            delete_messages_in_background(update, context, messages)
+
         else:
 
             await send_and_save_message(update, context,
@@ -87,11 +83,10 @@ async def character_creator_stop_submenu(update: Update, context: ContextTypes.D
         context.user_data[CHARACTERS_CREATOR_KEY].pop(TEMP_ABILITY_KEY, None)
         context.user_data[CHARACTERS_CREATOR_KEY].pop(CURRENT_ABILITY_KEY, None)
         context.user_data[CHARACTERS_CREATOR_KEY].pop(TEMP_ZONE_NAME, None)
-        context.user_data[CHARACTERS_CREATOR_KEY].pop(TEMP_MAPS_PATHS, None)
+        release_temp_files(context.user_data[CHARACTERS_CREATOR_KEY])
         context.user_data[CHARACTERS_CREATOR_KEY].pop(ADD_OR_INSERT_MAPS, None)
         context.user_data[CHARACTERS_CREATOR_KEY].pop(TEMP_CURRENCY_KEY, None)
         context.user_data[CHARACTERS_CREATOR_KEY].pop(CURRENCY_CONVERTER, None)
-        context.user_data[CHARACTERS_CREATOR_KEY].pop(TEMP_VOICE_MESSAGE_PATH, None)
 
         return FUNCTION_SELECTION
 
@@ -108,11 +103,10 @@ async def character_creation_stop(update: Update, context: ContextTypes.DEFAULT_
     context.user_data[CHARACTERS_CREATOR_KEY].pop(TEMP_ABILITY_KEY, None)
     context.user_data[CHARACTERS_CREATOR_KEY].pop(CURRENT_ABILITY_KEY, None)
     context.user_data[CHARACTERS_CREATOR_KEY].pop(TEMP_ZONE_NAME, None)
-    context.user_data[CHARACTERS_CREATOR_KEY].pop(TEMP_MAPS_PATHS, None)
+    release_temp_files(context.user_data[CHARACTERS_CREATOR_KEY])
     context.user_data[CHARACTERS_CREATOR_KEY].pop(ADD_OR_INSERT_MAPS, None)
     context.user_data[CHARACTERS_CREATOR_KEY].pop(TEMP_CURRENCY_KEY, None)
     context.user_data[CHARACTERS_CREATOR_KEY].pop(CURRENCY_CONVERTER, None)
-    context.user_data[CHARACTERS_CREATOR_KEY].pop(TEMP_VOICE_MESSAGE_PATH, None)
 
     context.user_data[ACTIVE_CONV] = None
 
@@ -259,7 +253,7 @@ async def character_class_handler(update: Update, context: ContextTypes.DEFAULT_
     class_ = update.effective_message.text
 
     character: Character = context.user_data[CHARACTERS_CREATOR_KEY][TEMP_CHARACTER_KEY]
-    character.multi_class.add_class(class_)
+    character.add_class(class_)
 
     await update.effective_message.reply_text(
         "Quanti punti vita ha il tuo personaggio?\nRispondi a questo messaggio o premi /stop per terminare"
@@ -318,7 +312,12 @@ async def character_deleting_answer_query_handler(update: Update, context: Conte
         await query.answer()
         characters: List[Character] = context.user_data[CHARACTERS_CREATOR_KEY][CHARACTERS_KEY]
 
-        # Remove the character from the list
+        # Remove the character from the list and release its maps and voice notes
+        deleted = [character for character in characters if character.name == current_character.name]
+        if all(current_character is not character for character in deleted):
+            deleted.append(current_character)
+        for character in deleted:
+            release_character_files(character)
         characters = [character for character in characters if character.name != current_character.name]
         context.user_data[CHARACTERS_CREATOR_KEY][CHARACTERS_KEY] = characters
 
@@ -369,14 +368,12 @@ async def character_generic_main_menu_query_handler(update: Update, context: Con
 
     for regex, func in MAINMENU_CALLBACKDATA_TO_CALLBACK.items():
         if re.match(regex, query.data):
-            messages = context.user_data[CHARACTERS_CREATOR_KEY].get(LAST_MENU_MESSAGES, [])
-            for message in messages:
-                try:
-                    await context.bot.delete_message(chat_id=message.chat_id, message_id=message.message_id)
-                except TelegramError as e:
-                    logger.warning(f"Errore durante la cancellazione del messaggio: {e}")
-            context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].clear()
-            return await func(update, context)
+            messages = pop_last_menu_messages(context)
+            next_state = await func(update, context)
+
+            # Delete the old messages once the new menu has been sent
+            delete_messages_in_background(update, context, messages)
+            return next_state
 
 
 async def check_pending_reassignment_for_multiclassing_and_wipe_user_data(update, context):
@@ -391,9 +388,8 @@ async def check_pending_reassignment_for_multiclassing_and_wipe_user_data(update
             # Automatically reassign levels if only one class is left
             remaining_class_name = remaining_classes[0]
             character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
-            multi_class = character.multi_class
 
-            multi_class.add_class(remaining_class_name, removed_class_level)
+            character.add_class(remaining_class_name, removed_class_level)
 
             await update.message.reply_text(f"Il comando /stop è stato ricevuto.\n"
                                             f"I {removed_class_level} livelli rimossi sono stati aggiunti automaticamente alla classe {remaining_class_name}.")
@@ -411,8 +407,7 @@ async def check_pending_reassignment_for_multiclassing_and_wipe_user_data(update
         context.user_data[CHARACTERS_CREATOR_KEY].pop(TEMP_ABILITY_KEY, None)
         context.user_data[CHARACTERS_CREATOR_KEY].pop(CURRENT_ABILITY_KEY, None)
         context.user_data[CHARACTERS_CREATOR_KEY].pop(TEMP_ZONE_NAME, None)
-        context.user_data[CHARACTERS_CREATOR_KEY].pop(TEMP_MAPS_PATHS, None)
+        release_temp_files(context.user_data[CHARACTERS_CREATOR_KEY])
         context.user_data[CHARACTERS_CREATOR_KEY].pop(ADD_OR_INSERT_MAPS, None)
         context.user_data[CHARACTERS_CREATOR_KEY].pop(TEMP_CURRENCY_KEY, None)
         context.user_data[CHARACTERS_CREATOR_KEY].pop(CURRENCY_CONVERTER, None)
-        context.user_data[CHARACTERS_CREATOR_KEY].pop(TEMP_VOICE_MESSAGE_PATH, None)
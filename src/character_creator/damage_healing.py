@@ -6,7 +6,8 @@ from telegram.ext import ContextTypes
 
 from . import *
 from .models import Character
-from .utilities import create_skull_asciart, send_and_save_message, create_main_menu_message
+from .utilities import create_skull_asciart, send_and_save_message, create_main_menu_message, \
+    save_message
 
 
 async def character_damage_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -20,7 +21,7 @@ async def character_damage_query_handler(update: Update, context: ContextTypes.D
 
 
 async def character_damage_registration_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(update.effective_message)
+    save_message(context, update.effective_message)
     damage = update.effective_message.text
 
     if not damage or damage.isalpha():
@@ -64,7 +65,7 @@ async def character_healing_query_handler(update: Update, context: ContextTypes.
 
 async def character_healing_value_check_or_registration_handler(update: Update,
                                                                 context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(update.effective_message)
+    save_message(context, update.effective_message)
     healing = update.effective_message.text
 
     if not healing or not healing.isdigit():
@@ -1,5 +1,6 @@
+from functools import lru_cache
 from random import randint
-from typing import Dict
+from typing import Dict, Tuple
 
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.constants import ParseMode
@@ -29,52 +30,42 @@ ROLLS_MAP = {
 }
 
 
-def create_dice_keyboard(selected_dice: Dict[str, int]) -> InlineKeyboardMarkup:
-    keyboard = [
-        [
-            InlineKeyboardButton(f"{selected_dice['d4']} D4", callback_data=f"d4|+"),
-            InlineKeyboardButton(f"{selected_dice['d6']} D6", callback_data=f"d6|+"),
-            InlineKeyboardButton(f"{selected_dice['d8']} D8", callback_data=f"d8|+")
-        ],
-        [
-            InlineKeyboardButton(f"-", callback_data=f"d4|-"),
-            InlineKeyboardButton(f"-", callback_data=f"d6|-"),
-            InlineKeyboardButton(f"-", callback_data=f"d8|-")
-        ],
-        [
-            InlineKeyboardButton(f"{selected_dice['d10']} D10", callback_data=f"d10|+"),
-            InlineKeyboardButton(f"{selected_dice['d12']} D12", callback_data=f"d12|+"),
-            InlineKeyboardButton(f"{selected_dice['d100']} D100", callback_data=f"d100|+")
-        ],
-        [
-            InlineKeyboardButton(f"-", callback_data=f"d10|-"),
-            InlineKeyboardButton(f"-", callback_data=f"d12|-"),
-            InlineKeyboardButton(f"-", callback_data=f"d100|-")
-        ],
-        [
-            InlineKeyboardButton(f"{selected_dice['d20']} D20", callback_data=f"d20|+")
-        ],
-        [
-            InlineKeyboardButton(f"-", callback_data=f"d20|-"),
-        ]
-    ]
-
-    roll_text = 'Seleziona un dado' if sum(
-        selected_dice.values()) == 0 else f'Lancia {', '.join([f'{roll_to_do}{die}' for die, roll_to_do in selected_dice.items() if roll_to_do > 0])}'
+# rows of dice buttons, in the order of the keyboard, each followed by its row of "-" buttons
+DICE_ROWS = (('d4', 'd6', 'd8'), ('d10', 'd12', 'd100'), ('d20',))
+DICE_MINUS_ROWS = tuple(tuple(InlineKeyboardButton("-", callback_data=f"{die}|-") for die in row) for row in DICE_ROWS)
+DELETE_HISTORY_ROW = (InlineKeyboardButton("Cancella cronologia", callback_data=ROLL_DICE_DELETE_HISTORY_CALLBACK_DATA),)
+
+
+@lru_cache(maxsize=512)
+def _dice_keyboard(selected_dice: Tuple[Tuple[str, int], ...]) -> InlineKeyboardMarkup:
+    counts = dict(selected_dice)
+    keyboard = []
+    for row, minus_row in zip(DICE_ROWS, DICE_MINUS_ROWS):
+        keyboard.append([InlineKeyboardButton(f"{counts[die]} {die.upper()}", callback_data=f"{die}|+") for die in row])
+        keyboard.append(minus_row)
+
+    to_roll = ', '.join(f'{roll_to_do}{die}' for die, roll_to_do in selected_dice if roll_to_do > 0)
+    roll_text = f'Lancia {to_roll}' if to_roll else 'Seleziona un dado'
     keyboard.append([InlineKeyboardButton(roll_text, callback_data=ROLL_DICE_CALLBACK_DATA)])
-    keyboard.append(
-        [InlineKeyboardButton(f"Cancella cronologia", callback_data=ROLL_DICE_DELETE_HISTORY_CALLBACK_DATA)])
+    keyboard.append(DELETE_HISTORY_ROW)
 
     return InlineKeyboardMarkup(keyboard)
 
 
+def create_dice_keyboard(selected_dice: Dict[str, int]) -> InlineKeyboardMarkup:
+    """Keyboard of the dice menu, built once for every combination of selected dice."""
+    return _dice_keyboard(tuple(selected_dice.items()))
+
+
 async def send_dice_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, is_edit: bool = True):
     character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
     roll_history = character.get_rolls_history()
+    roll_stats = character.get_rolls_stats()
     message_str = (
         f"<b>Gestione tiri di dado</b>\n"
         "Usa /stop per terminare o un bottone del menù principale per cambiare funzione\n"
         f"<code>{roll_history if roll_history != '' else 'Cronologia lanci vuota!\n\n'}</code>"
+        f"{f'<b>Statistiche</b>\n<code>{roll_stats}</code>\n' if roll_stats else ''}"
         "Seleziona quanti dadi vuoi tirare:\n\n"
     )
 
@@ -154,6 +145,7 @@ async def dice_actions_query_handler(update: Update, context: ContextTypes.DEFAU
 
         # update history
         character.rolls_history.extend(total_rolls)
+        character.touch()
         await delete_dice_menu(context)
         await send_dice_menu(update, context, is_edit=False)
 
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import os
+from typing import Awaitable, Dict, Set
+
+import aiohttp
+from telegram import File
+from telegram.constants import FileSizeLimit
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+# Maximum bytes of maps and voice notes stored by every user
+USER_QUOTA_BYTES = int(os.getenv('DND_USER_QUOTA_BYTES', str(200 * 1024 * 1024)))
+# Maximum number of downloads running at the same time, overall and for every user
+MAX_DOWNLOADS = int(os.getenv('DND_MAX_DOWNLOADS', '4'))
+MAX_USER_DOWNLOADS = int(os.getenv('DND_MAX_USER_DOWNLOADS', '2'))
+# Seconds the /done command waits for the running downloads, the other updates of the user wait too
+DOWNLOADS_WAIT_TIMEOUT = float(os.getenv('DND_DOWNLOADS_WAIT_TIMEOUT', '10'))
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DOWNLOAD_TIMEOUT = aiohttp.ClientTimeout(total=300, sock_connect=10, sock_read=60)
+
+
+async def stream_download(file: File, destination: str, max_size: int = FileSizeLimit.FILESIZE_DOWNLOAD) -> int:
+    """
+    Download a Telegram file writing it to disk chunk by chunk, without keeping it in memory.
+
+    Args:
+        file (File): The file to download.
+        destination (str): The path of the downloaded file.
+        max_size (int): The download is interrupted if the file is bigger.
+
+    Returns:
+        int: The size of the downloaded file.
+
+    Raises:
+        ValueError: If the file is bigger than max_size, the partial file is deleted.
+    """
+    if not file.file_path.startswith(('http://', 'https://')):
+        # local Bot API server, the file is already on the disk
+        await file.download_to_drive(destination)
+        size = os.path.getsize(destination)
+    else:
+        size = 0
+        try:
+            async with aiohttp.ClientSession(timeout=DOWNLOAD_TIMEOUT) as session:
+                async with session.get(file.file_path) as response:
+                    response.raise_for_status()
+                    with open(destination, 'wb') as output:
+                        async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                            size += len(chunk)
+                            if size > max_size:
+                                raise ValueError(f"The file is bigger than {max_size} bytes")
+                            output.write(chunk)
+        except BaseException:
+            if os.path.exists(destination):
+                os.remove(destination)
+            raise
+
+    if size > max_size:
+        os.remove(destination)
+        raise ValueError(f"The file is bigger than {max_size} bytes")
+
+    return size
+
+
+class DownloadManager:
+    """
+    Runs the downloads of the uploaded files in background tasks, limiting how many run at the same time
+    and how many bytes every user can store.
+    """
+
+    def __init__(self, max_downloads: int, max_user_downloads: int, user_quota: int):
+        self.max_user_downloads = max_user_downloads
+        self.user_quota = user_quota
+        self.__semaphore = asyncio.Semaphore(max_downloads)
+        self.__user_semaphores: Dict[int, asyncio.Semaphore] = {}
+        self.__tasks: Dict[int, Set[asyncio.Task]] = {}
+        # bytes being downloaded by every user
+        self.__reserved: Dict[int, int] = {}
+
+    def has_room(self, user_id: int, used: int, size: int) -> bool:
+        """
+        Check if a user can download a file without exceeding the quota.
+
+        Args:
+            user_id (int): The user.
+            used (int): The bytes already stored by the user.
+            size (int): The size of the new file.
+        """
+        return used + self.__reserved.get(user_id, 0) + size <= self.user_quota
+
+    def start(self, application: Application, user_id: int, size: int, coroutine: Awaitable) -> asyncio.Task:
+        """
+        Run a download in background. Its size is reserved in the user quota until it ends.
+
+        Args:
+            application (Application): The application which runs the task.
+            user_id (int): The user who uploaded the file.
+            size (int): The expected size of the file.
+            coroutine (Awaitable): The download.
+
+        Returns:
+            asyncio.Task: The download task.
+        """
+        self.__reserved[user_id] = self.__reserved.get(user_id, 0) + size
+        task = application.create_task(self.__run(user_id, coroutine))
+        self.__tasks.setdefault(user_id, set()).add(task)
+
+        def done(finished_task: asyncio.Task) -> None:
+            self.__reserved[user_id] -= size
+            self.__tasks[user_id].discard(finished_task)
+            if not self.__tasks[user_id]:
+                del self.__tasks[user_id]
+                del self.__reserved[user_id]
+                self.__user_semaphores.pop(user_id, None)
+
+        task.add_done_callback(done)
+        return task
+
+    async def __run(self, user_id: int, coroutine: Awaitable) -> None:
+        user_semaphore = self.__user_semaphores.setdefault(user_id, asyncio.Semaphore(self.max_user_downloads))
+        async with user_semaphore, self.__semaphore:
+            await coroutine
+
+    def pending(self, user_id: int) -> int:
+        """Number of downloads of a user not finished yet."""
+        return len(self.__tasks.get(user_id, ()))
+
+    async def wait(self, user_id: int, timeout: float) -> bool:
+        """
+        Wait for all the downloads of a user to end.
+
+        Args:
+            user_id (int): The user.
+            timeout (float): Maximum seconds to wait, the downloads are not interrupted.
+
+        Returns:
+            bool: True if all the downloads ended.
+        """
+        tasks = list(self.__tasks.get(user_id, ()))
+        if not tasks:
+            return True
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        return not pending
+
+
+DOWNLOAD_MANAGER = DownloadManager(MAX_DOWNLOADS, MAX_USER_DOWNLOADS, USER_QUOTA_BYTES)
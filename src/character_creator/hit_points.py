@@ -4,7 +4,7 @@ from telegram.ext import ContextTypes
 
 from . import *
 from .models import Character
-from .utilities import send_and_save_message, create_main_menu_message
+from .utilities import send_and_save_message, create_main_menu_message, save_message
 
 
 async def character_hit_points_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -25,7 +25,7 @@ async def character_hit_points_query_handler(update: Update, context: ContextTyp
 
 
 async def character_hit_points_registration_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(update.effective_message)
+    save_message(context, update.effective_message)
     hit_points = update.effective_message.text
 
     if not hit_points or hit_points.isalpha():
@@ -3,7 +3,7 @@ from telegram.constants import ParseMode
 from telegram.ext import ContextTypes
 
 from . import *
-from .models import Character, MultiClass
+from .models import Character
 from .utilities import send_and_save_message, create_main_menu_message
 
 
@@ -29,7 +29,7 @@ async def character_change_level_query_handler(update: Update, context: ContextT
     else:
         # If only one class, level up/down automatically
         class_name = next(iter(multi_class.classes))  # Get the only class name
-        await apply_level_change(multi_class, class_name, data, query)
+        await apply_level_change(character, class_name, data, query)
         msg, reply_markup = create_main_menu_message(character)
         await query.edit_message_text(msg, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
 
@@ -44,23 +44,24 @@ async def character_level_change_class_choice_handler(update: Update, context: C
     action, class_name = data.split("|", maxsplit=1)
 
     character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
-    multi_class = character.multi_class
 
     # Apply the level change using the chosen class and action
-    await apply_level_change(multi_class, class_name, action, query)
+    await apply_level_change(character, class_name, action, query)
     msg, reply_markup = create_main_menu_message(character)
     await query.edit_message_text(msg, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
 
     return FUNCTION_SELECTION
 
 
-async def apply_level_change(multi_class: MultiClass, class_name: str, data: str, query: CallbackQuery) -> None:
+async def apply_level_change(character: Character, class_name: str, data: str, query: CallbackQuery) -> None:
     """Apply the level change to the selected class and update the user."""
+    multi_class = character.multi_class
     try:
         if data == LEVEL_UP_CALLBACK_DATA:
             multi_class.level_up(class_name)
         else:
             multi_class.level_down(class_name)
+        character.touch()
 
         await query.answer(f"{class_name} è ora di livello {multi_class.get_class_level(class_name)}!", show_alert=True)
     except ValueError as e:
@@ -1,15 +1,64 @@
+import asyncio
+import logging
 import os
-from typing import Tuple
+from typing import Tuple, List, Dict
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, File
-from telegram.constants import ParseMode, FileSizeLimit
+import aiohttp
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, File, Message, InputMediaPhoto, \
+    InputMediaDocument
+from telegram.constants import ParseMode, FileSizeLimit, MediaGroupLimit
+from telegram.error import TelegramError
 from telegram.ext import ContextTypes
 
+from file_id_registry import FILE_ID_REGISTRY
 from . import *
+from .blob_store import BLOB_STORE, release_file, get_user_disk_usage
+from .downloads import DOWNLOAD_MANAGER, DOWNLOADS_WAIT_TIMEOUT, stream_download
 from .models import Character
-from .utilities import send_and_save_message
+from .utilities import send_and_save_message, save_message
 
-MAPS_DIR_PATH = FILES_DIR_PATH + 'maps'
+logger = logging.getLogger(__name__)
+
+# maps sent as photos, the other files are sent as documents
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+# delete buttons for every row of the zone keyboard
+DELETE_MAP_BUTTONS_PER_ROW = 3
+
+
+def is_photo_map(path: str) -> bool:
+    """Check if a map can be sent as a photo: an image not bigger than the Telegram photos limit."""
+    if not path.lower().endswith(PHOTO_EXTENSIONS):
+        return False
+    return not os.path.isfile(path) or os.path.getsize(path) <= FileSizeLimit.PHOTOSIZE_UPLOAD
+
+
+async def send_maps_albums(update: Update, maps_paths: List[str]) -> Dict[str, Message]:
+    """
+    Send the maps as albums of up to 10 files, the photos and the documents in separate albums.
+
+    Args:
+        update (Update): The bot update object.
+        maps_paths (List[str]): The paths of the maps.
+
+    Returns:
+        Dict[str, Message]: The message of every map.
+    """
+    message = update.effective_message
+    photos = [path for path in maps_paths if is_photo_map(path)]
+    documents = [path for path in maps_paths if not is_photo_map(path)]
+    sent_messages = {}
+
+    for paths, media_type, send_single in ((photos, InputMediaPhoto, message.reply_photo),
+                                           (documents, InputMediaDocument, message.reply_document)):
+        for i in range(0, len(paths), MediaGroupLimit.MAX_MEDIA_LENGTH):
+            album = paths[i:i + MediaGroupLimit.MAX_MEDIA_LENGTH]
+            if len(album) < MediaGroupLimit.MIN_MEDIA_LENGTH:
+                messages = (await FILE_ID_REGISTRY.send(album[0], send_single),)
+            else:
+                messages = await FILE_ID_REGISTRY.send_media_group(album, media_type, message.reply_media_group)
+            sent_messages.update(zip(album, messages))
+
+    return sent_messages
 
 
 def create_maps_menu(character: Character) -> Tuple[str, InlineKeyboardMarkup]:
@@ -53,16 +102,27 @@ async def character_creation_show_maps_query_handler(update: Update, context: Co
                                 f"Usa /stop per terminare o un bottone del menù principale per cambiare funzione\n\n"
                                 f"Queste sono le mappe della zona {zone}")
 
-    for path in maps_paths:
-        keyboard = [
-            [InlineKeyboardButton('Cancella', callback_data=f"{DELETE_SINGLE_MAP_CALLBACK_DATA}|{path}|{zone}")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        message = await update.effective_message.reply_document(path, reply_markup=reply_markup)
-        context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(message)
+    sent_messages = await send_maps_albums(update, maps_paths)
+
+    # the albums can't have buttons, every map can be deleted from the keyboard below
+    keyboard = []
+    row = []
+    # numbered in the order the maps are shown
+    for number, (path, message) in enumerate(sent_messages.items(), start=1):
+        save_message(context, message)
+        row.append(InlineKeyboardButton(
+            f"Cancella mappa {number}",
+            callback_data=f"{DELETE_SINGLE_MAP_CALLBACK_DATA}|{path}|{zone}|{message.message_id}"))
+
+        if len(row) == DELETE_MAP_BUTTONS_PER_ROW:
+            keyboard.append(row)
+            row = []
+
+    if row:
+        keyboard.append(row)
 
     message_str = "Scegli cosa vuoi fare"
-    keyboard = [
+    keyboard += [
         [InlineKeyboardButton('Aggiungi nuova mappa', callback_data=f"{ADD_NEW_MAP_CALLBACK_DATA}|{zone}")],
         [InlineKeyboardButton('Cancella tutte le mappe', callback_data=f"{DELETE_ALL_ZONE_MAPMS_CALLBACK_DATA}|{zone}")]
     ]
@@ -77,11 +137,26 @@ async def character_creator_delete_single_map_query_handler(update: Update, cont
     await query.answer()
     data = query.data
 
-    _, path, zone = data.split('|')
+    _, path, zone, *message_id = data.split('|')
     character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
     character.maps[zone].remove(path)
+    character.touch()
+    release_file(path)
+
+    if not message_id:
+        # button sent before the maps were grouped in albums, attached to the map itself
+        await query.delete_message()
+        return MAPS_MANAGEMENT
 
-    await query.delete_message()
+    try:
+        await context.bot.delete_message(update.effective_chat.id, int(message_id[0]))
+    except TelegramError as e:
+        logger.warning(f"Unable to delete the map message {message_id[0]}: {e}")
+
+    # remove the button of the deleted map
+    keyboard = [[button for button in row if button.callback_data != data]
+                for row in query.message.reply_markup.inline_keyboard]
+    await query.edit_message_reply_markup(InlineKeyboardMarkup([row for row in keyboard if row]))
 
     return MAPS_MANAGEMENT
 
@@ -104,12 +179,16 @@ async def character_creator_add_map_query_handler(update: Update, context: Conte
 
 
 async def character_creation_add_maps_done_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(update.effective_message)
+    save_message(context, update.effective_message)
+    if not await wait_maps_downloads(update, context):
+        return ADD_MAPS_FILES
+
     zone = context.user_data[CHARACTERS_CREATOR_KEY][TEMP_ZONE_NAME]
-    files_paths = context.user_data[CHARACTERS_CREATOR_KEY][TEMP_MAPS_PATHS]
+    files_paths = context.user_data[CHARACTERS_CREATOR_KEY].get(TEMP_MAPS_PATHS, [])
 
     character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
     character.maps[zone].extend(files_paths)
+    character.touch()
 
     context.user_data[CHARACTERS_CREATOR_KEY].pop(TEMP_ZONE_NAME, None)
     context.user_data[CHARACTERS_CREATOR_KEY].pop(TEMP_MAPS_PATHS, None)
@@ -128,7 +207,9 @@ async def character_creation_maps_delete_all_query_handler(update: Update, conte
 
     _, zone = data.split('|')
     character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
-    character.maps.pop(zone, None)
+    for path in character.maps.pop(zone, []):
+        release_file(path)
+    character.touch()
 
     await send_and_save_message(update, context, f"Le mappe della zona {zone} sono state cancellate con successo ✅")
     message_str, reply_markup = create_maps_menu(character)
@@ -152,7 +233,7 @@ async def character_creation_new_maps_query_handler(update: Update, context: Con
 
 async def character_creation_ask_maps_file(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     message = update.effective_message
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(message)
+    save_message(context, message)
     text = message.text
     context.user_data[CHARACTERS_CREATOR_KEY][TEMP_ZONE_NAME] = text
 
@@ -163,34 +244,100 @@ async def character_creation_ask_maps_file(update: Update, context: ContextTypes
     return MAPS_FILES
 
 
+async def download_map(file: File, is_photo: bool, temp_maps_paths: List[str], update: Update,
+                       context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Download a map in background, move it in the blob store and tell the user when it's ready.
+
+    Args:
+        file (File): The map to download.
+        is_photo (bool): If the map has been sent as a photo.
+        temp_maps_paths (List[str]): The maps of the upload the file belongs to, if the upload has been stopped
+            in the meantime the map is not saved.
+        update (Update): The update of the uploaded map.
+        context (ContextTypes.DEFAULT_TYPE): The handler context.
+    """
+    file_ext = os.path.splitext(file.file_path)[1]
+    temp_path = BLOB_STORE.temp_path(f"{file.file_unique_id}{file_ext}")
+    try:
+        await stream_download(file, temp_path)
+        blob_path = await asyncio.to_thread(BLOB_STORE.put_file, temp_path)
+    except (aiohttp.ClientError, asyncio.TimeoutError, OSError, ValueError, TelegramError) as e:
+        # the exception is not logged as is: the file URL contains the bot token
+        logger.error(f"Download of the map {file.file_unique_id} failed: {type(e).__name__}")
+        message = await context.bot.send_message(update.effective_chat.id,
+                                                 "🔴 Non è stato possibile scaricare la mappa, inviala di nuovo")
+        save_message(context, message)
+        return
+
+    if is_photo == is_photo_map(blob_path):
+        # the file_id can be reused only if the map is sent back as the same kind of file it was received
+        FILE_ID_REGISTRY.set(blob_path, file.file_id)
+
+    if context.user_data[CHARACTERS_CREATOR_KEY].get(TEMP_MAPS_PATHS) is not temp_maps_paths:
+        # /stop or another function in the meantime, the map must not end up in the next upload
+        logger.info(f"Upload of the map {file.file_unique_id} stopped, discarding it")
+        BLOB_STORE.add_reference(blob_path)
+        release_file(blob_path)
+        return
+
+    # save the file path in a temp location, the same file sent twice is stored once
+    if blob_path not in temp_maps_paths:
+        temp_maps_paths.append(blob_path)
+        BLOB_STORE.add_reference(blob_path)
+
+    message = await context.bot.send_message(update.effective_chat.id, "✅ Mappa scaricata")
+    save_message(context, message)
+
+
 async def store_map_file_or_photo(file: File, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    # create the folder for the file
-    os.makedirs(MAPS_DIR_PATH, exist_ok=True)
-    # Download the file on the disk
-    file_name = file.file_path.split('/')[-1].split('.')[0]
-    file_ext = file.file_path.split('/')[-1].split('.')[1]
-    file_path = os.path.join(MAPS_DIR_PATH, f"{file_name}.{file_ext}")
-    final_file_path = await file.download_to_drive(file_path)
-    # save the file path in a temp location
-    if TEMP_MAPS_PATHS not in context.user_data[CHARACTERS_CREATOR_KEY]:
-        context.user_data[CHARACTERS_CREATOR_KEY][TEMP_MAPS_PATHS] = []
-
-    context.user_data[CHARACTERS_CREATOR_KEY][TEMP_MAPS_PATHS].append(str(final_file_path))
-
-    message_str = (f"Invia un altro file o foto oppure usa il comando /done per terminare\n\n"
+    state = MAPS_FILES if context.user_data[CHARACTERS_CREATOR_KEY][ADD_OR_INSERT_MAPS] == 'insert' else ADD_MAPS_FILES
+    user_id = update.effective_user.id
+    file_size = file.file_size or 0
+
+    if not DOWNLOAD_MANAGER.has_room(user_id, get_user_disk_usage(context.user_data), file_size):
+        await send_and_save_message(update, context, f"🔴 Hai esaurito lo spazio per le mappe e le note vocali "
+                                                     f"({DOWNLOAD_MANAGER.user_quota // 1024 // 1024}MB)!\n"
+                                                     f"Cancella qualche mappa per aggiungerne altre")
+        return state
+
+    # the file is downloaded in background, the user can send the next one right away
+    temp_maps_paths = context.user_data[CHARACTERS_CREATOR_KEY].setdefault(TEMP_MAPS_PATHS, [])
+    DOWNLOAD_MANAGER.start(context.application, user_id, file_size,
+                           download_map(file, bool(update.effective_message.photo), temp_maps_paths, update, context))
+
+    message_str = (f"⏳ Download della mappa in corso, ti avviserò quando è pronta\n\n"
+                   f"Invia un altro file o foto oppure usa il comando /done per terminare\n\n"
                    f"Puoi sempre usare il comando /stop per terminare la conversazione oppure premere su un pulsante "
                    f"del menu principale")
     await send_and_save_message(update, context, message_str)
 
-    if context.user_data[CHARACTERS_CREATOR_KEY][ADD_OR_INSERT_MAPS] == 'insert':
-        return MAPS_FILES
-    else:
-        return ADD_MAPS_FILES
+    return state
+
+
+async def wait_maps_downloads(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+    """
+    Wait for the maps still being downloaded before saving them. The wait is short: the other updates of the user
+    are processed only after it.
+
+    Returns:
+        bool: True if all the maps have been downloaded, otherwise the user is asked to retry.
+    """
+    if not DOWNLOAD_MANAGER.pending(update.effective_user.id):
+        return True
+
+    await send_and_save_message(update, context, "⏳ Attendo la fine dei download delle mappe...")
+    if await DOWNLOAD_MANAGER.wait(update.effective_user.id, DOWNLOADS_WAIT_TIMEOUT):
+        return True
+
+    await send_and_save_message(update, context, "⏳ Alcune mappe sono ancora in download, "
+                                                 "usa di nuovo il comando /done tra poco")
+    return False
 
 
 async def character_creation_store_map_file(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     message = update.effective_message
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(message)
+    save_message(context, message)
     document = message.effective_attachment
 
     if document.file_size > FileSizeLimit.FILESIZE_DOWNLOAD:
@@ -204,19 +351,26 @@ async def character_creation_store_map_file(update: Update, context: ContextType
 
 async def character_creation_store_map_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     message = update.effective_message
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(message)
+    save_message(context, message)
     photo = await message.effective_attachment[-1].get_file()
 
     return await store_map_file_or_photo(photo, update, context)
 
 
 async def character_creation_maps_done_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(update.effective_message)
+    save_message(context, update.effective_message)
+    if not await wait_maps_downloads(update, context):
+        return MAPS_FILES
+
     zone = context.user_data[CHARACTERS_CREATOR_KEY][TEMP_ZONE_NAME]
-    files_paths = context.user_data[CHARACTERS_CREATOR_KEY][TEMP_MAPS_PATHS]
+    files_paths = context.user_data[CHARACTERS_CREATOR_KEY].get(TEMP_MAPS_PATHS, [])
 
     character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
+    # a zone with the same name is replaced, its maps are not referenced anymore
+    for path in character.maps.get(zone, []):
+        release_file(path)
     character.maps[zone] = files_paths
+    character.touch()
 
     context.user_data[CHARACTERS_CREATOR_KEY].pop(TEMP_ZONE_NAME, None)
     context.user_data[CHARACTERS_CREATOR_KEY].pop(TEMP_MAPS_PATHS, None)
@@ -1,15 +1,18 @@
 from dataclasses import field, dataclass
 from enum import Enum
-from typing import List, Optional, Dict, Tuple, Any
+from typing import List, Optional, Dict, Any, Callable, Hashable, Tuple, TypeVar
 
 from src.character_creator.models.Ability import Ability, RestorationType
 from src.character_creator.models.Currency import Currency
 from src.character_creator.models.FeaturePoints import FeaturePoints
 from src.character_creator.models.Item import Item
 from src.character_creator.models.MultiClass import MultiClass
-from src.character_creator.models.Spell import Spell
+from src.character_creator.models.RollsHistory import RollsHistory
+from src.character_creator.models.Spell import Spell, SpellLevel
 from src.character_creator.models.SpellSlot import SpellSlot
 
+T = TypeVar('T')
+
 
 class SpellsSlotMode(Enum):
     AUTOMATIC = 'automatic'
@@ -18,7 +21,7 @@ class SpellsSlotMode(Enum):
 
 @dataclass
 class Character:
-    VERSION = 8
+    VERSION = 10
 
     name: Optional[str] = field(default=None)
     race: Optional[str] = field(default=None)
@@ -33,19 +36,29 @@ class Character:
     spell_slots_mode: SpellsSlotMode = field(default=None)
     spell_slots: Dict[int, SpellSlot] = field(default_factory=dict)
     MAX_SPELL_SLOT_LEVEL = 9
-    bag: List[Item] = field(default_factory=list)
+    # items indexed by name, in insertion order
+    bag: Dict[str, Item] = field(default_factory=dict)
     spells: List[Spell] = field(default_factory=list)
     abilities: List[Ability] = field(default_factory=list)
     carry_capacity: int = field(default_factory=int)
     currency: Optional[Currency] = field(default_factory=Currency)
     encumbrance: int = field(default_factory=int)
-    rolls_history: Optional[List[Tuple[str, list[int]]]] = field(default_factory=list)
+    rolls_history: RollsHistory = field(default_factory=RollsHistory)
     notes: Dict[str, str] = field(default_factory=dict)
     maps: Dict[str, List[str]] = field(default_factory=dict)
     settings: Dict[str, Any] = field(default_factory=dict)
 
     _version: int = field(default_factory=int)
 
+    # indexes of the spells and of the abilities, not pickled and rebuilt when the character is loaded
+    _spells_by_name: Dict[str, Spell] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _spells_by_level: Dict[int, List[Spell]] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _abilities_by_name: Dict[str, Ability] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    # incremented at every change of the character, the menus rendered at the same revision are reused. Not pickled
+    _revision: int = field(default=0, init=False, repr=False, compare=False)
+    _renders: Dict[Hashable, Tuple[int, Any]] = field(default_factory=dict, init=False, repr=False, compare=False)
+
     def __post_init__(self):
         # If the object does not have the version, migration is necessary
         if not hasattr(self, '_version'):
@@ -65,9 +78,46 @@ class Character:
         if self._version < Character.VERSION:
             self.__migrate()
 
+        self.__index_spells()
+        self.__index_abilities()
+
+    def __setattr__(self, name, value):
+        # assigning a field, e.g. character.current_hit_points -= damage, is a change of the character
+        if not name.startswith('_'):
+            object.__setattr__(self, '_revision', getattr(self, '_revision', 0) + 1)
+        object.__setattr__(self, name, value)
+
     def __reload_stats(self):
         self.carry_capacity = self.feature_points.strength * 15
-        self.encumbrance = sum([item.weight for item in self.bag])
+
+    def __compute_encumbrance(self) -> int:
+        """Weight of all the items in the bag. The encumbrance is then kept updated by the item methods."""
+        return sum(item.weight * item.quantity for item in self.bag.values())
+
+    @staticmethod
+    def __index_bag(items: List[Item]) -> Dict[str, Item]:
+        """Index a list of items by name, merging the quantities of the items with the same name."""
+        bag = {}
+        for item in items:
+            if item.name in bag:
+                bag[item.name].quantity += item.quantity
+            else:
+                bag[item.name] = item
+        return bag
+
+    def __index_spells(self):
+        """Rebuild the indexes of the spells. With duplicated names the first spell is indexed."""
+        self._spells_by_name = {}
+        self._spells_by_level = {}
+        for spell in self.spells:
+            self._spells_by_name.setdefault(spell.name, spell)
+            self._spells_by_level.setdefault(spell.level.value, []).append(spell)
+
+    def __index_abilities(self):
+        """Rebuild the index of the abilities. With duplicated names the first ability is indexed."""
+        self._abilities_by_name = {}
+        for ability in self.abilities:
+            self._abilities_by_name.setdefault(ability.name, ability)
 
     def __migrate(self):
         """Migrates the data to the current version of the class."""
@@ -97,6 +147,17 @@ class Character:
                 self.shield_armor_class = 0
             if not hasattr(self, 'magic_armor'):
                 self.magic_armor = 0
+        if self._version < 9:
+            # Migration for version 9: the bag is indexed by item name
+            if isinstance(self.bag, list):
+                self.bag = self.__index_bag(self.bag)
+            self.encumbrance = self.__compute_encumbrance()
+        if self._version < 10:
+            # Migration for version 10: the rolls history is bounded, the older rolls are kept only in the stats
+            if isinstance(self.rolls_history, list):
+                rolls_history = RollsHistory()
+                rolls_history.extend(self.rolls_history)
+                self.rolls_history = rolls_history
         # Update version's object
         self._version = Character.VERSION
 
@@ -114,55 +175,93 @@ class Character:
             self.__migrate()
 
         self.__reload_stats()
+        self.__index_spells()
+        self.__index_abilities()
+        self._revision = 0
+        self._renders = {}
+
+    def __getstate__(self):
+        """Method called during serialisation, the indexes are rebuilt and the renders reset by __setstate__"""
+        state = self.__dict__.copy()
+        for index in ('_spells_by_name', '_spells_by_level', '_abilities_by_name', '_revision', '_renders'):
+            state.pop(index, None)
+        return state
+
+    @property
+    def revision(self) -> int:
+        """Number that changes every time the character changes."""
+        return self._revision
+
+    def touch(self):
+        """
+        Mark the character as changed. The methods of the class and the assignments of its fields already do it,
+        it must be called after changing the content of a field directly, e.g. character.settings[key] = value.
+        """
+        self._revision += 1
+
+    def cached_render(self, key: Hashable, render: Callable[[], T]) -> T:
+        """
+        Return the result of render, reusing the one computed with the same key if the character hasn't changed since.
+
+        Args:
+            key (Hashable): Identifies the render and its inputs other than the character, e.g. the name of the menu.
+            render (Callable[[], T]): Builds the render from the current state of the character.
+        """
+        cached = self._renders.get(key)
+        if cached is not None and cached[0] == self._revision:
+            return cached[1]
+
+        result = render()
+        self._renders[key] = (self._revision, result)
+        return result
+
+    def get_item(self, item_name: str) -> Optional[Item]:
+        """Return the item of the character's bag with the given name, None if the bag doesn't contain it."""
+        return self.bag.get(item_name)
 
     def add_item(self, item: Item):
         """Add an item to the character's bag and update the encumbrance."""
-        # Check if the item already exists in the bag
-        for existing_item in self.bag:
-            if existing_item == item:
-                # Item exists, update the quantity and encumbrance
-                existing_item.quantity += item.quantity
-                self.encumbrance += item.weight * item.quantity
-                return
-
-        # If the item doesn't exist, add it to the bag
-        self.bag.append(item)
+        existing_item = self.bag.get(item.name)
+        if existing_item:
+            # Item exists, update the quantity
+            existing_item.quantity += item.quantity
+        else:
+            self.bag[item.name] = item
+
         self.encumbrance += item.weight * item.quantity
 
     def increment_item_quantity(self, item_name: str, quantity: int = 1):
         """Increment the quantity of an existing item in the character's bag by a certain amount."""
-        for item in self.bag:
-            if item.name == item_name:
-                item.quantity += quantity
-                self.encumbrance += item.weight * quantity
-                return
+        item = self.bag.get(item_name)
+        if item:
+            item.quantity += quantity
+            self.encumbrance += item.weight * quantity
 
     def decrement_item_quantity(self, item: str, quantity: int = 1):
         """Remove a specific quantity of an item from the character's bag by name."""
-        for existing_item in self.bag:
-            if existing_item.name == item:
-                if existing_item.quantity > quantity:
-                    # Reduce the quantity and update encumbrance
-                    existing_item.quantity -= quantity
-                    self.encumbrance -= existing_item.weight * quantity
-                else:
-                    # Remove the item completely and update encumbrance
-                    self.bag.remove(existing_item)
-                    self.encumbrance -= existing_item.weight * existing_item.quantity
-                break
+        existing_item = self.bag.get(item)
+        if not existing_item:
+            return
+
+        if existing_item.quantity > quantity:
+            # Reduce the quantity and update encumbrance
+            existing_item.quantity -= quantity
+            self.encumbrance -= existing_item.weight * quantity
+        else:
+            # Remove the item completely and update encumbrance
+            del self.bag[item]
+            self.encumbrance -= existing_item.weight * existing_item.quantity
 
     def remove_item(self, item: Item):
         """Remove a specific item from the character's bag."""
-        for existing_item in self.bag:
-            if existing_item == item:
-                # Update encumbrance based on the item's total weight and remove it from the bag
-                self.encumbrance -= existing_item.weight * existing_item.quantity
-                self.bag.remove(existing_item)
-                break
+        existing_item = self.bag.pop(item.name, None)
+        if existing_item:
+            # Update encumbrance based on the item's total weight
+            self.encumbrance -= existing_item.weight * existing_item.quantity
 
     def list_items(self):
         """List all items in the character's bag."""
-        return [str(item) for item in self.bag]
+        return [str(item) for item in self.bag.values()]
 
     def available_space(self):
         """Return how much weight is still supportable from the character"""
@@ -171,10 +270,38 @@ class Character:
     def learn_spell(self, spell: Spell):
         """Adds a spell to the character's spellbook."""
         self.spells.append(spell)
+        self._spells_by_name.setdefault(spell.name, spell)
+        self._spells_by_level.setdefault(spell.level.value, []).append(spell)
+        self.touch()
+
+    def get_spell(self, spell_name: str) -> Optional[Spell]:
+        """Returns the spell with the given name, None if the character doesn't know it."""
+        return self._spells_by_name.get(spell_name)
+
+    def get_spells_of_level(self, level: int) -> List[Spell]:
+        """Returns the spells of a level, in the order they have been learned."""
+        return self._spells_by_level.get(level, [])
+
+    def list_spell_levels(self) -> List[int]:
+        """Returns the levels of the known spells in ascending order."""
+        return sorted(level for level, spells in self._spells_by_level.items() if spells)
+
+    def edit_spell(self, spell_name: str, name: str, description: str, level: SpellLevel) -> Optional[Spell]:
+        """Changes name, description and level of a spell, returns the edited spell or None if it isn't known."""
+        spell = self.get_spell(spell_name)
+        if spell:
+            spell.name = name
+            spell.description = description
+            spell.level = level
+            self.__index_spells()
+            self.touch()
+        return spell
 
     def forget_spell(self, spell_name: str):
         """Removes a spell from the character's spellbook by name."""
-        self.spells = [spell for spell in self.spells if spell.name != spell_name]
+        if spell_name in self._spells_by_name:
+            self.spells = [spell for spell in self.spells if spell.name != spell_name]
+            self.__index_spells()
 
     def list_spells(self):
         """Lists all spells the character has learned."""
@@ -183,22 +310,43 @@ class Character:
     def learn_ability(self, ability: Ability):
         """Adds an ability to the character's abilities list."""
         self.abilities.append(ability)
+        self._abilities_by_name.setdefault(ability.name, ability)
+        self.touch()
+
+    def get_ability(self, ability_name: str) -> Optional[Ability]:
+        """Returns the ability with the given name, None if the character doesn't have it."""
+        return self._abilities_by_name.get(ability_name)
+
+    def edit_ability(self, ability_name: str, name: str, description: str, max_uses: int) -> Optional[Ability]:
+        """Changes name, description and max uses of an ability, returns the edited ability or None if not found."""
+        ability = self.get_ability(ability_name)
+        if ability:
+            ability.name = name
+            ability.description = description
+            ability.max_uses = max_uses
+            self.__index_abilities()
+            self.touch()
+        return ability
 
     def use_ability(self, ability: Ability):
         """Use an ability decreasing the uses from the ability object"""
-        a = next((a for a in self.abilities if a == ability), None)
+        a = self.get_ability(ability.name)
         if a:
             a.use_ability()
+            self.touch()
 
     def toggle_activate_ability(self, ability: Ability):
         """Activate a passive ability"""
-        a = next((a for a in self.abilities if a == ability), None)
+        a = self.get_ability(ability.name)
         if a:
             a.toggle_activate_ability()
+            self.touch()
 
     def forget_ability(self, ability_name: str):
         """Removes an ability from the character's abilities list by name."""
-        self.abilities = [ability for ability in self.abilities if ability.name != ability_name]
+        if ability_name in self._abilities_by_name:
+            self.abilities = [ability for ability in self.abilities if ability.name != ability_name]
+            self.__index_abilities()
 
     def list_abilities(self):
         """Lists all abilities the character has learned."""
@@ -206,41 +354,47 @@ class Character:
 
     def use_spell(self, spell_to_use: Spell, spell_level: int = None):
         """Use a spell consuming the proper spell slot"""
-        for spell in self.spells:
-            if spell.name == spell_to_use.name:
-                if spell_level is None:
-                    self.use_spell_slot(spell.level.value)
-                else:
-                    self.use_spell_slot(spell_level)
+        spell = self.get_spell(spell_to_use.name)
+        if spell:
+            if spell_level is None:
+                self.use_spell_slot(spell.level.value)
+            else:
+                self.use_spell_slot(spell_level)
 
     def add_spell_slot(self, spell_slot: SpellSlot):
         """Adds or updates a spell slot at a given level."""
         self.spell_slots[spell_slot.level] = spell_slot
+        self.touch()
 
     def use_spell_slot(self, level: int):
         """Uses a spell slot at the specified level."""
         if level not in self.spell_slots:
             raise ValueError(f"Nessun slot incantesimo disponibile al livello {level}.")
         self.spell_slots[level].use_slot()
+        self.touch()
 
     def restore_spell_slot(self, level: int):
         """Restores a used spell slot at the specified level."""
         if level not in self.spell_slots:
             raise ValueError(f"Nessun slot incantesimo disponibile al livello {level}.")
         self.spell_slots[level].restore_slot()
+        self.touch()
 
     def restore_all_spell_slots(self):
         """Restores all used spell slots."""
         for slot in self.spell_slots.values():
             slot.restore_all_slots()
+        self.touch()
 
     def add_class(self, class_name: str, levels: int = 1):
         """Adds levels to a specified class using multiclassing."""
         self.multi_class.add_class(class_name, levels)
+        self.touch()
 
     def remove_class(self, class_name: str):
         """Removes a class from the character's multiclass."""
         self.multi_class.remove_class(class_name)
+        self.touch()
 
     def get_class_level(self, class_name: str) -> Optional[int]:
         """Gets the level of a specified class."""
@@ -264,15 +418,16 @@ class Character:
 
     def get_rolls_history(self):
         """Return a formatted string of the rolls history"""
-        return_str = ''
-        for die_name, die_rolls in self.rolls_history:
-            return_str += f"{len(die_rolls)}{die_name}: [{', '.join([str(roll) for roll in die_rolls])}] = {sum(die_rolls)}\n"
+        return self.rolls_history.render()
 
-        return return_str
+    def get_rolls_stats(self):
+        """Return a formatted string of the statistics of all the rolls of every die"""
+        return self.rolls_history.render_stats()
 
     def delete_rolls_history(self):
         """Deletes the rolls history"""
         self.rolls_history.clear()
+        self.touch()
 
     def change_feature_points(self, feature_points: Dict[str, int]):
         self.feature_points.points = feature_points
@@ -285,6 +440,7 @@ class Character:
         for ability in self.abilities:
             if ability.restoration_type == RestorationType.LONG_REST:
                 ability.uses = ability.max_uses
+        self.touch()
 
     def short_rest(self):
         """
@@ -294,6 +450,7 @@ class Character:
         for ability in self.abilities:
             if ability.restoration_type == RestorationType.SHORT_REST:
                 ability.uses = ability.max_uses
+        self.touch()
 
     @property
     def ac(self):
@@ -0,0 +1,168 @@
+from array import array
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Typecodes of the arrays: die sides and results fit in 16 bits, counters and sums in 64 bits
+SIDES_TYPECODE = 'H'
+COUNTER_TYPECODE = 'Q'
+SUM_TYPECODE = 'q'
+MAX_SIDES = 2 ** 16 - 1
+
+
+@dataclass
+class DieStats:
+    """Running aggregates of all the rolls of a die, kept even when the rolls leave the history."""
+    sides: int
+    count: int = 0
+    total: int = 0
+    minimum: int = 0
+    maximum: int = 0
+    histogram: array = field(default=None)
+
+    def __post_init__(self):
+        if self.histogram is None:
+            self.histogram = array(COUNTER_TYPECODE, [0]) * self.sides
+
+    def add(self, rolls: Sequence[int]):
+        """Adds the results of some rolls to the aggregates."""
+        if not rolls:
+            return
+
+        lowest, highest = min(rolls), max(rolls)
+        self.minimum = min(self.minimum, lowest) if self.count else lowest
+        self.maximum = max(self.maximum, highest)
+        self.count += len(rolls)
+        self.total += sum(rolls)
+        for roll in rolls:
+            self.histogram[roll - 1] += 1
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def __str__(self):
+        return (f"d{self.sides}: {self.count} tiri, media {self.mean():.2f}, "
+                f"min {self.minimum}, max {self.maximum}")
+
+
+class RollsHistory:
+    """
+    Bounded history of the dice rolls of a character.
+
+    The last `capacity` rolls are kept in a ring buffer made of typed arrays: for every roll the die sides,
+    the number of dice, the total and up to `max_results` single results. Older rolls are overwritten,
+    but they are still counted by the per die aggregates in `stats`.
+    """
+
+    DEFAULT_CAPACITY = 20
+    DEFAULT_MAX_RESULTS = 20
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, max_results: int = DEFAULT_MAX_RESULTS):
+        """
+        Args:
+            capacity (int): Number of rolls kept in the history.
+            max_results (int): Single results kept for every roll, the others are only summed.
+        """
+        if capacity < 1 or max_results < 1:
+            raise ValueError("La cronologia deve contenere almeno un tiro.")
+
+        self.capacity = capacity
+        self.max_results = max_results
+        self.stats: Dict[int, DieStats] = {}
+
+        self.__sides = array(SIDES_TYPECODE, [0]) * capacity
+        self.__counts = array(COUNTER_TYPECODE, [0]) * capacity
+        self.__totals = array(SUM_TYPECODE, [0]) * capacity
+        self.__results = array(SIDES_TYPECODE, [0]) * (capacity * max_results)
+        # index of the oldest roll and number of rolls in the buffer
+        self.__start = 0
+        self.__length = 0
+
+        self.__rendered: Optional[str] = None
+
+    @staticmethod
+    def parse_die_name(die_name: str) -> int:
+        """Returns the sides of a die from its name, e.g. 20 for 'd20'."""
+        sides = int(die_name.lower().lstrip('d'))
+        if not 1 <= sides <= MAX_SIDES:
+            raise ValueError(f"Dado non valido: {die_name}")
+        return sides
+
+    def add(self, die_name: str, rolls: Sequence[int]):
+        """
+        Adds the results of some dice of the same kind, overwriting the oldest roll if the history is full.
+
+        Args:
+            die_name (str): The die, e.g. 'd20'.
+            rolls (Sequence[int]): The result of every die.
+        """
+        sides = self.parse_die_name(die_name)
+        if any(not 1 <= roll <= sides for roll in rolls):
+            raise ValueError(f"Risultato non valido per un d{sides}")
+
+        if self.__length < self.capacity:
+            index = (self.__start + self.__length) % self.capacity
+            self.__length += 1
+        else:
+            index = self.__start
+            self.__start = (self.__start + 1) % self.capacity
+
+        self.__sides[index] = sides
+        self.__counts[index] = len(rolls)
+        self.__totals[index] = sum(rolls)
+        stored = min(len(rolls), self.max_results)
+        offset = index * self.max_results
+        self.__results[offset:offset + stored] = array(SIDES_TYPECODE, rolls[:stored])
+
+        self.stats.setdefault(sides, DieStats(sides)).add(rolls)
+        self.__rendered = None
+
+    def extend(self, rolls: Iterable[Tuple[str, Sequence[int]]]):
+        """Adds many rolls, given as (die name, results) tuples."""
+        for die_name, die_rolls in rolls:
+            self.add(die_name, die_rolls)
+
+    def clear(self):
+        """Deletes the rolls and the aggregates."""
+        self.__start = 0
+        self.__length = 0
+        self.stats.clear()
+        self.__rendered = None
+
+    def __len__(self):
+        return self.__length
+
+    def __iter__(self) -> Iterator[Tuple[str, List[int]]]:
+        """Yields the rolls in the history, the oldest first, as (die name, stored results) tuples."""
+        for i in range(self.__length):
+            index = (self.__start + i) % self.capacity
+            offset = index * self.max_results
+            stored = min(self.__counts[index], self.max_results)
+            yield f"d{self.__sides[index]}", self.__results[offset:offset + stored].tolist()
+
+    def render(self) -> str:
+        """Returns a line for every roll in the history. The string is cached until the history changes."""
+        if self.__rendered is None:
+            lines = []
+            for i in range(self.__length):
+                index = (self.__start + i) % self.capacity
+                count = self.__counts[index]
+                offset = index * self.max_results
+                results = ', '.join(map(str, self.__results[offset:offset + min(count, self.max_results)]))
+                if count > self.max_results:
+                    results += ', ...'
+                lines.append(f"{count}d{self.__sides[index]}: [{results}] = {self.__totals[index]}\n")
+            self.__rendered = ''.join(lines)
+
+        return self.__rendered
+
+    def render_stats(self) -> str:
+        """Returns a line with the aggregates of every die rolled, sorted by sides."""
+        return ''.join(f"{self.stats[sides]}\n" for sides in sorted(self.stats))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_RollsHistory__rendered'] = None
+        return state
+
+    def __repr__(self):
+        return f"RollsHistory(capacity={self.capacity}, rolls={self.__length}, dice={sorted(self.stats)})"
@@ -4,7 +4,8 @@ from .Currency import Currency
 from .FeaturePoints import FeaturePoints
 from .Item import Item
 from .MultiClass import MultiClass
+from .RollsHistory import RollsHistory
 from .Spell import Spell
 from .SpellSlot import SpellSlot
 
-__all__ = ['Ability', 'Character', 'Currency', 'FeaturePoints', 'Item', 'MultiClass', 'Spell', 'SpellSlot']
+__all__ = ['Ability', 'Character', 'Currency', 'FeaturePoints', 'Item', 'MultiClass', 'RollsHistory', 'Spell', 'SpellSlot']
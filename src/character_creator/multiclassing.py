@@ -4,7 +4,7 @@ from telegram.ext import ContextTypes
 
 from . import *
 from .models import Character
-from .utilities import send_and_save_message, create_main_menu_message
+from .utilities import send_and_save_message, create_main_menu_message, save_message
 
 
 async def character_multiclassing_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -50,7 +50,7 @@ async def character_multiclassing_add_class_query_handler(update: Update, contex
 
 async def character_multiclassing_add_class_answer_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     multi_class_info = update.effective_message.text
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(update.effective_message)
+    save_message(context, update.effective_message)
 
     try:
         class_name, class_level = multi_class_info.split("#", maxsplit=1)
@@ -128,7 +128,7 @@ async def character_multiclassing_remove_class_answer_query_handler(update: Upda
     removed_class_level = multi_class.get_class_level(class_name)
 
     # Remove the class from the multiclass
-    multi_class.remove_class(class_name)
+    character.remove_class(class_name)
 
     # Check how many classes are left
     remaining_classes = list(multi_class.classes.keys())
@@ -136,7 +136,7 @@ async def character_multiclassing_remove_class_answer_query_handler(update: Upda
     if len(remaining_classes) == 1:
         # If only one class is left, automatically assign the removed levels to it
         remaining_class_name = remaining_classes[0]
-        multi_class.add_class(remaining_class_name, removed_class_level)
+        character.add_class(remaining_class_name, removed_class_level)
 
         # Send a confirmation message to the user
         await query.edit_message_text(
@@ -1,5 +1,7 @@
+import asyncio
 import logging
 import os
+from functools import partial
 from typing import Tuple
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -7,11 +9,12 @@ from telegram.constants import ParseMode
 from telegram.error import TelegramError
 from telegram.ext import ContextTypes
 
+from file_id_registry import FILE_ID_REGISTRY
 from . import *
+from .blob_store import BLOB_STORE, release_file
 from .models import Character
-from .utilities import send_and_save_message, extract_3_words
+from .utilities import send_and_save_message, extract_3_words, save_message
 
-VOICE_NOTES_PATH = FILES_DIR_PATH + 'voice_notes'
 logger = logging.getLogger(__name__)
 
 
@@ -70,7 +73,7 @@ async def character_creator_open_note_query_handler(update: Update, context: Con
     note_title, note_text = next(((title, text) for title, text in character.notes.items() if title == title_text))
 
     # distinguish behaviour if the note is a vocal message or a text note
-    if os.path.exists(note_text):
+    if os.path.exists(note_text) or note_text in FILE_ID_REGISTRY:
         # the note is a voice note
         message_str = (f"Usa /stop per terminare o un bottone del menù principale per cambiare funzione\n\n"
                        f"<b>Titolo nota:</b> {note_title}")
@@ -78,12 +81,12 @@ async def character_creator_open_note_query_handler(update: Update, context: Con
             [InlineKeyboardButton('Elimina nota', callback_data=f"{DELETE_NOTE_CALLBACK_DATA}|{note_title}")],
             [InlineKeyboardButton('Indietro 🔙', callback_data=f"{BACK_BUTTON_CALLBACK_DATA}")]
         ]
-        message = await update.effective_message.reply_voice(note_text,
-                                                             caption=message_str,
-                                                             reply_markup=InlineKeyboardMarkup(keyboard),
-                                                             parse_mode=ParseMode.HTML)
+        message = await FILE_ID_REGISTRY.send(note_text, partial(update.effective_message.reply_voice,
+                                                                 caption=message_str,
+                                                                 reply_markup=InlineKeyboardMarkup(keyboard),
+                                                                 parse_mode=ParseMode.HTML))
 
-        context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(message)
+        save_message(context, message)
 
     else:
         # the note is a text note
@@ -134,7 +137,10 @@ async def character_creator_delete_note_query_handler(update: Update, context: C
     title_text = data.split('|')[1]
 
     character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
-    character.notes.pop(title_text, None)
+    note_text = character.notes.pop(title_text, None)
+    character.touch()
+    if note_text:
+        release_file(note_text)
 
     await query.answer('Nota eliminata con successo ✅', show_alert=True)
     message_str, reply_markup = create_notes_menu(character)
@@ -161,7 +167,7 @@ async def character_creator_notes_back_query_handler(update: Update, context: Co
 
 
 async def character_creator_insert_note_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(update.effective_message)
+    save_message(context, update.effective_message)
     text = update.effective_message.text
     message_splitted = text.split("#")
 
@@ -174,9 +180,11 @@ async def character_creator_insert_note_text(update: Update, context: ContextTyp
         note_text = message_splitted[1]
 
     # manage insertion or edit
-    if note_title in character.notes:
-        character.notes.pop(note_title, None)
+    old_note = character.notes.pop(note_title, None)
     character.notes[note_title] = note_text
+    character.touch()
+    if old_note:
+        release_file(old_note)
 
     await send_and_save_message(update, context, "Nota salvata con successo! ✅")
     message_str, reply_markup = create_notes_menu(character)
@@ -186,18 +194,18 @@ async def character_creator_insert_note_text(update: Update, context: ContextTyp
 
 
 async def character_creator_insert_voice_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    # create voice notes folder if it doesn't exist
-    os.makedirs(VOICE_NOTES_PATH, exist_ok=True)
-
     message = update.effective_message
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(message)
+    save_message(context, message)
     voice = message.voice
     voice_file = await voice.get_file()
-    voice_message_path = os.path.join(VOICE_NOTES_PATH, f"{voice.file_unique_id}.ogg")
-    final_voice_path = await voice_file.download_to_drive(voice_message_path)
+    # download the voice message and move it in the blob store
+    voice_message_path = await voice_file.download_to_drive(BLOB_STORE.temp_path(f"{voice.file_unique_id}.ogg"))
+    final_voice_path = await asyncio.to_thread(BLOB_STORE.put_file, str(voice_message_path))
+    FILE_ID_REGISTRY.set(final_voice_path, voice.file_id)
 
     # save the final vocal message path into userdata
     context.user_data[CHARACTERS_CREATOR_KEY][TEMP_VOICE_MESSAGE_PATH] = final_voice_path
+    BLOB_STORE.add_reference(final_voice_path)
 
     await send_and_save_message(update, context, "Mandami il titolo del messaggio vocale\n\n"
                                                  "Usa /stop per terminare o un bottone del menù principale per cambiare funzione")
@@ -207,7 +215,7 @@ async def character_creator_insert_voice_message(update: Update, context: Contex
 
 async def character_creator_save_voice_note(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     message = update.effective_message
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(message)
+    save_message(context, message)
     voice_note_title = message.text
 
     if voice_note_title.strip() == '':
@@ -219,9 +227,11 @@ async def character_creator_save_voice_note(update: Update, context: ContextType
     context.user_data[CHARACTERS_CREATOR_KEY].pop(TEMP_VOICE_MESSAGE_PATH, None)
 
     # manage insertion or edit
-    if voice_note_title in character.notes:
-        character.notes.pop(voice_note_title, None)
+    old_note = character.notes.pop(voice_note_title, None)
     character.notes[voice_note_title] = final_voice_path
+    character.touch()
+    if old_note:
+        release_file(old_note)
 
     await send_and_save_message(update, context, "Nota salvata con successo! ✅")
     message_str, reply_markup = create_notes_menu(character)
@@ -90,6 +90,7 @@ async def character_creator_settings_callback_handler(update: Update, context: C
 
         # Update the character's settings
         character.settings[setting_key] = selected_value
+        character.touch()
 
         # Answer the query
         await query.answer()
@@ -5,11 +5,21 @@ from telegram.ext import ContextTypes
 from . import *
 from .models import Character, SpellSlot
 from .models.Character import SpellsSlotMode
-from .utilities import send_and_save_message
+from .utilities import send_and_save_message, save_message
 
 
-def create_spell_slots_menu(context: ContextTypes.DEFAULT_TYPE):
-    character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
+# rows under the slots, they never change
+SPELL_SLOTS_ACTIONS_ROWS = (
+    (
+        InlineKeyboardButton("Inserisci nuovo slot", callback_data=SPELLS_SLOTS_INSERT_CALLBACK_DATA),
+        InlineKeyboardButton("Rimuovi slot", callback_data=SPELLS_SLOTS_REMOVE_CALLBACK_DATA),
+    ),
+    (InlineKeyboardButton("Resetta utilizzi slot", callback_data=SPELLS_SLOTS_RESET_CALLBACK_DATA),),
+    (InlineKeyboardButton("Cambia modalità", callback_data=SPELLS_SLOTS_CHANGE_CALLBACK_DATA),)
+)
+
+
+def _render_spell_slots_menu(character: Character):
     message_str = (f"Seleziona i pulsanti con gli slot liberi 🟦 per utilizzare uno slot del livello corrispondente.\n\n"
                    f"Usa /stop per terminare o un bottone del menù principale per cambiare funzione")
     keyboard = []
@@ -19,38 +29,23 @@ def create_spell_slots_menu(context: ContextTypes.DEFAULT_TYPE):
 
     else:
 
-        spell_slots_buttons = []
-
-        # Sort slots by level (dictionary key)
+        # Sort slots by level (dictionary key), a slot for each row
         for level, slot in sorted(character.spell_slots.items()):
-            spell_slots_buttons.append(InlineKeyboardButton(
+            keyboard.append([InlineKeyboardButton(
                 f"{str(slot.level)} {'🟥' * slot.used_slots}{'🟦' * (slot.total_slots - slot.used_slots)}",
-                callback_data=f"{SPELL_SLOT_SELECTED_CALLBACK_DATA}|{slot.level}"))
-
-        # Group buttons into rows of maximum 3 buttons each
-        for slot in spell_slots_buttons:
-            keyboard.append([slot])
+                callback_data=f"{SPELL_SLOT_SELECTED_CALLBACK_DATA}|{slot.level}")])
 
-    keyboard.append(
-        [
-            InlineKeyboardButton("Inserisci nuovo slot", callback_data=SPELLS_SLOTS_INSERT_CALLBACK_DATA),
-            InlineKeyboardButton("Rimuovi slot", callback_data=SPELLS_SLOTS_REMOVE_CALLBACK_DATA),
-        ]
-    )
-    keyboard.append(
-        [
-            InlineKeyboardButton("Resetta utilizzi slot", callback_data=SPELLS_SLOTS_RESET_CALLBACK_DATA)
-        ]
-    )
-    keyboard.append(
-        [
-            InlineKeyboardButton("Cambia modalità", callback_data=SPELLS_SLOTS_CHANGE_CALLBACK_DATA)
-        ]
-    )
+    keyboard.extend(SPELL_SLOTS_ACTIONS_ROWS)
 
     return message_str, InlineKeyboardMarkup(keyboard)
 
 
+def create_spell_slots_menu(context: ContextTypes.DEFAULT_TYPE):
+    """Text and keyboard of the spell slots menu, rendered again only if the character has changed."""
+    character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
+    return character.cached_render('spell_slots_menu', lambda: _render_spell_slots_menu(character))
+
+
 async def character_spells_slots_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
@@ -121,7 +116,7 @@ async def character_spells_slots_add_query_handler(update: Update, context: Cont
 
 async def character_spell_slot_add_answer_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     data = update.effective_message.text
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(update.effective_message)
+    save_message(context, update.effective_message)
 
     try:
         slot_number, slot_level = data.split("#", maxsplit=1)
@@ -186,7 +181,7 @@ async def character_spells_slots_remove_query_handler(update: Update, context: C
 
 async def character_spell_slot_remove_answer_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     data = update.effective_message.text
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(update.effective_message)
+    save_message(context, update.effective_message)
 
     try:
         slot_number, slot_level = data.split("#", maxsplit=1)
@@ -234,6 +229,7 @@ async def character_spell_slot_remove_answer_query_handler(update: Update, conte
     else:
         spell_slot_to_edit.total_slots -= slot_number
         await send_and_save_message(update, context, f"{slot_number} slot di livello {slot_level} rimossi!")
+    character.touch()
 
     message_str, reply_markup = create_spell_slots_menu(context)
     await send_and_save_message(update, context, message_str, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
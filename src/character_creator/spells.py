@@ -1,4 +1,3 @@
-from collections import defaultdict
 from typing import Tuple
 
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
@@ -8,7 +7,7 @@ from telegram.ext import ContextTypes
 from . import *
 from .models import Character, Spell
 from .models.Spell import SpellLevel
-from .utilities import send_and_save_message, generate_spells_list_keyboard
+from .utilities import send_and_save_message, generate_spells_list_keyboard, save_message
 
 
 async def create_spells_menu(character: Character, update: Update, context: ContextTypes.DEFAULT_TYPE,
@@ -30,18 +29,8 @@ async def create_spells_menu(character: Character, update: Update, context: Cont
 
         return SPELL_LEARN
 
-    spells = character.spells
-
-    # Group spells by level
-    level_to_spells = defaultdict(list)
-    for spell in spells:
-        level_to_spells[spell.level.value].append(spell)
-
     # Create pages as a list of tuples (level, spells of that level)
-    levels = sorted(level_to_spells.keys())
-    pages = []
-    for level in levels:
-        pages.append((level, level_to_spells[level]))
+    pages = [(level, character.get_spells_of_level(level)) for level in character.list_spell_levels()]
 
     # Save pages in user context
     context.user_data[CHARACTERS_CREATOR_KEY][INLINE_PAGES_KEY] = pages
@@ -85,22 +74,15 @@ async def create_spell_levels_menu(character: Character, update: Update, context
 
         return SPELL_LEARN
 
-    spells = character.spells
     buttons = []
 
-    # Group spells by their level
     # generate keyboared with spell level
-    spells_by_level = {}
-
-    for spell in spells:
-        spells_by_level.setdefault(spell.level.value, []).append(spell)
-
     # Iterate over the available spell levels (from 1 to 9)
     for level in SpellLevel:
         spell_level = level.value
 
         # Check if there is at least one spell of this level
-        if spell_level in spells_by_level:
+        if character.get_spells_of_level(spell_level):
             # Check if slots are available for this level
             spell_slot = character.spell_slots.get(spell_level)
             if spell_slot:
@@ -201,7 +183,7 @@ async def character_spells_by_level_query_handler(update: Update, context: Conte
     spell_level = int(spell_level)
 
     character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
-    spells_of_selected_level = [spell for spell in character.spells if spell.level.value == spell_level]
+    spells_of_selected_level = character.get_spells_of_level(spell_level)
     message_str = (f"Ecco la lista degli incantesimi di livello {spell_level}\n\n"
                    f"Usa /stop per terminare o un bottone del menù principale per cambiare funzione")
 
@@ -269,7 +251,7 @@ async def character_spells_menu_query_handler(update: Update, context: ContextTy
         await query.answer()
         _, spell_name = data.split('|', maxsplit=1)
         character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
-        spell: Spell = next((spell for spell in character.spells if spell.name == spell_name), None)
+        spell: Spell = character.get_spell(spell_name)
 
         if spell is None:
             await query.answer("Incantesimo non trovato.", show_alert=True)
@@ -378,7 +360,7 @@ async def character_spell_new_query_handler(update: Update, context: ContextType
 
 async def character_spell_learn_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     spell_info = update.effective_message.text
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(update.effective_message)
+    save_message(context, update.effective_message)
 
     try:
         spell_name, spell_desc, spell_level = spell_info.split("#", 2)
@@ -403,7 +385,7 @@ async def character_spell_learn_handler(update: Update, context: ContextTypes.DE
     spell = Spell(spell_name, spell_desc, SpellLevel(int(spell_level)))
     character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
 
-    if any(spell_name == spell.name for spell in character.spells):
+    if character.get_spell(spell_name):
         await send_and_save_message(
             update,
             context,
@@ -433,7 +415,7 @@ async def character_spell_learn_handler(update: Update, context: ContextTypes.DE
 
 async def character_spell_edit_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     spell_info = update.effective_message.text
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(update.effective_message)
+    save_message(context, update.effective_message)
 
     try:
         spell_name, spell_desc, spell_level = spell_info.split("#", 2)
@@ -458,15 +440,11 @@ async def character_spell_edit_handler(update: Update, context: ContextTypes.DEF
     old_spell: Spell = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_SPELL_KEY]
     character: Character = context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_CHARACTER_KEY]
 
-    for spell in character.spells:
-        if spell.name == old_spell.name:
-            old_spell.name = spell_name
-            old_spell.description = spell_desc
-            old_spell.level = SpellLevel(int(spell_level))
-            break
+    spell = character.edit_spell(old_spell.name, spell_name, spell_desc, SpellLevel(int(spell_level))) or old_spell
+    context.user_data[CHARACTERS_CREATOR_KEY][CURRENT_SPELL_KEY] = spell
 
     await send_and_save_message(update, context, "Incantesimo modificato con successo!")
-    message_str, reply_markup = create_spell_menu(old_spell)
+    message_str, reply_markup = create_spell_menu(spell)
     await send_and_save_message(update, context, message_str, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
 
     return SPELL_VISUALIZATION
@@ -1,22 +1,89 @@
-from typing import List, Tuple
-
-from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+import logging
+from collections import deque, defaultdict
+from functools import lru_cache
+from typing import List, Tuple, Deque, Iterable, Dict
+
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton, Message, Bot
+from telegram.constants import BulkRequestLimit
+from telegram.error import TelegramError
 from telegram.ext import ContextTypes
 
 from . import *
 from .models import Spell, Ability, Character
 
+logger = logging.getLogger(__name__)
+
+
+def get_last_menu_messages(context: ContextTypes.DEFAULT_TYPE) -> Deque[Tuple[int, int]]:
+    """
+    Return the bounded buffer of the (chat_id, message_id) of the menu messages to delete,
+    creating it or converting the old list of Message objects if needed.
+    """
+    messages = context.user_data[CHARACTERS_CREATOR_KEY].get(LAST_MENU_MESSAGES)
+
+    if not isinstance(messages, deque) or messages.maxlen != LAST_MENU_MESSAGES_MAX_LENGTH:
+        messages = deque(
+            ((message.chat_id, message.message_id) if isinstance(message, Message) else tuple(message)
+             for message in (messages or [])),
+            maxlen=LAST_MENU_MESSAGES_MAX_LENGTH
+        )
+        context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES] = messages
+
+    return messages
+
+
+def save_message(context: ContextTypes.DEFAULT_TYPE, message: Message) -> None:
+    """Save the chat and message ids of a message so that it's deleted when the menu changes."""
+    messages = get_last_menu_messages(context)
+    message_ids = (message.chat_id, message.message_id)
+
+    if message_ids not in messages:
+        messages.append(message_ids)
+
+
+def pop_last_menu_messages(context: ContextTypes.DEFAULT_TYPE) -> List[Tuple[int, int]]:
+    """Return the (chat_id, message_id) of the saved menu messages and stop tracking them."""
+    messages = get_last_menu_messages(context)
+    popped_messages = list(messages)
+    messages.clear()
+
+    return popped_messages
+
+
+async def delete_messages(bot: Bot, messages: Iterable[Tuple[int, int]]) -> None:
+    """
+    Delete messages with the bulk deleteMessages call, up to 100 messages for each request.
+    If a bulk request fails, the messages of that request are deleted one by one.
+    """
+    messages_by_chat: Dict[int, List[int]] = defaultdict(list)
+    for chat_id, message_id in messages:
+        messages_by_chat[chat_id].append(message_id)
+
+    for chat_id, message_ids in messages_by_chat.items():
+        for i in range(0, len(message_ids), BulkRequestLimit.MAX_LIMIT):
+            chunk = message_ids[i:i + BulkRequestLimit.MAX_LIMIT]
+            try:
+                await bot.delete_messages(chat_id=chat_id, message_ids=chunk)
+            except TelegramError as e:
+                logger.warning(f"Errore durante la cancellazione multipla dei messaggi: {e}")
+                for message_id in chunk:
+                    try:
+                        await bot.delete_message(chat_id=chat_id, message_id=message_id)
+                    except TelegramError as e:
+                        logger.warning(f"Errore durante la cancellazione del messaggio: {e}")
+
+
+def delete_messages_in_background(update: Update, context: ContextTypes.DEFAULT_TYPE,
+                                  messages: List[Tuple[int, int]]) -> None:
+    """Schedule the deletion of the messages without waiting for it."""
+    if messages:
+        context.application.create_task(delete_messages(context.bot, messages), update=update)
+
 
 async def send_and_save_message(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, **kwargs):
     """Wrapper for reply_text that saves the last message in user_data."""
     message = await update.effective_message.reply_text(text, **kwargs)
-
-    # Check if the mailing list already exists, if not, create it
-    if LAST_MENU_MESSAGES not in context.user_data[CHARACTERS_CREATOR_KEY]:
-        context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES] = []
-
-    # Add new message to the list
-    context.user_data[CHARACTERS_CREATOR_KEY][LAST_MENU_MESSAGES].append(message)
+    save_message(context, message)
 
     return message
 
@@ -49,11 +116,39 @@ M   M  O   O  R  R    T   O   O
 M   M   OOO   R   R   T    OOO</code>"""
 
 
+# Keyboards and buttons that never change, InlineKeyboardMarkup objects are immutable and can be shared
+NAVIGATION_BUTTONS = (InlineKeyboardButton("⬅️ Precedente", callback_data="prev_page"),
+                      InlineKeyboardButton("Successiva ➡️", callback_data="next_page"))
+LEARN_SPELL_BUTTONS = (InlineKeyboardButton("Impara nuova spell", callback_data=SPELL_LEARN_CALLBACK_DATA),)
+LEARN_ABILITY_BUTTONS = (InlineKeyboardButton("Impara nuova abilità", callback_data=SPELL_LEARN_CALLBACK_DATA),)
+SPELL_USAGE_BACK_BUTTONS = (InlineKeyboardButton('Indietro 🔙', callback_data='spell_usage_back_menu'),)
+
+
+def _names_keyboard(buttons: Iterable[Tuple[str, str]],
+                    *rows: Tuple[InlineKeyboardButton, ...]) -> InlineKeyboardMarkup:
+    """Keyboard with two (text, callback data) buttons per row, followed by the given rows."""
+    buttons = [InlineKeyboardButton(text, callback_data=callback_data) for text, callback_data in buttons]
+    keyboard = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+    keyboard.extend(rows)
+    return InlineKeyboardMarkup(keyboard)
+
+
+@lru_cache(maxsize=1024)
+def _spells_list_keyboard(spell_names: Tuple[str, ...], draw_navigation_buttons: bool,
+                          draw_back_button: bool) -> InlineKeyboardMarkup:
+    rows = [NAVIGATION_BUTTONS] if draw_navigation_buttons else []
+    rows.append(LEARN_SPELL_BUTTONS)
+    if draw_back_button:
+        rows.append(SPELL_USAGE_BACK_BUTTONS)
+    return _names_keyboard(((name, f"spell_name|{name}") for name in spell_names), *rows)
+
+
 def generate_spells_list_keyboard(spells: List[Spell],
                                   draw_navigation_buttons: bool = True,
                                   draw_back_button: bool = True) -> InlineKeyboardMarkup:
     """
     Generates an inline keyboard markup for the provided list of spells.
+    The keyboard only depends on the names, so the same page of spells reuses the same keyboard.
 
     Args:
         spells (List[Spell]): List of ability objects.
@@ -62,37 +157,23 @@ def generate_spells_list_keyboard(spells: List[Spell],
     Returns:
         InlineKeyboardMarkup: The generated inline keyboard markup.
     """
-    keyboard = []
-    row = []
-    for spell in spells:
-        button = InlineKeyboardButton(spell.name, callback_data=f"spell_name|{spell.name}")
-        row.append(button)
-
-        if len(row) == 2:
-            keyboard.append(row)
-            row = []
-
-    # Append any remaining buttons if the total is an odd number
-    if row:
-        keyboard.append(row)
-
-    if draw_navigation_buttons:
-        # Add navigation buttons
-        navigation_buttons = [InlineKeyboardButton("⬅️ Precedente", callback_data="prev_page"),
-                              InlineKeyboardButton("Successiva ➡️", callback_data="next_page")]
-        keyboard.append(navigation_buttons)
-    keyboard.append([InlineKeyboardButton("Impara nuova spell", callback_data=SPELL_LEARN_CALLBACK_DATA)])
+    return _spells_list_keyboard(tuple(spell.name for spell in spells), draw_navigation_buttons, draw_back_button)
 
-    if draw_back_button:
-        keyboard.append([InlineKeyboardButton('Indietro 🔙', callback_data='spell_usage_back_menu')])
 
-    return InlineKeyboardMarkup(keyboard)
+@lru_cache(maxsize=1024)
+def _abilities_list_keyboard(abilities: Tuple[Tuple[str, bool], ...],
+                             draw_navigation_buttons: bool) -> InlineKeyboardMarkup:
+    rows = [NAVIGATION_BUTTONS] if draw_navigation_buttons else []
+    rows.append(LEARN_ABILITY_BUTTONS)
+    return _names_keyboard(((f"{'✅ ' if activated else ''}{name}", f"ability_name|{name}")
+                            for name, activated in abilities), *rows)
 
 
 def generate_abilities_list_keyboard(abilities: List[Ability],
                                      draw_navigation_buttons: bool = True) -> InlineKeyboardMarkup:
     """
     Generates an inline keyboard markup for the provided list of abilities.
+    The keyboard only depends on names and activation, so the same page of abilities reuses the same keyboard.
 
     Args:
         abilities (List[Ability]): List of ability objects.
@@ -101,33 +182,48 @@ def generate_abilities_list_keyboard(abilities: List[Ability],
     Returns:
         InlineKeyboardMarkup: The generated inline keyboard markup.
     """
-    keyboard = []
-    row = []
-    for ability in abilities:
-        button = InlineKeyboardButton(f"{'✅ ' if ability.activated else ''}{ability.name}",
-                                      callback_data=f"ability_name|{ability.name}")
-        row.append(button)
-
-        if len(row) == 2:
-            keyboard.append(row)
-            row = []
-
-    # Append any remaining buttons if the total is an odd number
-    if row:
-        keyboard.append(row)
-
-    if draw_navigation_buttons:
-        # Add navigation buttons
-        navigation_buttons = [InlineKeyboardButton("⬅️ Precedente", callback_data="prev_page"),
-                              InlineKeyboardButton("Successiva ➡️", callback_data="next_page")]
-        keyboard.append(navigation_buttons)
-
-    keyboard.append([InlineKeyboardButton("Impara nuova abilità", callback_data=SPELL_LEARN_CALLBACK_DATA)])
-
-    return InlineKeyboardMarkup(keyboard)
-
-
-def create_main_menu_message(character: Character) -> Tuple[str, InlineKeyboardMarkup]:
+    return _abilities_list_keyboard(tuple((ability.name, ability.activated) for ability in abilities),
+                                    draw_navigation_buttons)
+
+
+MAIN_MENU_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton('⬇️ Level down', callback_data=LEVEL_DOWN_CALLBACK_DATA),
+        InlineKeyboardButton('⬆️ Level up', callback_data=LEVEL_UP_CALLBACK_DATA)
+    ],
+    [
+        InlineKeyboardButton('💔 Prendi danni', callback_data=DAMAGE_CALLBACK_DATA),
+        InlineKeyboardButton('❤️‍🩹 Curati', callback_data=HEALING_CALLBACK_DATA)
+    ],
+    [
+        InlineKeyboardButton('🧬 Gestisci punti ferita 💉', callback_data=HIT_POINTS_CALLBACK_DATA)
+    ],
+    [
+        InlineKeyboardButton('🛡 Punti Armatura 🛡', callback_data=ARMOR_CLASS_CALLBACK_DATA)
+    ],
+    [
+        InlineKeyboardButton('🧳 Borsa', callback_data=BAG_CALLBACK_DATA),
+        InlineKeyboardButton('🗯 Azioni', callback_data=ABILITIES_CALLBACK_DATA),
+        InlineKeyboardButton('📖 Spell', callback_data=SPELLS_CALLBACK_DATA)
+    ],
+    [InlineKeyboardButton('🔮 Gestisci slot incantesimo', callback_data=SPELLS_SLOT_CALLBACK_DATA)],
+    [InlineKeyboardButton('🧮 Punti caratteristica', callback_data=FEATURE_POINTS_CALLBACK_DATA)],
+    [InlineKeyboardButton('🪓🛡🪄 Gestisci multiclasse', callback_data=MULTICLASSING_CALLBACK_DATA)],
+    [
+        InlineKeyboardButton('🌙 Riposo lungo', callback_data=LONG_REST_WARNING_CALLBACK_DATA),
+        InlineKeyboardButton('🍻 Riposo breve', callback_data=SHORT_REST_WARNING_CALLBACK_DATA)
+    ],
+    [InlineKeyboardButton('🎲 Lancia Dado', callback_data=ROLL_DICE_MENU_CALLBACK_DATA)],
+    [
+        InlineKeyboardButton('🗒 Note', callback_data=NOTES_CALLBACK_DATA),
+        InlineKeyboardButton('🗺 Mappe', callback_data=MAPS_CALLBACK_DATA)
+    ],
+    [InlineKeyboardButton('⚙️ Impostazioni', callback_data=SETTINGS_CALLBACK_DATA)],
+    [InlineKeyboardButton('🗑️ Elimina personaggio', callback_data=DELETE_CHARACTER_CALLBACK_DATA)]
+])
+
+
+def _render_main_menu_message(character: Character) -> str:
     if character.current_hit_points <= -character.hit_points:
         health_str = '☠️\n'
     else:
@@ -146,43 +242,12 @@ def create_main_menu_message(character: Character) -> Tuple[str, InlineKeyboardM
                    f"<b>Slot incantesimo</b>\n{"\n".join([f"L{str(slot.level)}  {"🟥" * slot.used_slots}{"🟦" * (slot.total_slots - slot.used_slots)}" for _, slot in sorted(character.spell_slots.items())]) if character.spell_slots else "Non hai registrato ancora nessuno Slot incantesimo"}\n\n"
                    f"<b>Abilità passive attivate:</b>\n{'\n'.join(ability.name for ability in character.abilities if ability.activated) if any(ability.activated for ability in character.abilities) else 'Nessuna abilità attiva'}\n")
 
-    keyboard = [
-        [
-            InlineKeyboardButton('⬇️ Level down', callback_data=LEVEL_DOWN_CALLBACK_DATA),
-            InlineKeyboardButton('⬆️ Level up', callback_data=LEVEL_UP_CALLBACK_DATA)
-        ],
-        [
-            InlineKeyboardButton('💔 Prendi danni', callback_data=DAMAGE_CALLBACK_DATA),
-            InlineKeyboardButton('❤️‍🩹 Curati', callback_data=HEALING_CALLBACK_DATA)
-        ],
-        [
-            InlineKeyboardButton('🧬 Gestisci punti ferita 💉', callback_data=HIT_POINTS_CALLBACK_DATA)
-        ],
-        [
-            InlineKeyboardButton('🛡 Punti Armatura 🛡', callback_data=ARMOR_CLASS_CALLBACK_DATA)
-        ],
-        [
-            InlineKeyboardButton('🧳 Borsa', callback_data=BAG_CALLBACK_DATA),
-            InlineKeyboardButton('🗯 Azioni', callback_data=ABILITIES_CALLBACK_DATA),
-            InlineKeyboardButton('📖 Spell', callback_data=SPELLS_CALLBACK_DATA)
-        ],
-        [InlineKeyboardButton('🔮 Gestisci slot incantesimo', callback_data=SPELLS_SLOT_CALLBACK_DATA)],
-        [InlineKeyboardButton('🧮 Punti caratteristica', callback_data=FEATURE_POINTS_CALLBACK_DATA)],
-        [InlineKeyboardButton('🪓🛡🪄 Gestisci multiclasse', callback_data=MULTICLASSING_CALLBACK_DATA)],
-        [
-            InlineKeyboardButton('🌙 Riposo lungo', callback_data=LONG_REST_WARNING_CALLBACK_DATA),
-            InlineKeyboardButton('🍻 Riposo breve', callback_data=SHORT_REST_WARNING_CALLBACK_DATA)
-        ],
-        [InlineKeyboardButton('🎲 Lancia Dado', callback_data=ROLL_DICE_MENU_CALLBACK_DATA)],
-        [
-            InlineKeyboardButton('🗒 Note', callback_data=NOTES_CALLBACK_DATA),
-            InlineKeyboardButton('🗺 Mappe', callback_data=MAPS_CALLBACK_DATA)
-        ],
-        [InlineKeyboardButton('⚙️ Impostazioni', callback_data=SETTINGS_CALLBACK_DATA)],
-        [InlineKeyboardButton('🗑️ Elimina personaggio', callback_data=DELETE_CHARACTER_CALLBACK_DATA)]
-    ]
-
-    return message_str, InlineKeyboardMarkup(keyboard)
+    return message_str
+
+
+def create_main_menu_message(character: Character) -> Tuple[str, InlineKeyboardMarkup]:
+    """Text and keyboard of the main menu, the text is rendered again only if the character has changed."""
+    return character.cached_render('main_menu', lambda: _render_main_menu_message(character)), MAIN_MENU_KEYBOARD
 
 
 def extract_3_words(string: str) -> str:
@@ -3,12 +3,12 @@ from typing import List
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.constants import ParseMode
 from telegram.ext import ContextTypes, ConversationHandler
-from thefuzz import fuzz
 
 from DndService import DndService
 from model.APIResource import APIResource
 from model.ClassLevelResource import ClassLevelResource
 from model.SpellResource import SpellResource
+from spell_search import get_class_spells_index
 from util import chunk_list, generate_resource_list_keyboard
 
 # State definitions for class sub conversation
@@ -119,11 +119,15 @@ async def class_reading_spells_menu_buttons_query_handler(update: Update, contex
         return CLASS_SPELL_VISUALIZATION
 
     # retrieve other spells
-    spells_page: List[APIResource] = context.chat_data[WIKI][CLASS_SPELLS_PAGES][
-        context.chat_data[WIKI][CURRENT_CLASS_SPELLS_INLINE_PAGE]]
+    try:
+        spells_page: List[APIResource] = context.chat_data[WIKI][CLASS_SPELLS_PAGES][
+            context.chat_data[WIKI][CURRENT_CLASS_SPELLS_INLINE_PAGE]]
+    except IndexError:
+        spells_page = []
 
     if not spells_page:
         await query.answer("Non ci sono altre pagine!")
+        context.chat_data[WIKI][CURRENT_CLASS_SPELLS_INLINE_PAGE] -= 1
         return CLASS_READING_SPELLS_SEARCHING
 
     reply_markup = generate_resource_list_keyboard(spells_page)
@@ -157,32 +161,36 @@ async def class_search_spells_text_handler(update: Update, context: ContextTypes
         await update.effective_message.reply_text('Inserisci un nome valido. Hai inserito un numero...')
         return CLASS_MANUAL_SPELLS_SEARCHING
 
-    async with DndService() as dnd_service:
-        resource_details = await dnd_service.get_spells_by_class_index(class_index)
-
-    spells = resource_details['results']
-    spells_dict = {spell['name'].lower(): spell['url'] for spell in spells}
+    spells_index = await get_class_spells_index(class_index)
 
-    if text in spells_dict:
-        # the spell exists in the dict exactly how it's been written
+    exact_match = spells_index.get_exact(text)
+    if exact_match:
+        # the spell exists exactly how it's been written
         # call the spell endpoint
         async with DndService() as dnd_service:
-            resource_details = await dnd_service.get_resource_by_class_resource(spells_dict[text])
+            resource_details = await dnd_service.get_resource_by_class_resource(exact_match.url)
 
         spell = SpellResource(**resource_details)
         await update.effective_message.reply_text(str(spell), parse_mode=ParseMode.HTML)
 
-    else:
-        # do fuzzy research
-        for spell in spells_dict:
-            if fuzz.token_set_ratio(text, spell) > 50:
-                # call the spell endpoint
-                async with DndService() as dnd_service:
-                    resource_details = await dnd_service.get_resource_by_class_resource(spells_dict[spell])
-                    spell = SpellResource(**resource_details)
-                    await update.effective_message.reply_text(str(spell), parse_mode=ParseMode.HTML)
-
-    return ConversationHandler.END
+        return ConversationHandler.END
+
+    # do fuzzy research
+    results = spells_index.search(text)
+    if not results:
+        await update.effective_message.reply_text('Nessuna spell trovata! Prova con un altro nome o usa /stop per '
+                                                  'terminare la conversazione')
+        return CLASS_MANUAL_SPELLS_SEARCHING
+
+    # show the results as a single page of spells
+    context.chat_data[WIKI][CLASS_SPELLS_PAGES] = [results]
+    context.chat_data[WIKI][CURRENT_CLASS_SPELLS_INLINE_PAGE] = 0
+
+    reply_markup = generate_resource_list_keyboard(results, draw_navigation_buttons=False)
+    await update.effective_message.reply_text(f"(Premi /stop per tornare al menu principle)\n"
+                                              f"Ecco le spell più simili a \"{text}\":", reply_markup=reply_markup)
+
+    return CLASS_READING_SPELLS_SEARCHING
 
 
 async def class_resources_submenu_text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -0,0 +1,309 @@
+import html
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from dice_odds import expression_distribution
+from dice_roller import DiceExpression, DiceRoller, parse_dice_expression
+from model import models
+
+# Number of simulated fights, every fight lasts at most SIMULATION_MAX_ROUNDS rounds
+SIMULATION_SAMPLES = int(os.getenv('DND_SIMULATION_SAMPLES', '100000'))
+SIMULATION_MAX_ROUNDS = int(os.getenv('DND_SIMULATION_MAX_ROUNDS', '10'))
+# Dice rolled by a single NumPy call, bigger rolls are split in chunks of samples to bound the memory
+SIMULATION_CHUNK_DICE = 4 * 1024 * 1024
+# Maximum number of dice of the weapon of a character
+MAX_WEAPON_DICE = 20
+
+DEFAULT_WEAPON_DAMAGE = '1d8'
+ABILITIES = ('strength', 'dexterity', 'constitution', 'intelligence', 'wisdom', 'charisma')
+ABILITY_ALIASES = {
+    'str': 'strength', 'for': 'strength', 'forza': 'strength',
+    'dex': 'dexterity', 'des': 'dexterity', 'destrezza': 'dexterity',
+    'con': 'constitution', 'costituzione': 'constitution',
+    'int': 'intelligence', 'intelligenza': 'intelligence',
+    'wis': 'wisdom', 'sag': 'wisdom', 'saggezza': 'wisdom',
+    'cha': 'charisma', 'car': 'charisma', 'carisma': 'charisma'
+}
+
+
+def parse_ability(name: str) -> str:
+    """
+    Get the full english name of an ability from its name or abbreviation, in english or italian.
+
+    Raises:
+        ValueError: If the ability doesn't exist.
+    """
+    name = name.lower()
+    if name in ABILITIES:
+        return name
+    if name in ABILITY_ALIASES:
+        return ABILITY_ALIASES[name]
+    raise ValueError(f"Caratteristica sconosciuta: {name}")
+
+
+def ability_modifier(score: int) -> int:
+    return (score - 10) // 2
+
+
+def combine_expressions(expressions: List[DiceExpression]) -> DiceExpression:
+    """Sum of dice expressions, e.g. the slashing and the fire damage of a single attack."""
+    terms = tuple(term for expression in expressions for term in expression.terms)
+    return DiceExpression(terms, sum(expression.modifier for expression in expressions))
+
+
+@dataclass(frozen=True)
+class AttackProfile:
+    """An attack roll against the armor class, dealing damage if it hits. A natural 20 doubles the dice."""
+    name: str
+    attack_bonus: int
+    damage: DiceExpression
+    count: int = 1
+
+
+@dataclass(frozen=True)
+class SaveEffect:
+    """An effect forcing a saving throw, e.g. a breath weapon. On a success the damage is halved or avoided."""
+    name: str
+    dc: int
+    ability: str
+    damage: DiceExpression
+    half_on_success: bool = True
+
+
+@dataclass(frozen=True)
+class Combatant:
+    """The statistics used by the simulation. attacks are all the attacks made in a round."""
+    name: str
+    armor_class: int
+    hit_points: int
+    save_modifiers: Dict[str, int]
+    attacks: Tuple[AttackProfile, ...]
+    save_effects: Tuple[SaveEffect, ...] = field(default=())
+
+
+def character_combatant(name: str, feature_points, level: int, armor_class: int, hit_points: int,
+                        weapon_damage: str = DEFAULT_WEAPON_DAMAGE, ability: Optional[str] = None) -> Combatant:
+    """
+    Build the combatant of a character from its FeaturePoints.
+
+    Args:
+        name (str): The character name.
+        feature_points (FeaturePoints): The ability scores of the character.
+        level (int): The total level, gives the proficiency bonus.
+        armor_class (int): The armor class.
+        hit_points (int): The hit points.
+        weapon_damage (str): The dice of the weapon, the ability modifier is added.
+        ability (Optional[str]): The ability used by the weapon, the best of strength and dexterity if None.
+
+    Raises:
+        ValueError: If the weapon damage or the ability are not valid, or the weapon has too many dice.
+    """
+    modifiers = feature_points.modifiers
+    if ability is None:
+        ability = max(('strength', 'dexterity'), key=lambda candidate: modifiers[candidate])
+    else:
+        ability = parse_ability(ability)
+
+    proficiency_bonus = 2 + (max(level, 1) - 1) // 4
+    weapon = parse_dice_expression(weapon_damage)
+    if weapon.dice_count > MAX_WEAPON_DICE:
+        raise ValueError(f"Un'arma può tirare al massimo {MAX_WEAPON_DICE} dadi.")
+    damage = DiceExpression(weapon.terms, weapon.modifier + modifiers[ability])
+    attack = AttackProfile(f"Arma ({weapon})", modifiers[ability] + proficiency_bonus, damage)
+
+    return Combatant(name, armor_class, max(hit_points, 1), modifiers, (attack,))
+
+
+def _action_damage(action) -> Optional[DiceExpression]:
+    expressions = []
+    for damage in action.damage or []:
+        if not damage.damage_dice:
+            continue
+        try:
+            expressions.append(parse_dice_expression(damage.damage_dice))
+        except ValueError:
+            # e.g. damage depending on the size of the monster, not simulated
+            continue
+    return combine_expressions(expressions) if expressions else None
+
+
+def monster_combatant(monster: models.Monster) -> Combatant:
+    """
+    Build the combatant of a monster from the data of the GraphQL monsters query.
+    A round is the multiattack if the monster has it, otherwise its attack with the highest expected damage.
+    """
+    save_modifiers = {ability: ability_modifier(getattr(monster, ability) or 10) for ability in ABILITIES}
+    for proficiency in getattr(monster, 'proficiencies', None) or []:
+        name = proficiency.proficiency.name if proficiency.proficiency else ''
+        if name.startswith('Saving Throw: ') and proficiency.value is not None:
+            save_modifiers[parse_ability(name.removeprefix('Saving Throw: '))] = proficiency.value
+
+    attacks: Dict[str, AttackProfile] = {}
+    save_effects = []
+    multiattack = None
+    for action in monster.actions or []:
+        if action.multiattack_type or action.name == 'Multiattack':
+            multiattack = action
+            continue
+
+        damage = _action_damage(action)
+        if damage is None:
+            continue
+        if action.dc and action.dc.value and action.dc.type:
+            save_effects.append(SaveEffect(action.name, action.dc.value, parse_ability(action.dc.type.name), damage,
+                                           action.dc.success == models.DcSuccess.HALF))
+        elif action.attack_bonus is not None:
+            attacks[action.name] = AttackProfile(action.name, action.attack_bonus, damage)
+
+    round_attacks = []
+    if multiattack is not None:
+        for part in multiattack.actions or []:
+            attack = attacks.get(part.action_name)
+            if attack is not None and str(part.count).isdigit():
+                round_attacks.append(AttackProfile(attack.name, attack.attack_bonus, attack.damage, int(part.count)))
+    if not round_attacks and attacks:
+        round_attacks.append(max(attacks.values(), key=lambda a: expression_distribution(a.damage).mean()))
+
+    armor_class = max((armor.value for armor in monster.armor_class or [] if armor and armor.value), default=10)
+    return Combatant(monster.name, armor_class, monster.hit_points or 1, save_modifiers, tuple(round_attacks),
+                     tuple(save_effects))
+
+
+@dataclass
+class FightReport:
+    """Outcome of the simulated fights of an attacker against a defender."""
+    hit_probability: float
+    damage_per_round: float
+    kill_probability: float
+    mean_rounds_to_kill: Optional[float]
+    median_rounds_to_kill: Optional[int]
+
+
+@dataclass
+class SaveReport:
+    """Outcome of a saving throw effect against a target."""
+    failure_probability: float
+    expected_damage: float
+    drop_probability: float
+
+
+class CombatSimulator:
+    """Monte Carlo simulation of fights, every sample is a row of NumPy arrays rolled in a single call."""
+
+    def __init__(self, samples: int = SIMULATION_SAMPLES, max_rounds: int = SIMULATION_MAX_ROUNDS,
+                 seed: Optional[int] = None):
+        self.samples = samples
+        self.max_rounds = max_rounds
+        self.roller = DiceRoller(seed)
+
+    def roll_totals(self, expression: DiceExpression, size: int) -> np.ndarray:
+        """Totals of size rolls of an expression, rolled in chunks so the dice of a chunk stay in memory."""
+        chunk = max(SIMULATION_CHUNK_DICE // max(sum(term.count for term in expression.terms), 1), 1)
+        if size <= chunk:
+            return self.roller.evaluate(expression, size).totals
+        return np.concatenate([self.roller.evaluate(expression, min(chunk, size - start)).totals
+                               for start in range(0, size, chunk)])
+
+    def attack_damage(self, attacks: Tuple[AttackProfile, ...], armor_class: int, size: int) -> Tuple[np.ndarray, float]:
+        """
+        Roll size rounds of attacks against an armor class.
+
+        Returns:
+            Tuple[np.ndarray, float]: The damage of every round and the probability of hitting.
+        """
+        total = np.zeros(size, dtype=np.int64)
+        hits = attempts = 0
+        for attack in attacks:
+            for _ in range(attack.count):
+                d20 = self.roller.roll_dice(20, size)
+                critical = d20 == 20
+                hit = critical | ((d20 != 1) & (d20 + attack.attack_bonus >= armor_class))
+
+                damage = self.roll_totals(attack.damage, size)
+                # a critical hit rolls the damage dice again, without the modifier
+                critical_count = int(np.count_nonzero(critical))
+                if critical_count and attack.damage.terms:
+                    damage[critical] += self.roll_totals(DiceExpression(attack.damage.terms), critical_count)
+
+                total += np.where(hit, np.maximum(damage, 0), 0)
+                hits += int(np.count_nonzero(hit))
+                attempts += size
+
+        return total, hits / attempts if attempts else 0.0
+
+    def simulate_fight(self, attacker: Combatant, defender: Combatant) -> FightReport:
+        """Simulate samples fights of max_rounds rounds, in which only the attacker attacks."""
+        damage, hit_probability = self.attack_damage(attacker.attacks, defender.armor_class,
+                                                     self.samples * self.max_rounds)
+        damage = damage.reshape(self.samples, self.max_rounds)
+
+        dropped = damage.cumsum(axis=1) >= defender.hit_points
+        killed = dropped.any(axis=1)
+        rounds = dropped.argmax(axis=1)[killed] + 1
+
+        return FightReport(
+            hit_probability=hit_probability,
+            damage_per_round=float(damage.mean()),
+            kill_probability=float(killed.mean()),
+            mean_rounds_to_kill=float(rounds.mean()) if rounds.size else None,
+            median_rounds_to_kill=int(np.median(rounds)) if rounds.size else None
+        )
+
+    def simulate_save(self, effect: SaveEffect, targets: List[Combatant]) -> List[SaveReport]:
+        """Simulate samples uses of an effect against a party, the damage is rolled once for all the targets."""
+        damage = np.maximum(self.roll_totals(effect.damage, self.samples), 0)
+
+        reports = []
+        for target in targets:
+            saved = self.roller.roll_dice(20, self.samples) + target.save_modifiers.get(effect.ability, 0) >= effect.dc
+            taken = np.where(saved, damage // 2 if effect.half_on_success else 0, damage)
+            reports.append(SaveReport(
+                failure_probability=float(1 - saved.mean()),
+                expected_damage=float(taken.mean()),
+                drop_probability=float((taken >= target.hit_points).mean())
+            ))
+        return reports
+
+
+def _render_fight(attacker: Combatant, defender: Combatant, report: FightReport, max_rounds: int) -> str:
+    attacks = ', '.join(f"{attack.count}x {html.escape(attack.name)}" for attack in attacker.attacks)
+    if report.mean_rounds_to_kill is None:
+        rounds = f"non ci riesce in {max_rounds} round"
+    else:
+        rounds = f"in media {report.mean_rounds_to_kill:.1f} round (mediana {report.median_rounds_to_kill})"
+    return (f"⚔️ <b>{html.escape(attacker.name)} contro {html.escape(defender.name)}</b> "
+            f"(CA {defender.armor_class}, {defender.hit_points} PF)\n"
+            f"Attacchi per round: {attacks}\n"
+            f"Probabilità di colpire: {report.hit_probability * 100:.1f}%\n"
+            f"Danni medi per round: {report.damage_per_round:.1f}\n"
+            f"Lo abbatte entro {max_rounds} round: {report.kill_probability * 100:.1f}%, {rounds}")
+
+
+def simulate_combat(character: Combatant, monster: Combatant, simulator: Optional[CombatSimulator] = None) -> str:
+    """
+    Simulate the character attacking the monster, the monster attacking the character and the monster effects
+    forcing a saving throw on the character. Blocking, run it in a thread.
+
+    Returns:
+        str: The Telegram HTML report.
+    """
+    simulator = simulator or CombatSimulator()
+    sections = [_render_fight(character, monster, simulator.simulate_fight(character, monster),
+                               simulator.max_rounds)]
+
+    if monster.attacks:
+        sections.append(_render_fight(monster, character, simulator.simulate_fight(monster, character),
+                                       simulator.max_rounds))
+
+    for effect in monster.save_effects:
+        report = simulator.simulate_save(effect, [character])[0]
+        sections.append(f"🔥 <b>{html.escape(effect.name)}</b> (CD {effect.dc} {effect.ability}, {effect.damage})\n"
+                        f"Tiro salvezza fallito: {report.failure_probability * 100:.1f}%\n"
+                        f"Danni medi subiti: {report.expected_damage:.1f}\n"
+                        f"Ti abbatte: {report.drop_probability * 100:.1f}%")
+
+    sections.append(f"<i>{simulator.samples} combattimenti simulati</i>")
+    return '\n\n'.join(sections)
@@ -0,0 +1,285 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from math import comb
+from typing import Optional, Tuple
+
+import numpy as np
+
+from dice_roller import MAX_EXPLOSIONS, DiceExpression, DiceTerm, parse_dice_expression
+
+# Maximum number of possible totals of an expression, bigger distributions are refused
+MAX_OUTCOMES = 50000
+# Maximum number of dice of a term with keep or drop, their distribution is not a simple convolution
+MAX_KEEP_DICE = 30
+# Maximum work of the keep or drop distributions, about faces * (dice + 1)^2 * highest kept sum
+MAX_KEEP_COST = 5 * 10 ** 8
+# An exploding die is expanded until the probability of exploding again is lower than this
+EXPLOSION_EPSILON = 1e-12
+HISTOGRAM_ROWS = 16
+HISTOGRAM_WIDTH = 20
+PERCENTILES = (5, 25, 50, 75, 95)
+
+TARGET_REGEX = re.compile(r'^(?P<expression>.+?)\s+(?:vs|cd|ca|dc|ac)\s*(?P<target>-?\d+)$', re.IGNORECASE)
+
+
+@dataclass(frozen=True, eq=False)
+class Distribution:
+    """
+    Exact probability distribution of an integer outcome: probabilities[i] is the probability of offset + i.
+    Instances are cached and shared, so the array must not be modified.
+    """
+    offset: int
+    probabilities: np.ndarray
+
+    @property
+    def minimum(self) -> int:
+        return self.offset
+
+    @property
+    def maximum(self) -> int:
+        return self.offset + len(self.probabilities) - 1
+
+    @property
+    def outcomes(self) -> np.ndarray:
+        return np.arange(self.minimum, self.maximum + 1)
+
+    def mean(self) -> float:
+        return float(np.dot(self.outcomes, self.probabilities))
+
+    def std(self) -> float:
+        return float(np.sqrt(np.dot((self.outcomes - self.mean()) ** 2, self.probabilities)))
+
+    def at_least(self, target: int) -> float:
+        """Probability of an outcome greater than or equal to target."""
+        index = min(max(target - self.offset, 0), len(self.probabilities))
+        return float(self.probabilities[index:].sum())
+
+    def percentile(self, percent: float) -> int:
+        """Smallest outcome whose cumulative probability reaches percent."""
+        cumulative = np.cumsum(self.probabilities)
+        index = int(np.searchsorted(cumulative, percent / 100 - 1e-12))
+        return self.offset + min(index, len(self.probabilities) - 1)
+
+    def shift(self, amount: int) -> 'Distribution':
+        return Distribution(self.offset + amount, self.probabilities)
+
+    def negate(self) -> 'Distribution':
+        return Distribution(-self.maximum, self.probabilities[::-1])
+
+    def add(self, other: 'Distribution') -> 'Distribution':
+        """Distribution of the sum of two independent outcomes."""
+        return Distribution(self.offset + other.offset, np.convolve(self.probabilities, other.probabilities))
+
+
+@lru_cache(maxsize=256)
+def die_distribution(sides: int, reroll: Optional[Tuple[str, int]] = None, explode: bool = False) -> Distribution:
+    """
+    Distribution of a single die, with the same reroll and explosion rules of dice_roller.
+
+    Args:
+        sides (int): Sides of the die.
+        reroll (Optional[Tuple[str, int]]): (comparison, value) of the results rerolled once.
+        explode (bool): If the highest result is rolled again and added.
+    """
+    probabilities = np.full(sides, 1 / sides)
+
+    if reroll:
+        comparison, value = reroll
+        faces = np.arange(1, sides + 1)
+        if comparison == '<':
+            rerolled = faces < value
+        elif comparison == '>':
+            rerolled = faces > value
+        else:
+            rerolled = faces == value
+        # the rerolled results are replaced by a new roll, with the same probabilities of the first one
+        probabilities = np.where(rerolled, 0, probabilities) + probabilities[rerolled].sum() * probabilities
+
+    distribution = Distribution(1, probabilities)
+    if explode:
+        # a die is the sum of the results until one is not the highest, only the first result can be rerolled
+        uniform = np.full(sides, 1 / sides)
+        depth = 1
+        while probabilities[-1] * uniform[-1] ** (depth - 1) > EXPLOSION_EPSILON and depth <= MAX_EXPLOSIONS:
+            depth += 1
+
+        result = np.zeros(sides * depth)
+        result[:sides - 1] = probabilities[:-1]
+        chain = probabilities[-1]
+        for explosion in range(1, depth):
+            start = explosion * sides
+            result[start:start + sides - 1] += chain * uniform[:-1]
+            chain *= uniform[-1]
+        # the last explosion keeps its highest result
+        result[sides * depth - 1] += chain
+        distribution = Distribution(1, result)
+
+    return distribution
+
+
+@lru_cache(maxsize=256)
+def dice_sum_distribution(sides: int, count: int, reroll: Optional[Tuple[str, int]] = None,
+                          explode: bool = False) -> Distribution:
+    """Distribution of the sum of count equal dice, convolving by squaring."""
+    if count == 1:
+        return die_distribution(sides, reroll, explode)
+
+    half = dice_sum_distribution(sides, count // 2, reroll, explode)
+    distribution = half.add(half)
+    if count % 2:
+        distribution = distribution.add(die_distribution(sides, reroll, explode))
+    return distribution
+
+
+def _keep_distribution(die: Distribution, count: int, keep: Tuple[str, int]) -> Distribution:
+    """
+    Distribution of the sum of the highest or lowest dice of a group.
+
+    The faces are visited from the best to the worst: for every number of dice already assigned to a face,
+    the dice showing the current face are kept until the keep amount is reached.
+    """
+    mode, amount = keep
+    faces = die.outcomes if mode == 'h' else die.outcomes[::-1]
+    face_probabilities = die.probabilities if mode == 'h' else die.probabilities[::-1]
+    size = amount * die.maximum + 1
+
+    # states[assigned] = probability distribution of the kept sum with `assigned` dice on the faces visited
+    states = np.zeros((count + 1, size))
+    states[0, 0] = 1.0
+    for face, probability in zip(faces[::-1], face_probabilities[::-1]):
+        if probability == 0:
+            continue
+        new_states = np.zeros_like(states)
+        for assigned in range(count + 1):
+            if not states[assigned].any():
+                continue
+            kept = min(assigned, amount)
+            for showing in range(count - assigned + 1):
+                weight = comb(count - assigned, showing) * probability ** showing
+                added = (min(kept + showing, amount) - kept) * face
+                if added:
+                    new_states[assigned + showing, added:] += weight * states[assigned, :-added]
+                else:
+                    new_states[assigned + showing] += weight * states[assigned]
+        states = new_states
+
+    probabilities = states[count]
+    first = int(np.argmax(probabilities > 0))
+    last = len(probabilities) - int(np.argmax(probabilities[::-1] > 0))
+    return Distribution(first, probabilities[first:last])
+
+
+@lru_cache(maxsize=256)
+def term_distribution(term: DiceTerm) -> Distribution:
+    """Distribution of a dice term, with its sign."""
+    if term.keep:
+        die = die_distribution(term.sides, term.reroll, term.explode)
+        distribution = _keep_distribution(die, term.count, term.keep)
+    else:
+        distribution = dice_sum_distribution(term.sides, term.count, term.reroll, term.explode)
+
+    return distribution.negate() if term.sign < 0 else distribution
+
+
+def _check_limits(expression: DiceExpression) -> None:
+    outcomes = 1
+    keep_cost = 0
+    for term in expression.terms:
+        die = die_distribution(term.sides, term.reroll, term.explode)
+        highest = len(die.probabilities)
+        if term.keep:
+            if term.count > MAX_KEEP_DICE:
+                raise ValueError(f"Posso calcolare le probabilità di al massimo {MAX_KEEP_DICE} dadi "
+                                 f"quando ne tieni solo alcuni.")
+            outcomes += term.keep[1] * highest
+            # see _keep_distribution: every face combines (dice + 1)^2 states of the kept sums
+            keep_cost += highest * (term.count + 1) ** 2 * (term.keep[1] * die.maximum + 1)
+        else:
+            outcomes += term.count * highest
+    if outcomes > MAX_OUTCOMES:
+        raise ValueError("L'espressione ha troppi risultati possibili per calcolarne le probabilità.")
+    if keep_cost > MAX_KEEP_COST:
+        raise ValueError("Troppi dadi o facce da tenere o scartare per calcolarne le probabilità, "
+                         "prova con meno dadi o dadi più piccoli.")
+
+
+@lru_cache(maxsize=256)
+def expression_distribution(expression: DiceExpression) -> Distribution:
+    """
+    Exact distribution of the total of a single repetition of a dice expression.
+
+    Raises:
+        ValueError: If the distribution is too big to be computed, the message is shown to the user.
+    """
+    _check_limits(expression)
+
+    distribution = Distribution(0, np.ones(1))
+    for term in expression.terms:
+        distribution = distribution.add(term_distribution(term))
+    return distribution.shift(expression.modifier)
+
+
+def _histogram(distribution: Distribution) -> str:
+    """Rows of a text histogram, grouping the outcomes in at most HISTOGRAM_ROWS bins."""
+    # drop the negligible tails, e.g. the long explosions
+    cumulative = np.cumsum(distribution.probabilities)
+    first = int(np.searchsorted(cumulative, 1e-4))
+    last = int(np.searchsorted(cumulative, 1 - 1e-4))
+    probabilities = distribution.probabilities[first:last + 1]
+    offset = distribution.offset + first
+
+    bin_size = -(-len(probabilities) // HISTOGRAM_ROWS)
+    bins = np.add.reduceat(probabilities, np.arange(0, len(probabilities), bin_size))
+    label_width = len(str(distribution.maximum)) * (2 if bin_size > 1 else 1) + (1 if bin_size > 1 else 0)
+
+    rows = []
+    for i, probability in enumerate(bins):
+        low = offset + i * bin_size
+        high = min(low + bin_size - 1, offset + len(probabilities) - 1)
+        label = f"{low}" if low == high else f"{low}-{high}"
+        bar = '█' * int(round(probability / bins.max() * HISTOGRAM_WIDTH))
+        rows.append(f"{label:>{label_width}} {bar:<{HISTOGRAM_WIDTH}} {probability * 100:5.1f}%")
+    return '\n'.join(rows)
+
+
+@lru_cache(maxsize=256)
+def render_odds(expression: DiceExpression, target: Optional[int] = None) -> str:
+    """
+    Telegram HTML text with the distribution of a dice expression: statistics, percentiles and histogram.
+
+    Args:
+        expression (DiceExpression): The expression, repetitions are ignored.
+        target (Optional[int]): A DC or an AC, shows the probability of reaching it.
+
+    Raises:
+        ValueError: If the distribution is too big to be computed.
+    """
+    distribution = expression_distribution(expression)
+    single = DiceExpression(expression.terms, expression.modifier)
+
+    lines = [f"📊 <b>Probabilità di {single}</b>"]
+    if target is not None:
+        lines.append(f"🎯 Almeno {target}: <b>{distribution.at_least(target) * 100:.2f}%</b>")
+    lines.append(f"\nMedia {distribution.mean():.2f}, deviazione standard {distribution.std():.2f}\n"
+                 f"Minimo {distribution.minimum}, massimo {distribution.maximum}\n")
+    lines.append(' | '.join(f"{percent}°: {distribution.percentile(percent)}" for percent in PERCENTILES))
+    lines.append(f"\n<pre>{_histogram(distribution)}</pre>")
+    return '\n'.join(lines)
+
+
+def parse_odds_query(text: str) -> Tuple[DiceExpression, Optional[int]]:
+    """
+    Parse a dice expression optionally followed by a target, e.g. '1d20+5 vs 15' or '8d6 cd 30'.
+
+    Returns:
+        Tuple[DiceExpression, Optional[int]]: The expression and the target, None if missing.
+
+    Raises:
+        ValueError: If the expression is not valid.
+    """
+    text = text.strip()
+    target = None
+    if match := TARGET_REGEX.match(text):
+        text, target = match['expression'], int(match['target'])
+    return parse_dice_expression(text), target
@@ -0,0 +1,339 @@
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Limits of an expression, to keep a single roll cheap for the bot
+MAX_EXPRESSION_LENGTH = 200
+MAX_DICE = int(os.getenv('DND_MAX_DICE', '100000'))
+MAX_SIDES = 1000
+MAX_REPETITIONS = 100
+# Maximum absolute value of a constant and of their sum
+MAX_MODIFIER = 10 ** 6
+# Maximum number of times a single exploding die can explode
+MAX_EXPLOSIONS = 100
+# Single results shown for every dice term, the others are only summed
+MAX_SHOWN_ROLLS = 30
+# Maximum length of the text of a result, it must fit in a single Telegram message
+MAX_RESULT_LENGTH = 4000
+
+REPETITIONS_REGEX = re.compile(r'^(\d+)\s*x\s*(.+)$')
+TERM_REGEX = re.compile(
+    r'\s*(?:(?P<operator>[+-])'
+    r'|(?P<advantage>adv|dis)'
+    r'|(?P<count>\d*)d(?P<sides>\d+|%)(?P<modifiers>(?:kh\d+|kl\d+|k\d+|dh\d+|dl\d+|r[<>]?\d+|!)*)'
+    r'|(?P<number>\d+))'
+)
+MODIFIER_REGEX = re.compile(r'(?P<keep>kh|kl|k|dh|dl)(?P<amount>\d+)|r(?P<comparison>[<>]?)(?P<value>\d+)|(?P<explode>!)')
+
+
+@dataclass(frozen=True)
+class DiceTerm:
+    """
+    A group of equal dice, e.g. 4d6kh3.
+
+    Attributes:
+        count: Number of dice rolled.
+        sides: Sides of every die.
+        sign: 1 if the term is added, -1 if subtracted.
+        keep: ('h', n) keeps the n highest dice, ('l', n) the n lowest.
+        reroll: (comparison, value) rerolls once the dice equal ('='), lower ('<') or higher ('>') than value.
+        explode: A die with the highest result is rolled again and added.
+    """
+    count: int
+    sides: int
+    sign: int = 1
+    keep: Optional[Tuple[str, int]] = None
+    reroll: Optional[Tuple[str, int]] = None
+    explode: bool = False
+
+    def __str__(self):
+        text = f"{self.count}d{self.sides}"
+        if self.reroll:
+            comparison, value = self.reroll
+            text += f"r{comparison if comparison != '=' else ''}{value}"
+        if self.explode:
+            text += '!'
+        if self.keep:
+            text += f"k{self.keep[0]}{self.keep[1]}"
+        return text
+
+
+@dataclass(frozen=True)
+class DiceExpression:
+    """A parsed dice expression: a sum of dice terms and of a constant, optionally repeated, e.g. 6x4d6kh3."""
+    terms: Tuple[DiceTerm, ...]
+    modifier: int = 0
+    repetitions: int = 1
+
+    @property
+    def dice_count(self) -> int:
+        """Number of dice rolled, repetitions included."""
+        return sum(term.count for term in self.terms) * self.repetitions
+
+    def __str__(self):
+        text = ''
+        for term in self.terms:
+            text += f"{'-' if term.sign < 0 else '+' if text else ''}{term}"
+        if self.modifier or not text:
+            text += f"{'-' if self.modifier < 0 else '+' if text else ''}{abs(self.modifier)}"
+        return f"{self.repetitions}x{text}" if self.repetitions > 1 else text
+
+
+def _parse_modifiers(count: int, sides: int, sign: int, modifiers: str) -> DiceTerm:
+    keep = reroll = None
+    explode = False
+    for match in MODIFIER_REGEX.finditer(modifiers):
+        if match['keep']:
+            amount = int(match['amount'])
+            if not 0 < amount <= count:
+                raise ValueError(f"Puoi tenere o scartare da 1 a {count} dadi, non {amount}.")
+            mode = match['keep']
+            if mode in ('kh', 'k'):
+                keep = ('h', amount)
+            elif mode == 'kl':
+                keep = ('l', amount)
+            elif amount == count:
+                raise ValueError("Non puoi scartare tutti i dadi.")
+            else:
+                # dropping the lowest dice is keeping the highest ones
+                keep = ('h', count - amount) if mode == 'dl' else ('l', count - amount)
+        elif match['explode']:
+            if sides == 1:
+                raise ValueError("Un d1 non può esplodere.")
+            explode = True
+        else:
+            reroll = (match['comparison'] or '=', int(match['value']))
+
+    return DiceTerm(count, sides, sign, keep, reroll, explode)
+
+
+@lru_cache(maxsize=256)
+def parse_dice_expression(text: str) -> DiceExpression:
+    """
+    Parse a dice expression, e.g. 8d6+3, 4d6kh3, 2d20kl1, adv+5, 2d6r1, 3d6!, 6x4d6dl1.
+
+    Supported syntax:
+        NdS: N dice with S sides, d% is a d100. N defaults to 1.
+        khK / kK, klK: keep the K highest or lowest dice. dhK, dlK: drop the K highest or lowest dice.
+        rV, r<V, r>V: reroll once the dice equal, lower or higher than V.
+        !: exploding dice, a die with the highest result is rolled again and added.
+        adv, dis: a d20 with advantage or disadvantage, like 2d20kh1 and 2d20kl1.
+        Rx...: repeats the whole expression R times, e.g. 6x4d6kh3 for the ability scores.
+
+    Args:
+        text (str): The expression, case and spaces between the terms are ignored.
+
+    Returns:
+        DiceExpression: The parsed expression.
+
+    Raises:
+        ValueError: If the expression is not valid or exceeds the limits, the message is shown to the user.
+    """
+    text = text.lower().strip()
+    if not text:
+        raise ValueError("Scrivi un'espressione, ad esempio 1d20+5")
+    if len(text) > MAX_EXPRESSION_LENGTH:
+        raise ValueError(f"L'espressione è troppo lunga, massimo {MAX_EXPRESSION_LENGTH} caratteri.")
+
+    repetitions = 1
+    if match := REPETITIONS_REGEX.match(text):
+        repetitions = int(match[1])
+        text = match[2]
+        if not 0 < repetitions <= MAX_REPETITIONS:
+            raise ValueError(f"Puoi ripetere un tiro da 1 a {MAX_REPETITIONS} volte.")
+
+    terms: List[DiceTerm] = []
+    modifier = 0
+    sign = 1
+    expect_operand = True
+    after_operator = False
+    position = 0
+    while position < len(text):
+        match = TERM_REGEX.match(text, position)
+        if not match:
+            raise ValueError(f"Non capisco «{text[position:].strip()}»")
+        position = match.end()
+
+        if match['operator']:
+            if after_operator:
+                raise ValueError("Due operatori di seguito.")
+            sign = -1 if match['operator'] == '-' else 1
+            expect_operand = after_operator = True
+            continue
+
+        if not expect_operand:
+            raise ValueError(f"Manca un operatore prima di «{match[0].strip()}»")
+        expect_operand = after_operator = False
+
+        if match['number']:
+            number = int(match['number'])
+            modifier += sign * number
+            if number > MAX_MODIFIER or abs(modifier) > MAX_MODIFIER:
+                raise ValueError(f"I numeri possono valere al massimo {MAX_MODIFIER}.")
+        elif match['advantage']:
+            terms.append(DiceTerm(2, 20, sign, ('h', 1) if match['advantage'] == 'adv' else ('l', 1)))
+        else:
+            count = int(match['count']) if match['count'] else 1
+            sides = 100 if match['sides'] == '%' else int(match['sides'])
+            if count < 1:
+                raise ValueError("Devi tirare almeno un dado.")
+            if not 1 <= sides <= MAX_SIDES:
+                raise ValueError(f"I dadi possono avere da 1 a {MAX_SIDES} facce.")
+            terms.append(_parse_modifiers(count, sides, sign, match['modifiers']))
+        sign = 1
+
+    if expect_operand:
+        raise ValueError("L'espressione non può finire con un operatore.")
+
+    expression = DiceExpression(tuple(terms), modifier, repetitions)
+    if expression.dice_count > MAX_DICE:
+        raise ValueError(f"Troppi dadi, al massimo {MAX_DICE} per tiro.")
+    return expression
+
+
+@dataclass
+class TermResult:
+    """The dice of a term: rolls and kept mask have shape (repetitions, count), totals (repetitions,)."""
+    term: DiceTerm
+    rolls: np.ndarray
+    kept: np.ndarray
+    totals: np.ndarray
+
+
+@dataclass
+class RollResult:
+    """The result of a dice expression, every repetition is a row of the arrays."""
+    expression: DiceExpression
+    terms: List[TermResult]
+    totals: np.ndarray
+
+    def __line(self, repetition: int, detailed: bool) -> str:
+        """Text of a repetition, with the single dice if detailed, otherwise only its total."""
+        parts = []
+        for result in self.terms if detailed else ():
+            rolls = result.rolls[repetition]
+            kept = result.kept[repetition]
+            shown = ', '.join(str(roll) if keep else f"<s>{roll}</s>"
+                              for roll, keep in zip(rolls[:MAX_SHOWN_ROLLS].tolist(), kept[:MAX_SHOWN_ROLLS]))
+            if len(rolls) > MAX_SHOWN_ROLLS:
+                shown += ', …'
+            parts.append(f"{'-' if result.term.sign < 0 else ''}{result.term}: [{shown}]")
+        if detailed and self.expression.modifier:
+            parts.append(f"{self.expression.modifier:+d}")
+
+        prefix = f"{repetition + 1}. " if self.expression.repetitions > 1 else ''
+        return f"{prefix}{' '.join(parts)} = <b>{self.totals[repetition]}</b>" if parts \
+            else f"{prefix}<b>{self.totals[repetition]}</b>"
+
+    def __str__(self):
+        """Telegram HTML text of the result, the dice are left out if they don't fit in a single message."""
+        header = f"🎲 <b>{self.expression}</b>"
+        footer = f"\n\n<b>Totale:</b> {self.totals.sum()}" if self.expression.repetitions > 1 else ''
+        room = MAX_RESULT_LENGTH - len(header) - len(footer)
+
+        lines = [self.__line(repetition, True) for repetition in range(self.expression.repetitions)]
+        if sum(len(line) + 1 for line in lines) > room:
+            note = "\n<i>Troppi dadi da mostrare, ecco solo i totali</i>"
+            header += note
+            room -= len(note)
+            lines = [self.__line(repetition, False) for repetition in range(self.expression.repetitions)]
+
+        if sum(len(line) + 1 for line in lines) > room:
+            # leave room for the line counting the repetitions not shown
+            room -= 30
+            shown = []
+            for line in lines:
+                room -= len(line) + 1
+                if room < 0:
+                    break
+                shown.append(line)
+            lines = shown + [f"… altri {len(lines) - len(shown)} tiri"]
+        return '\n'.join([header, *lines]) + footer
+
+
+class DiceRoller:
+    """Evaluates dice expressions rolling all the dice of a term in a single call of a NumPy Generator."""
+
+    def __init__(self, seed: Optional[int] = None):
+        self.rng = np.random.default_rng(seed)
+
+    def roll_dice(self, sides: int, size) -> np.ndarray:
+        """Roll dice with the given sides, returning an array with the given shape."""
+        return self.rng.integers(1, sides + 1, size=size, dtype=np.int64)
+
+    def roll_term(self, term: DiceTerm, repetitions: int = 1) -> TermResult:
+        """
+        Roll a dice term.
+
+        Args:
+            term (DiceTerm): The term.
+            repetitions (int): Number of independent rolls of the term.
+
+        Returns:
+            TermResult: The dice and the totals of every repetition.
+        """
+        rolls = self.roll_dice(term.sides, (repetitions, term.count))
+
+        if term.reroll:
+            comparison, value = term.reroll
+            if comparison == '<':
+                to_reroll = rolls < value
+            elif comparison == '>':
+                to_reroll = rolls > value
+            else:
+                to_reroll = rolls == value
+            rolls[to_reroll] = self.roll_dice(term.sides, np.count_nonzero(to_reroll))
+
+        if term.explode:
+            exploding = rolls == term.sides
+            for _ in range(MAX_EXPLOSIONS):
+                explosions = np.count_nonzero(exploding)
+                if not explosions:
+                    break
+                extra = self.roll_dice(term.sides, explosions)
+                rolls[exploding] += extra
+                exploding[exploding] = extra == term.sides
+
+        kept = np.ones(rolls.shape, dtype=bool)
+        if term.keep:
+            mode, amount = term.keep
+            order = np.argsort(rolls, axis=1, kind='stable')
+            dropped = order[:, :term.count - amount] if mode == 'h' else order[:, amount:]
+            np.put_along_axis(kept, dropped, False, axis=1)
+
+        totals = np.where(kept, rolls, 0).sum(axis=1) * term.sign
+        return TermResult(term, rolls, kept, totals)
+
+    def evaluate(self, expression: DiceExpression, repetitions: Optional[int] = None) -> RollResult:
+        """
+        Roll a parsed expression.
+
+        Args:
+            expression (DiceExpression): The expression.
+            repetitions (Optional[int]): Overrides the repetitions of the expression, e.g. for simulations.
+
+        Returns:
+            RollResult: The dice and the totals of every repetition.
+        """
+        repetitions = repetitions or expression.repetitions
+        terms = [self.roll_term(term, repetitions) for term in expression.terms]
+        totals = np.full(repetitions, expression.modifier, dtype=np.int64)
+        for result in terms:
+            totals += result.totals
+        return RollResult(expression, terms, totals)
+
+    def roll(self, text: str) -> RollResult:
+        """
+        Parse and roll an expression.
+
+        Raises:
+            ValueError: If the expression is not valid, see parse_dice_expression.
+        """
+        return self.evaluate(parse_dice_expression(text))
+
+
+DICE_ROLLER = DiceRoller()
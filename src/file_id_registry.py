@@ -0,0 +1,152 @@
+import logging
+import os
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Type, Union
+
+from telegram import Message, InputMedia
+from telegram.error import BadRequest
+
+logger = logging.getLogger(__name__)
+
+# bot data key of the registry, so it's saved by the persistence
+BOT_DATA_FILE_IDS = 'bot_data_file_ids'
+
+# Delete the local copy of a file once Telegram has given back its file_id
+KEEP_LOCAL_FILES = os.getenv('DND_KEEP_LOCAL_FILES', 'true').lower() == 'true'
+
+FileSource = Union[str, Path]
+
+
+def get_message_file_id(message: Message) -> Optional[str]:
+    """
+    Get the file_id of the file attached to a message, the biggest size for the photos.
+
+    Args:
+        message (Message): A message with an attachment.
+
+    Returns:
+        Optional[str]: The file_id, None if the message has no file.
+    """
+    attachment = message.effective_attachment
+    if isinstance(attachment, tuple):
+        attachment = attachment[-1] if attachment else None
+    return getattr(attachment, 'file_id', None)
+
+
+class FileIdRegistry:
+    """
+    Registry of the Telegram file_id of the local files and of the URLs already sent by the bot.
+    Sending a file_id makes Telegram reuse the file already on its servers instead of receiving it again.
+    """
+
+    def __init__(self):
+        self.__file_ids: Dict[str, str] = {}
+
+        # counters
+        self.hits = 0
+        self.uploads = 0
+
+    def attach(self, storage: Dict[str, str]) -> None:
+        """
+        Use a dict stored in the bot data, so that the file_ids survive the restarts.
+
+        Args:
+            storage (Dict[str, str]): The dict where the file_ids are kept.
+        """
+        storage.update(self.__file_ids)
+        self.__file_ids = storage
+
+    def __contains__(self, source: FileSource) -> bool:
+        return str(source) in self.__file_ids
+
+    def get(self, source: FileSource) -> Optional[str]:
+        return self.__file_ids.get(str(source))
+
+    def set(self, source: FileSource, file_id: str) -> None:
+        self.__file_ids[str(source)] = file_id
+
+    def discard(self, source: FileSource) -> None:
+        self.__file_ids.pop(str(source), None)
+
+    async def send(self, source: FileSource, send: Callable[[FileSource], Awaitable[Message]]) -> Message:
+        """
+        Send a local file or a URL through its file_id if it's known, uploading it otherwise.
+        The file_id returned by Telegram is recorded for the next time.
+
+        Args:
+            source (FileSource): Path or URL of the file.
+            send (Callable[[FileSource], Awaitable[Message]]): Sends the file, e.g. a partial of reply_document.
+
+        Returns:
+            Message: The message sent.
+        """
+        file_id = self.get(source)
+        message = None
+        if file_id:
+            try:
+                message = await send(file_id)
+                self.hits += 1
+            except BadRequest as e:
+                # the file_id isn't valid anymore or belongs to another kind of file
+                logger.warning(f"file_id of {source} rejected, sending the file again: {e}")
+                self.discard(source)
+
+        if message is None:
+            message = await send(source)
+            self.uploads += 1
+
+        self.__record(source, message)
+        return message
+
+    async def send_media_group(self, sources: List[FileSource], media_type: Type[InputMedia],
+                               send: Callable[[List[InputMedia]], Awaitable[Tuple[Message, ...]]]
+                               ) -> Tuple[Message, ...]:
+        """
+        Send the files as an album, using their file_ids when known.
+        If Telegram rejects the album, it's sent again uploading all its files.
+
+        Args:
+            sources (List[FileSource]): Paths or URLs of the files, from 2 to 10.
+            media_type (Type[InputMedia]): InputMediaPhoto or InputMediaDocument.
+            send (Callable[[List[InputMedia]], Awaitable[Tuple[Message, ...]]]): Sends the album,
+                e.g. reply_media_group.
+
+        Returns:
+            Tuple[Message, ...]: The messages of the album, in the same order of the sources.
+        """
+        known = [source for source in sources if source in self]
+        try:
+            messages = await send([media_type(self.get(source) or source) for source in sources])
+            self.hits += len(known)
+            self.uploads += len(sources) - len(known)
+        except BadRequest as e:
+            if not known:
+                raise
+            logger.warning(f"Album rejected, sending its files again: {e}")
+            for source in known:
+                self.discard(source)
+            messages = await send([media_type(source) for source in sources])
+            self.uploads += len(sources)
+
+        for source, message in zip(sources, messages):
+            self.__record(source, message)
+
+        return messages
+
+    def __record(self, source: FileSource, message: Message) -> None:
+        file_id = get_message_file_id(message)
+        if file_id:
+            self.set(source, file_id)
+            if not KEEP_LOCAL_FILES and os.path.isfile(source):
+                os.remove(source)
+
+    def stats(self) -> Dict[str, int]:
+        """Return the registry counters."""
+        return {
+            'file_ids': len(self.__file_ids),
+            'hits': self.hits,
+            'uploads': self.uploads
+        }
+
+
+FILE_ID_REGISTRY = FileIdRegistry()
@@ -1,3 +1,4 @@
+import asyncio
 import html
 import json
 import logging
@@ -8,25 +9,40 @@ from warnings import filterwarnings
 import aiohttp
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.constants import ParseMode
-from telegram.error import BadRequest, TelegramError
 from telegram.ext import (
     Application,
     CommandHandler,
     ConversationHandler,
     ContextTypes,
-    MessageHandler, filters, CallbackQueryHandler, PicklePersistence
+    MessageHandler, filters, CallbackQueryHandler
 )
 from telegram.warnings import PTBUserWarning
 
+from DndService import DndService
+from broadcast import broadcast_message, send_broadcast_report
+from character_creator import CHARACTERS_CREATOR_KEY, CURRENT_CHARACTER_KEY
+from character_creator.blob_store import BLOB_STORE, collect_garbage, count_references, disk_usage_report
 from character_creator.handlers import character_creator_handler
+from combat_simulator import DEFAULT_WEAPON_DAMAGE, character_combatant, monster_combatant, simulate_combat
+from dice_odds import parse_odds_query, render_odds
+from dice_roller import DICE_ROLLER
 from class_submenus import class_submenus_query_handler, class_spells_menu_buttons_query_handler, \
     class_search_spells_text_handler, class_reading_spells_menu_buttons_query_handler, \
     class_spell_visualization_buttons_query_handler, class_resources_submenu_text_handler, CLASS_SPELLS_SUBMENU, \
     CLASS_MANUAL_SPELLS_SEARCHING, CLASS_READING_SPELLS_SEARCHING, CLASS_SPELL_VISUALIZATION, CLASS_RESOURCES_SUBMENU, \
     CLASS_SUBMENU
 from environment_variables_mg import keyring_initialize, keyring_get
+from graphql_queries import CATEGORY_TO_QUERY_MAP
 from equipment_categories_submenus import equipment_categories_first_menu_query_handler, \
     equipment_visualization_query_handler, EQUIPMENT_CATEGORIES_SUBMENU, EQUIPMENT_VISUALIZATION
+from file_id_registry import FILE_ID_REGISTRY, BOT_DATA_FILE_IDS
+from model import models
+from render_cache import RENDER_CACHE
+from srd_cache import SRD_CACHE
+from sqlite_persistence import SqlitePersistence
+from srd_snapshot import SrdSnapshot
+from update_processor import PerUserUpdateProcessor
+from util import open_graphql_session, close_graphql_session, split_html_text, async_graphql_query
 from wiki import wiki_main_menu_handler, main_menu_buttons_query_handler, details_menu_buttons_query_handler, \
     ITEM_DETAILS_MENU, WIKI_MAIN_MENU
 
@@ -73,6 +89,24 @@ INLINE_PAGES = 'inline_pages'
 # user data keys
 ACTIVE_CONV = 'active_conv'
 
+# Webhook mode, enabled when DND_WEBHOOK_URL is set. Polling is used otherwise
+WEBHOOK_URL = os.getenv("DND_WEBHOOK_URL")
+WEBHOOK_LISTEN = os.getenv("DND_WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("DND_WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("DND_WEBHOOK_PATH", "telegram")
+WEBHOOK_SECRET = os.getenv("DND_WEBHOOK_SECRET")
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("DND_WEBHOOK_MAX_CONNECTIONS", "40"))
+
+# Updates processed concurrently, the updates of the same user or chat are always processed in order
+CONCURRENT_UPDATES = int(os.getenv("DND_CONCURRENT_UPDATES", "16"))
+MAX_PENDING_UPDATES = int(os.getenv("DND_MAX_PENDING_UPDATES", "256"))
+
+# Users shown by the /storage report
+STORAGE_REPORT_MAX_USERS = 20
+
+# The only update types consumed by the handlers
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
 # callback keys
 ABILITY_SCORE_CALLBACK = 'ability_score'
 CLASS_SPELLS_PAGES = 'class_spells'
@@ -182,7 +216,40 @@ async def get_latest_release(session):
         return None, None
 
 
+async def broadcast_to_all_chats(application: Application, text: str, parse_mode: ParseMode = None) -> None:
+    """
+    Send a message to every chat which started the bot, removing the chats that blocked it,
+    and send the summary to the DevId chat.
+    """
+    chat_ids = application.bot_data.get(BOT_DATA_CHAT_IDS, set())
+    report = await broadcast_message(application.bot, list(chat_ids), text, parse_mode=parse_mode)
+
+    for chat_id in report.pruned:
+        chat_ids.discard(chat_id)
+
+    await send_broadcast_report(application.bot, keyring_get('DevId'), report)
+
+
+def is_silent_start() -> bool:
+    """Check if the environment variable SILENT_START is set"""
+    return os.getenv("SILENT_START", "false").lower() == "true"
+
+
 async def post_init_callback(application: Application) -> None:
+    # Open the HTTP and GraphQL sessions shared by all the handlers for the whole application lifetime
+    await DndService.open_shared_session()
+    # keep the file_ids in the bot data, so they are saved by the persistence
+    FILE_ID_REGISTRY.attach(application.bot_data.setdefault(BOT_DATA_FILE_IDS, {}))
+    # count the references before any handler can release a file
+    BLOB_STORE.load_references(count_references(application.user_data))
+    # delete the maps and the voice notes nobody references anymore
+    application.create_task(collect_garbage())
+    if DndService.snapshot is None:
+        await open_graphql_session(GRAPHQL_ENDPOINT)
+
+    if is_silent_start():
+        return
+
     message_str = "🟢 Il Bot è ripartito dopo un riavvio! Probabilmente ora è meglio di prima 🟢"
     async with aiohttp.ClientSession() as session:
         title, notes = await get_latest_release(session)
@@ -191,20 +258,21 @@ async def post_init_callback(application: Application) -> None:
         else:
             message_str += "\n\n⚠️ Impossibile recuperare le note dell'ultima release."
 
-    for chat_id in application.bot_data.get(BOT_DATA_CHAT_IDS, []):
-        try:
-            await application.bot.send_message(chat_id, message_str, parse_mode=ParseMode.HTML)
-        except (BadRequest, TelegramError) as e:
-            logger.error(f"CHAT_ID: {chat_id} Telegram error starting the bot: {e}")
+    await broadcast_to_all_chats(application, message_str, parse_mode=ParseMode.HTML)
 
 
 async def post_stop_callback(application: Application) -> None:
-    for chat_id in application.bot_data.get(BOT_DATA_CHAT_IDS, []):
-        try:
-            await application.bot.send_message(chat_id,
-                                               "🔴 Il bot si è spento... qualcuno è a lavoro! 🔴")
-        except (BadRequest, TelegramError) as e:
-            logger.error(f"CHAT_ID: {chat_id} Telegram error stopping the bot: {e}")
+    try:
+        if is_silent_start():
+            return
+
+        await broadcast_to_all_chats(application, "🔴 Il bot si è spento... qualcuno è a lavoro! 🔴")
+    finally:
+        await DndService.close_shared_session()
+        await close_graphql_session()
+        logger.info(f"SRD cache stats: {SRD_CACHE.stats()}")
+        logger.info(f"Render cache stats: {RENDER_CACHE.stats()}")
+        logger.info(f"File id registry stats: {FILE_ID_REGISTRY.stats()}")
 
 
 async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -250,30 +318,126 @@ async def stop_nested(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     return STOPPING
 
 
+async def storage_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Send to the developer the disk space used by the maps and the voice notes of every user"""
+    if str(update.effective_chat.id) != keyring_get('DevId'):
+        return
+
+    usage = disk_usage_report(context.application.user_data)
+    files = list(BLOB_STORE.iter_files([BLOB_STORE.root]))
+    total = sum(os.path.getsize(path) for path in files)
+
+    message_str = (f"💾 <b>Spazio occupato dai file</b>\n\n"
+                   f"File salvati: {len(files)}\n"
+                   f"Totale: {total / 1024 / 1024:.2f} MB\n\n"
+                   f"<b>Utenti</b>\n")
+    message_str += '\n'.join(f"<code>{user_id}</code>: {used / 1024 / 1024:.2f} MB"
+                              for user_id, used in list(usage.items())[:STORAGE_REPORT_MAX_USERS])
+    await update.effective_message.reply_text(message_str, parse_mode=ParseMode.HTML)
+
+
+async def roll_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Roll a dice expression, e.g. /roll 4d6kh3 or /roll adv+5"""
+    try:
+        result = DICE_ROLLER.roll(' '.join(context.args))
+    except ValueError as e:
+        await update.effective_message.reply_text(
+            f"🔴 {html.escape(str(e))}\n\n"
+            f"<b>Esempi:</b> <code>/roll 1d20+5</code>, <code>/roll 8d6</code>, <code>/roll adv+3</code>, "
+            f"<code>/roll 6x4d6kh3</code>, <code>/roll 2d6r1</code>, <code>/roll 3d6!</code>",
+            parse_mode=ParseMode.HTML
+        )
+        return
+
+    for chunk in split_html_text(str(result)):
+        await update.effective_message.reply_text(chunk, parse_mode=ParseMode.HTML)
+
+
+async def odds_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Send the exact distribution of a dice expression, e.g. /odds 1d20+5 vs 15"""
+    try:
+        expression, target = parse_odds_query(' '.join(context.args))
+        # big distributions take a while, don't block the other updates
+        message_str = await asyncio.to_thread(render_odds, expression, target)
+    except ValueError as e:
+        await update.effective_message.reply_text(
+            f"🔴 {html.escape(str(e))}\n\n"
+            f"<b>Esempi:</b> <code>/odds 2d6+3</code>, <code>/odds 1d20+5 vs 15</code>, "
+            f"<code>/odds adv+7 ca 18</code>, <code>/odds 4d6kh3</code>",
+            parse_mode=ParseMode.HTML
+        )
+        return
+
+    await update.effective_message.reply_text(message_str, parse_mode=ParseMode.HTML)
+
+
+async def combat_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Simulate the current character fighting a monster, e.g. /combat goblin 1d8 dex"""
+    character = (context.user_data.get(CHARACTERS_CREATOR_KEY) or {}).get(CURRENT_CHARACTER_KEY)
+    if not context.args or character is None:
+        await update.effective_message.reply_text(
+            "Seleziona un personaggio dal gestore personaggi e poi usa "
+            "<code>/combat mostro [danni arma] [caratteristica]</code>\n\n"
+            "<b>Esempi:</b> <code>/combat goblin</code>, <code>/combat adult-red-dragon 2d6 str</code>",
+            parse_mode=ParseMode.HTML
+        )
+        return
+
+    index = context.args[0].lower()
+    weapon_damage = context.args[1] if len(context.args) > 1 else DEFAULT_WEAPON_DAMAGE
+    ability = context.args[2] if len(context.args) > 2 else None
+
+    try:
+        data = await async_graphql_query(GRAPHQL_ENDPOINT, CATEGORY_TO_QUERY_MAP[MONSTERS], variables={'index': index})
+    except Exception as e:
+        logger.warning(f"Unable to get the monster {index}: {e}")
+        data = None
+    if not data or not data.get('monster'):
+        await update.effective_message.reply_text(f"🔴 Mostro {html.escape(index)} non trovato!")
+        return
+
+    try:
+        hit_points = character.current_hit_points or character.hit_points
+        player = character_combatant(character.name, character.feature_points, character.total_levels(),
+                                     character.ac, hit_points, weapon_damage, ability)
+        monster = monster_combatant(models.Monster(**data['monster']))
+        # the simulation takes some hundreds of milliseconds, don't block the other updates
+        message_str = await asyncio.to_thread(simulate_combat, player, monster)
+    except ValueError as e:
+        await update.effective_message.reply_text(f"🔴 {html.escape(str(e))}")
+        return
+
+    await update.effective_message.reply_text(message_str, parse_mode=ParseMode.HTML)
+
+
 async def handle_old_callback_queries(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer("This conversation is over or you didn't start it! Wait until it ends!", show_alert=True)
 
 
 def main() -> None:
-    # Check if the environment variable SILENT_START is set
-    silent_start = os.getenv("SILENT_START", "false").lower() == "true"
-
     # Initialize the keyring
     if not keyring_initialize():
         exit(0xFF)
 
-    # Initialize the Pickle database
-    persistence = PicklePersistence(filepath='DB.pkl')
+    # Answer the wiki from a local SRD snapshot if configured (see srd_snapshot.py)
+    snapshot_path = os.getenv("DND_SRD_SNAPSHOT")
+    if snapshot_path:
+        DndService.snapshot = SrdSnapshot(snapshot_path)
+
+    # Initialize the SQLite database, importing the old Pickle database the first time
+    persistence = SqlitePersistence(filepath='DB.sqlite')
+    if os.path.isfile('DB.pkl'):
+        persistence.import_pickle('DB.pkl')
 
     # Start building the application
     app_builder = (Application.builder()
                    .token(keyring_get('Telegram'))
                    .persistence(persistence)
-                   .arbitrary_callback_data(True))
-
-    if not silent_start:
-        app_builder = app_builder.post_init(post_init_callback).post_stop(post_stop_callback)
+                   .arbitrary_callback_data(True)
+                   .concurrent_updates(PerUserUpdateProcessor(CONCURRENT_UPDATES, MAX_PENDING_UPDATES))
+                   .post_init(post_init_callback)
+                   .post_stop(post_stop_callback))
 
     application = app_builder.build()
 
@@ -349,11 +513,28 @@ def main() -> None:
     )
     application.add_handler(main_conversation_handler)
 
+    # Disk usage report for the developer, in its own group to work during the conversations too
+    application.add_handler(CommandHandler('storage', storage_handler), group=1)
+    # Dice rolls, available everywhere
+    application.add_handler(CommandHandler('roll', roll_handler), group=1)
+    application.add_handler(CommandHandler('odds', odds_handler), group=1)
+    application.add_handler(CommandHandler('combat', combat_handler), group=1)
+
     # Manage buttons pressing in old conversations
     application.add_handler(CallbackQueryHandler(handle_old_callback_queries))
 
-    # Start the bot polling
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if WEBHOOK_URL:
+        # Start the webhook server, Telegram pushes the updates to WEBHOOK_URL/WEBHOOK_PATH
+        application.run_webhook(listen=WEBHOOK_LISTEN,
+                                port=WEBHOOK_PORT,
+                                url_path=WEBHOOK_PATH,
+                                webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+                                secret_token=WEBHOOK_SECRET,
+                                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                                allowed_updates=ALLOWED_UPDATES)
+    else:
+        # Start the bot polling
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 
 if __name__ == '__main__':
@@ -1,11 +1,21 @@
+import asyncio
+import logging
 from typing import Optional, Any, Dict, List
 
 from pydantic import BaseModel, Field, PrivateAttr
 
-from src.DndService import DndService
+from DndService import DndService
 from .APIResource import APIResource
 from .Feature import Feature
 
+logger = logging.getLogger(__name__)
+
+# Maximum number of features fetched at the same time
+FEATURES_FETCH_CONCURRENCY = 8
+
+# Features already fetched, shared across users and keyed by feature URL
+_FEATURES_CACHE: Dict[str, Feature] = {}
+
 
 class SpellCasting(BaseModel):
     cantrips_known: Optional[int] = None
@@ -50,11 +60,35 @@ class ClassLevelResource(BaseModel):
         arbitrary_types_allowed = True
 
     async def fetch_features(self):
-        for feature in self.features:
-            async with DndService() as dnd_service:
+        """
+        Fetch the details of all the features concurrently, keeping their order.
+        Features that can't be fetched are skipped.
+        """
+        if not self.features:
+            return
+
+        semaphore = asyncio.Semaphore(FEATURES_FETCH_CONCURRENCY)
+
+        async def fetch_feature(dnd_service: DndService, feature: APIResource) -> Feature:
+            if feature.url in _FEATURES_CACHE:
+                return _FEATURES_CACHE[feature.url]
+
+            async with semaphore:
                 resource_details = await dnd_service.get_resource_by_class_resource(feature.url)
 
-            self._fetched_features.append(Feature(**resource_details))
+            fetched_feature = Feature(**resource_details)
+            _FEATURES_CACHE[feature.url] = fetched_feature
+            return fetched_feature
+
+        async with DndService() as dnd_service:
+            results = await asyncio.gather(*(fetch_feature(dnd_service, feature) for feature in self.features),
+                                           return_exceptions=True)
+
+        for feature, result in zip(self.features, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Unable to fetch the feature {feature.url}: {result}")
+                continue
+            self._fetched_features.append(result)
 
     def __repr__(self):
         return self.__str__()
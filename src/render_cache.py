@@ -0,0 +1,82 @@
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from telegram import InlineKeyboardMarkup
+
+RenderKey = Tuple[str, str, str]
+
+
+@dataclass(frozen=True)
+class RenderedPage:
+    """A wiki detail page ready to be sent: the final text, its Telegram sized chunks, keyboard and image."""
+    text: str
+    chunks: List[str]
+    parse_mode: str
+    reply_markup: Optional[InlineKeyboardMarkup] = None
+    image: Optional[str] = None
+
+
+class RenderCache:
+    """
+    Bounded LRU cache of the rendered wiki pages, keyed by (category, index, parse_mode).
+    The SRD content is static, so a page is rendered once per process.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        """
+        Args:
+            max_entries (int): Maximum number of pages kept in memory.
+        """
+        self.max_entries = max_entries
+        self.__pages: OrderedDict[RenderKey, RenderedPage] = OrderedDict()
+
+        # counters
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, category: str, index: str, parse_mode: str) -> Optional[RenderedPage]:
+        """
+        Get a rendered page.
+
+        Returns:
+            Optional[RenderedPage]: The page, None if it hasn't been rendered yet.
+        """
+        key = (category, index, parse_mode)
+        page = self.__pages.get(key)
+        if page is None:
+            self.misses += 1
+            return None
+
+        self.__pages.move_to_end(key)
+        self.hits += 1
+        return page
+
+    def set(self, category: str, index: str, page: RenderedPage) -> RenderedPage:
+        """
+        Store a rendered page, evicting the least recently used one if the cache is full.
+
+        Returns:
+            RenderedPage: The stored page.
+        """
+        key = (category, index, page.parse_mode)
+        self.__pages[key] = page
+        self.__pages.move_to_end(key)
+        while len(self.__pages) > self.max_entries:
+            self.__pages.popitem(last=False)
+        return page
+
+    def clear(self) -> None:
+        self.__pages.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return the cache counters."""
+        return {
+            'entries': len(self.__pages),
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+RENDER_CACHE = RenderCache(max_entries=int(os.getenv('DND_RENDER_CACHE_MAX_ENTRIES', '512')))
@@ -0,0 +1,133 @@
+import re
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional, Set
+
+from thefuzz import fuzz
+
+from DndService import DndService
+from model.APIResource import APIResource
+
+# Number of results returned by a search
+SEARCH_TOP_K = 8
+# Minimum thefuzz score to consider a spell as a match
+SEARCH_MIN_SCORE = 50
+# Maximum number of candidates scored with thefuzz after the trigram pruning
+SEARCH_MAX_CANDIDATES = 40
+# Number of queries whose results are kept by each index
+SEARCH_RESULTS_CACHE_SIZE = 256
+
+NOT_ALPHANUMERIC_REGEX = re.compile(r'[^a-z0-9]+')
+
+
+def normalize_spell_name(text: str) -> str:
+    """
+    Normalize a spell name or a query: lowercase words separated by a single space.
+
+    Args:
+        text (str): The text to normalize.
+
+    Returns:
+        str: The normalized text.
+    """
+    return NOT_ALPHANUMERIC_REGEX.sub(' ', text.lower()).strip()
+
+
+def trigrams(text: str) -> Set[str]:
+    """
+    Get the trigrams of every word of a normalized text, padded to match short words too.
+
+    Args:
+        text (str): The normalized text.
+
+    Returns:
+        Set[str]: The trigrams.
+    """
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class SpellSearchIndex:
+    """
+    Search index over the spells of a class.
+    A trigram inverted index selects the candidates, which are then ranked with thefuzz.
+    """
+
+    def __init__(self, spells: List[APIResource]):
+        self.spells = spells
+        self.__names = [normalize_spell_name(spell.name) for spell in spells]
+        self.__by_name: Dict[str, APIResource] = {name: spell for name, spell in zip(self.__names, spells)}
+        self.__postings: Dict[str, List[int]] = defaultdict(list)
+        for position, name in enumerate(self.__names):
+            for gram in trigrams(name):
+                self.__postings[gram].append(position)
+        self.__results: OrderedDict[str, List[APIResource]] = OrderedDict()
+
+    def get_exact(self, query: str) -> Optional[APIResource]:
+        """Return the spell whose name matches exactly the query, ignoring case and punctuation."""
+        return self.__by_name.get(normalize_spell_name(query))
+
+    def __candidates(self, query: str) -> List[int]:
+        shared_grams: Dict[int, int] = defaultdict(int)
+        for gram in trigrams(query):
+            for position in self.__postings.get(gram, []):
+                shared_grams[position] += 1
+
+        return sorted(shared_grams, key=lambda position: shared_grams[position],
+                      reverse=True)[:SEARCH_MAX_CANDIDATES]
+
+    def search(self, query: str) -> List[APIResource]:
+        """
+        Search the spells most similar to the query.
+
+        Args:
+            query (str): The text written by the user.
+
+        Returns:
+            List[APIResource]: At most SEARCH_TOP_K spells, the most similar first.
+        """
+        query = normalize_spell_name(query)
+        if query in self.__results:
+            self.__results.move_to_end(query)
+            return self.__results[query]
+
+        scored = []
+        for position in self.__candidates(query):
+            score = fuzz.token_set_ratio(query, self.__names[position])
+            if score > SEARCH_MIN_SCORE:
+                scored.append((score, position))
+
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        results = [self.spells[position] for _, position in scored[:SEARCH_TOP_K]]
+
+        self.__results[query] = results
+        while len(self.__results) > SEARCH_RESULTS_CACHE_SIZE:
+            self.__results.popitem(last=False)
+
+        return results
+
+
+# Search indexes built so far, keyed by class index
+_CLASS_SPELLS_INDEXES: Dict[str, SpellSearchIndex] = {}
+
+
+async def get_class_spells_index(class_index: str) -> SpellSearchIndex:
+    """
+    Get the search index of the spells of a class, building it on the first request.
+
+    Args:
+        class_index (str): The class index, e.g. wizard.
+
+    Returns:
+        SpellSearchIndex: The search index.
+    """
+    if class_index not in _CLASS_SPELLS_INDEXES:
+        async with DndService() as dnd_service:
+            resource_details = await dnd_service.get_spells_by_class_index(class_index)
+
+        spells = [APIResource(**result) for result in resource_details['results']]
+        _CLASS_SPELLS_INDEXES[class_index] = SpellSearchIndex(spells)
+
+    return _CLASS_SPELLS_INDEXES[class_index]
@@ -0,0 +1,221 @@
+import hashlib
+import io
+import json
+import logging
+import pickle
+import sqlite3
+from typing import Any, Dict, Optional, Tuple, List
+
+from telegram import Bot
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+_REPLACED_BOT = "bot replaced by SqlitePersistence"
+
+# (keyboards data, button uuid to keyboard uuid) as stored by the CallbackDataCache
+CDCData = Tuple[List[Tuple[str, float, Dict[str, Any]]], Dict[str, str]]
+ConversationKey = Tuple[Any, ...]
+
+BOT_DATA_KEY = 'bot_data'
+CALLBACK_DATA_KEY = 'callback_data'
+PICKLE_MIGRATION_KEY = 'pickle_migration'
+
+
+class _BotPickler(pickle.Pickler):
+    """Pickler that doesn't store Bot instances, they are replaced with the current bot when loading."""
+
+    def persistent_id(self, obj: object) -> Optional[str]:
+        if isinstance(obj, Bot):
+            return _REPLACED_BOT
+        return None
+
+
+class _BotUnpickler(pickle.Unpickler):
+    """Unpickler that restores the current bot in place of the stored ones, also for PicklePersistence files."""
+
+    def __init__(self, bot: Optional[Bot], *args, **kwargs):
+        self._bot = bot
+        super().__init__(*args, **kwargs)
+
+    def persistent_load(self, pid: str) -> Optional[Bot]:
+        return self._bot
+
+
+class SqlitePersistence(BasePersistence):
+    """
+    Persistence backed by SQLite in WAL mode.
+    Every user_data and chat_data entry, every conversation key, bot_data and callback_data
+    are stored in their own row, and only the entries that changed since the last write are written.
+    """
+
+    def __init__(self, filepath: str, store_data: PersistenceInput = None, update_interval: float = 60):
+        """
+        Args:
+            filepath (str): Path of the SQLite database.
+            store_data (PersistenceInput): Which kind of data will be stored.
+            update_interval (float): Seconds between two consecutive updates of the persistence.
+        """
+        super().__init__(store_data=store_data, update_interval=update_interval)
+        self.filepath = filepath
+        self.__connection = sqlite3.connect(filepath)
+        self.__connection.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS user_data (id INTEGER PRIMARY KEY, data BLOB NOT NULL);
+            CREATE TABLE IF NOT EXISTS chat_data (id INTEGER PRIMARY KEY, data BLOB NOT NULL);
+            CREATE TABLE IF NOT EXISTS singletons (name TEXT PRIMARY KEY, data BLOB NOT NULL);
+            CREATE TABLE IF NOT EXISTS conversations (name TEXT NOT NULL, key TEXT NOT NULL, state BLOB NOT NULL,
+                                                      PRIMARY KEY (name, key));
+        """)
+        # digest of the last blob written for every row, used to skip the entries that didn't change
+        self.__digests: Dict[Tuple[str, Any], bytes] = {}
+
+    def __dumps(self, data: object) -> bytes:
+        buffer = io.BytesIO()
+        _BotPickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(data)
+        return buffer.getvalue()
+
+    def __loads(self, blob: bytes) -> Any:
+        return _BotUnpickler(self.bot, io.BytesIO(blob)).load()
+
+    def __is_dirty(self, row: Tuple[str, Any], blob: bytes) -> bool:
+        digest = hashlib.blake2b(blob, digest_size=16).digest()
+        if self.__digests.get(row) == digest:
+            return False
+        self.__digests[row] = digest
+        return True
+
+    def __load_table(self, table: str) -> Dict[int, Any]:
+        data = {}
+        for row_id, blob in self.__connection.execute(f"SELECT id, data FROM {table}"):
+            data[row_id] = self.__loads(blob)
+            self.__digests[(table, row_id)] = hashlib.blake2b(blob, digest_size=16).digest()
+        return data
+
+    def __write_row(self, table: str, row_id: int, data: object) -> None:
+        blob = self.__dumps(data)
+        if not self.__is_dirty((table, row_id), blob):
+            return
+        self.__connection.execute(f"INSERT OR REPLACE INTO {table} (id, data) VALUES (?, ?)", (row_id, blob))
+        self.__connection.commit()
+
+    def __get_singleton(self, name: str) -> Optional[Any]:
+        row = self.__connection.execute("SELECT data FROM singletons WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        self.__digests[('singletons', name)] = hashlib.blake2b(row[0], digest_size=16).digest()
+        return self.__loads(row[0])
+
+    def __write_singleton(self, name: str, data: object) -> None:
+        blob = self.__dumps(data)
+        if not self.__is_dirty(('singletons', name), blob):
+            return
+        self.__connection.execute("INSERT OR REPLACE INTO singletons (name, data) VALUES (?, ?)", (name, blob))
+        self.__connection.commit()
+
+    async def get_user_data(self) -> Dict[int, Any]:
+        return self.__load_table('user_data')
+
+    async def get_chat_data(self) -> Dict[int, Any]:
+        return self.__load_table('chat_data')
+
+    async def get_bot_data(self) -> Any:
+        bot_data = self.__get_singleton(BOT_DATA_KEY)
+        return bot_data if bot_data is not None else {}
+
+    async def get_callback_data(self) -> Optional[CDCData]:
+        return self.__get_singleton(CALLBACK_DATA_KEY)
+
+    async def get_conversations(self, name: str) -> Dict[ConversationKey, object]:
+        conversations = {}
+        for key, state in self.__connection.execute("SELECT key, state FROM conversations WHERE name = ?", (name,)):
+            conversations[tuple(json.loads(key))] = pickle.loads(state)
+        return conversations
+
+    async def update_conversation(self, name: str, key: ConversationKey, new_state: Optional[object]) -> None:
+        row_key = json.dumps(list(key))
+        if new_state is None:
+            self.__connection.execute("DELETE FROM conversations WHERE name = ? AND key = ?", (name, row_key))
+        else:
+            self.__connection.execute("INSERT OR REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)",
+                                      (name, row_key, pickle.dumps(new_state)))
+        self.__connection.commit()
+
+    async def update_user_data(self, user_id: int, data: Any) -> None:
+        self.__write_row('user_data', user_id, data)
+
+    async def update_chat_data(self, chat_id: int, data: Any) -> None:
+        self.__write_row('chat_data', chat_id, data)
+
+    async def update_bot_data(self, data: Any) -> None:
+        self.__write_singleton(BOT_DATA_KEY, data)
+
+    async def update_callback_data(self, data: CDCData) -> None:
+        self.__write_singleton(CALLBACK_DATA_KEY, data)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self.__connection.execute("DELETE FROM chat_data WHERE id = ?", (chat_id,))
+        self.__connection.commit()
+        self.__digests.pop(('chat_data', chat_id), None)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self.__connection.execute("DELETE FROM user_data WHERE id = ?", (user_id,))
+        self.__connection.commit()
+        self.__digests.pop(('user_data', user_id), None)
+
+    async def refresh_user_data(self, user_id: int, user_data: Any) -> None:
+        """Does nothing, the data in memory is always up to date."""
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Any) -> None:
+        """Does nothing, the data in memory is always up to date."""
+
+    async def refresh_bot_data(self, bot_data: Any) -> None:
+        """Does nothing, the data in memory is always up to date."""
+
+    async def flush(self) -> None:
+        """Commit any pending write and move the WAL content into the database."""
+        self.__connection.commit()
+        self.__connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def import_pickle(self, pickle_path: str) -> bool:
+        """
+        One-shot migration from a single file PicklePersistence database.
+        The migration is skipped if it has already been done.
+
+        Args:
+            pickle_path (str): Path of the pickle file, e.g. DB.pkl.
+
+        Returns:
+            bool: True if the data has been imported, False otherwise.
+        """
+        if self.__connection.execute("SELECT 1 FROM singletons WHERE name = ?",
+                                     (PICKLE_MIGRATION_KEY,)).fetchone():
+            return False
+
+        with open(pickle_path, 'rb') as file:
+            data = _BotUnpickler(None, file).load()
+
+        with self.__connection:
+            for user_id, user_data in (data.get('user_data') or {}).items():
+                self.__connection.execute("INSERT OR REPLACE INTO user_data (id, data) VALUES (?, ?)",
+                                          (user_id, self.__dumps(user_data)))
+            for chat_id, chat_data in (data.get('chat_data') or {}).items():
+                self.__connection.execute("INSERT OR REPLACE INTO chat_data (id, data) VALUES (?, ?)",
+                                          (chat_id, self.__dumps(chat_data)))
+            if data.get('bot_data') is not None:
+                self.__connection.execute("INSERT OR REPLACE INTO singletons (name, data) VALUES (?, ?)",
+                                          (BOT_DATA_KEY, self.__dumps(data['bot_data'])))
+            if data.get('callback_data'):
+                self.__connection.execute("INSERT OR REPLACE INTO singletons (name, data) VALUES (?, ?)",
+                                          (CALLBACK_DATA_KEY, self.__dumps(data['callback_data'])))
+            for name, conversations in (data.get('conversations') or {}).items():
+                for key, state in conversations.items():
+                    self.__connection.execute(
+                        "INSERT OR REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)",
+                        (name, json.dumps(list(key)), pickle.dumps(state)))
+            self.__connection.execute("INSERT OR REPLACE INTO singletons (name, data) VALUES (?, ?)",
+                                      (PICKLE_MIGRATION_KEY, pickle.dumps(pickle_path)))
+
+        logger.info(f"Persistence migrated from {pickle_path} to {self.filepath}")
+        return True
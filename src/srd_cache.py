@@ -0,0 +1,171 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    stored_at: float = field(default_factory=time.time)
+    etag: Optional[str] = None
+
+
+class SrdCache:
+    """
+    Two tiers cache for the SRD content: a bounded in-memory LRU and an optional on-disk tier.
+    Expired entries are kept so they can be revalidated or served when the API is unreachable.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl: float = 86400, disk_path: Optional[str] = None):
+        """
+        Args:
+            max_entries (int): Maximum number of entries kept in memory.
+            ttl (float): Seconds after which an entry must be revalidated.
+            disk_path (str): Directory of the on-disk tier. None disables it.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.__entries: OrderedDict[str, CacheEntry] = OrderedDict()
+
+        # counters
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.revalidations = 0
+        self.stale_hits = 0
+
+        if self.disk_path:
+            os.makedirs(self.disk_path, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """
+        Build a cache key from a URL or from a query and its variables.
+
+        Returns:
+            str: The cache key.
+        """
+        return json.dumps(parts, sort_keys=True, separators=(',', ':'))
+
+    def __disk_file(self, key: str) -> str:
+        return os.path.join(self.disk_path, f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.json")
+
+    def __read_disk(self, key: str) -> Optional[CacheEntry]:
+        if not self.disk_path:
+            return None
+
+        try:
+            with open(self.__disk_file(key), encoding='utf-8') as file:
+                return CacheEntry(**json.load(file))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Corrupted SRD cache entry on disk: {e}")
+            return None
+
+    def __write_disk(self, key: str, entry: CacheEntry) -> None:
+        if not self.disk_path:
+            return
+
+        file_path = self.__disk_file(key)
+        tmp_path = f"{file_path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump({'value': entry.value, 'stored_at': entry.stored_at, 'etag': entry.etag}, file)
+            os.replace(tmp_path, file_path)
+        except (OSError, TypeError) as e:
+            logger.warning(f"Unable to write the SRD cache entry on disk: {e}")
+
+    def __remember(self, key: str, entry: CacheEntry) -> None:
+        self.__entries[key] = entry
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.max_entries:
+            self.__entries.popitem(last=False)
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        """Return True if the entry is younger than the TTL."""
+        return time.time() - entry.stored_at < self.ttl
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """
+        Get an entry, fresh or expired, looking first in memory and then on disk.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            Optional[CacheEntry]: The entry if present, None otherwise.
+        """
+        entry = self.__entries.get(key)
+        if entry is not None:
+            self.__entries.move_to_end(key)
+        else:
+            entry = self.__read_disk(key)
+            if entry is not None:
+                self.disk_hits += 1
+                self.__remember(key, entry)
+
+        if entry is not None and self.is_fresh(entry):
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        return entry
+
+    def set(self, key: str, value: Any, etag: Optional[str] = None) -> None:
+        """
+        Store a value in both tiers.
+
+        Args:
+            key (str): The cache key.
+            value (Any): A JSON serializable value.
+            etag (str): Optional ETag returned by the server.
+        """
+        entry = CacheEntry(value=value, etag=etag)
+        self.__remember(key, entry)
+        self.__write_disk(key, entry)
+
+    def refresh(self, key: str) -> None:
+        """Mark an entry as fresh again after a successful revalidation."""
+        entry = self.__entries.get(key)
+        if entry is None:
+            return
+
+        self.revalidations += 1
+        entry.stored_at = time.time()
+        self.__write_disk(key, entry)
+
+    def serve_stale(self, entry: CacheEntry) -> Any:
+        """Return the value of an expired entry used because the API is unreachable."""
+        self.stale_hits += 1
+        return entry.value
+
+    def clear(self) -> None:
+        """Clear the in-memory tier."""
+        self.__entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return the cache counters."""
+        return {
+            'entries': len(self.__entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'disk_hits': self.disk_hits,
+            'revalidations': self.revalidations,
+            'stale_hits': self.stale_hits
+        }
+
+
+SRD_CACHE = SrdCache(
+    max_entries=int(os.getenv('DND_CACHE_MAX_ENTRIES', '2048')),
+    ttl=float(os.getenv('DND_CACHE_TTL', '86400')),
+    disk_path=os.getenv('DND_CACHE_DIR') or None
+)
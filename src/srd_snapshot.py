@@ -0,0 +1,187 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import zlib
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+from gql.transport.exceptions import TransportError
+
+from DndService import DndService
+from graphql_queries import CATEGORY_TO_QUERY_MAP
+from util import async_graphql_query, open_graphql_session, close_graphql_session
+
+logger = logging.getLogger(__name__)
+
+GRAPHQL_ENDPOINT = 'https://www.dnd5eapi.co/graphql'
+QUERY_TO_CATEGORY = {query: category for category, query in CATEGORY_TO_QUERY_MAP.items()}
+
+CLASSES = 'classes'
+MAX_CLASS_LEVEL = 20
+
+
+class SrdSnapshot:
+    """
+    Local SQLite copy of the SRD content.
+    REST documents are stored by API path, GraphQL responses by category and index.
+    Bodies are stored as zlib compressed JSON.
+    """
+
+    def __init__(self, db_path: str, writable: bool = False):
+        """
+        Args:
+            db_path (str): Path of the SQLite database.
+            writable (bool): Open the database for the import, read only otherwise.
+        """
+        self.db_path = db_path
+        if writable:
+            self.__connection = sqlite3.connect(db_path)
+            self.__connection.executescript("""
+                CREATE TABLE IF NOT EXISTS documents (path TEXT PRIMARY KEY, body BLOB NOT NULL);
+                CREATE TABLE IF NOT EXISTS graphql (category TEXT NOT NULL, idx TEXT NOT NULL, body BLOB NOT NULL,
+                                                    PRIMARY KEY (category, idx));
+            """)
+        else:
+            self.__connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+
+    @staticmethod
+    def __encode(data: Any) -> bytes:
+        return zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+
+    @staticmethod
+    def __decode(body: bytes) -> Any:
+        return json.loads(zlib.decompress(body))
+
+    @staticmethod
+    def url_to_path(url: str) -> str:
+        """Convert a full API URL into the path used as key, e.g. /api/classes/wizard"""
+        if url.startswith(DndService.DOMAIN):
+            return url[len(DndService.DOMAIN):]
+        return url
+
+    def put_document(self, path: str, data: Dict) -> None:
+        self.__connection.execute("INSERT OR REPLACE INTO documents (path, body) VALUES (?, ?)",
+                                  (self.url_to_path(path), self.__encode(data)))
+
+    def put_graphql(self, category: str, index: str, data: Dict) -> None:
+        self.__connection.execute("INSERT OR REPLACE INTO graphql (category, idx, body) VALUES (?, ?, ?)",
+                                  (category, index, self.__encode(data)))
+
+    def commit(self) -> None:
+        self.__connection.commit()
+
+    def close(self) -> None:
+        self.__connection.close()
+
+    def get_graphql_indexes(self, category: str) -> List[str]:
+        """Get the indexes of the resources of a GraphQL category stored in the snapshot."""
+        return [row[0] for row in self.__connection.execute("SELECT idx FROM graphql WHERE category = ?",
+                                                            (category,))]
+
+    def get_document(self, url: str) -> Dict:
+        """
+        Get a REST document by URL or path.
+
+        Raises:
+            LookupError: If the document is not in the snapshot.
+        """
+        path = self.url_to_path(url)
+        row = self.__connection.execute("SELECT body FROM documents WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            raise LookupError(f"{path} is not in the SRD snapshot {self.db_path}")
+        return self.__decode(row[0])
+
+    def get_graphql(self, query: str, variables: Optional[Dict]) -> Dict:
+        """
+        Get the response of one of the queries in CATEGORY_TO_QUERY_MAP.
+
+        Raises:
+            LookupError: If the query or the resource is not in the snapshot.
+        """
+        category = QUERY_TO_CATEGORY.get(query)
+        index = (variables or {}).get('index')
+        row = self.__connection.execute("SELECT body FROM graphql WHERE category = ? AND idx = ?",
+                                        (category, index)).fetchone()
+        if row is None:
+            raise LookupError(f"{category}/{index} is not in the SRD snapshot {self.db_path}")
+        return self.__decode(row[0])
+
+
+async def import_snapshot(db_path: str, concurrency: int = 10) -> None:
+    """
+    Crawl every endpoint listed by the API root and every GraphQL detail query, storing them in a snapshot.
+
+    Args:
+        db_path (str): Path of the SQLite database to create or update.
+        concurrency (int): Maximum number of concurrent requests.
+    """
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    snapshot = SrdSnapshot(db_path, writable=True)
+    semaphore = asyncio.Semaphore(concurrency)
+    await open_graphql_session(GRAPHQL_ENDPOINT)
+
+    try:
+        async with DndService() as dnd_service:
+            async def fetch(path: str) -> Optional[Dict]:
+                async with semaphore:
+                    try:
+                        data = await dnd_service.get_resource_by_class_resource(path)
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        logger.warning(f"Unable to fetch {path}: {e}")
+                        return None
+                snapshot.put_document(path, data)
+                return data
+
+            async def fetch_graphql(category: str, index: str) -> None:
+                async with semaphore:
+                    try:
+                        data = await async_graphql_query(GRAPHQL_ENDPOINT, CATEGORY_TO_QUERY_MAP[category],
+                                                         variables={'index': index})
+                    except (aiohttp.ClientError, asyncio.TimeoutError, TransportError) as e:
+                        logger.warning(f"Unable to fetch {category}/{index} from GraphQL: {e}")
+                        return
+                snapshot.put_graphql(category, index, data)
+
+            all_resources = await dnd_service.get_all_resources()
+            snapshot.put_document('/api', all_resources)
+
+            endpoints = list(all_resources.keys())
+            resource_lists: List[Optional[Dict]] = await asyncio.gather(
+                *(fetch(all_resources[endpoint]) for endpoint in endpoints))
+            indexes = {endpoint: [result['index'] for result in (resource_list or {}).get('results', [])]
+                       for endpoint, resource_list in zip(endpoints, resource_lists)}
+
+            detail_paths = [result['url'] for resource_list in resource_lists if resource_list
+                            for result in resource_list.get('results', [])]
+            for class_index in indexes.get(CLASSES, []):
+                detail_paths.append(f"/api/classes/{class_index}/spells")
+                detail_paths += [f"/api/classes/{class_index}/levels/{level}"
+                                 for level in range(1, MAX_CLASS_LEVEL + 1)]
+            await asyncio.gather(*(fetch(path) for path in detail_paths))
+            logger.info(f"{len(detail_paths)} REST documents fetched")
+
+            await asyncio.gather(*(fetch_graphql(category, index)
+                                   for category in CATEGORY_TO_QUERY_MAP
+                                   for index in indexes.get(category, [])))
+
+        snapshot.commit()
+    finally:
+        snapshot.close()
+        await close_graphql_session()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Download the SRD content into a local snapshot usable offline")
+    parser.add_argument('--output', default='files/srd_snapshot.sqlite', help="Path of the snapshot database")
+    parser.add_argument('--concurrency', type=int, default=10, help="Maximum number of concurrent requests")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(import_snapshot(args.output, args.concurrency))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Dict, List, Tuple
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+UpdateKey = Tuple[str, int]
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    Update processor that runs the updates of different users concurrently while the updates
+    of the same user and of the same chat are processed one at a time, in the order they arrived.
+    This keeps the ConversationHandler states, user_data and chat_data consistent.
+    """
+
+    def __init__(self, max_concurrent_updates: int, max_pending_updates: int = 256):
+        """
+        Args:
+            max_concurrent_updates (int): Maximum number of updates processed at the same time.
+            max_pending_updates (int): Maximum number of updates accepted, including the ones waiting for
+                a previous update of the same user or chat. The next updates wait to be accepted.
+        """
+        if max_pending_updates < max_concurrent_updates:
+            raise ValueError("max_pending_updates must be greater than or equal to max_concurrent_updates")
+
+        # the base semaphore bounds the accepted updates, so the updates waiting for their user
+        # don't take the place of the updates of the other users
+        super().__init__(max_pending_updates)
+        self.__running_semaphore = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self.__locks: Dict[UpdateKey, asyncio.Lock] = {}
+        self.__queued: Dict[UpdateKey, int] = {}
+
+        # metrics
+        self.running = 0
+        self.waiting = 0
+        self.processed = 0
+        self.peak_waiting = 0
+        self.peak_key_depth = 0
+        self.total_wait_time = 0.0
+
+    @staticmethod
+    def get_update_keys(update: object) -> List[UpdateKey]:
+        """
+        Get the keys that the update must be serialized on: its user and its chat.
+
+        Args:
+            update (object): The update to be processed.
+
+        Returns:
+            List[UpdateKey]: The keys, in the order the locks must be acquired.
+        """
+        if not isinstance(update, Update):
+            return []
+
+        keys = set()
+        if update.effective_chat:
+            keys.add(('chat', update.effective_chat.id))
+        if update.effective_user:
+            keys.add(('user', update.effective_user.id))
+
+        # a fixed acquisition order avoids deadlocks between updates sharing only one of the keys
+        return sorted(keys)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        keys = self.get_update_keys(update)
+        locks = []
+        for key in keys:
+            self.__queued[key] = self.__queued.get(key, 0) + 1
+            self.peak_key_depth = max(self.peak_key_depth, self.__queued[key])
+            locks.append(self.__locks.setdefault(key, asyncio.Lock()))
+
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+        queued_at = time.monotonic()
+        started = False
+        acquired = []
+        try:
+            # asyncio locks wake up their waiters in FIFO order, preserving the order of the updates
+            for lock in locks:
+                await lock.acquire()
+                acquired.append(lock)
+
+            async with self.__running_semaphore:
+                started = True
+                self.waiting -= 1
+                self.total_wait_time += time.monotonic() - queued_at
+                self.running += 1
+                try:
+                    await coroutine
+                finally:
+                    self.running -= 1
+                    self.processed += 1
+        finally:
+            if not started:
+                # cancelled while waiting
+                self.waiting -= 1
+            for lock in reversed(acquired):
+                lock.release()
+            for key in keys:
+                self.__queued[key] -= 1
+                if not self.__queued[key]:
+                    # nobody else is waiting for this key
+                    del self.__queued[key]
+                    del self.__locks[key]
+
+    def stats(self) -> Dict[str, float]:
+        """Return the queue metrics."""
+        return {
+            'running': self.running,
+            'waiting': self.waiting,
+            'processed': self.processed,
+            'peak_waiting': self.peak_waiting,
+            'peak_key_depth': self.peak_key_depth,
+            'active_keys': len(self.__locks),
+            'avg_wait_ms': round(self.total_wait_time / self.processed * 1000, 2) if self.processed else 0
+        }
+
+    async def initialize(self) -> None:
+        """Does nothing."""
+
+    async def shutdown(self) -> None:
+        logger.info(f"Update processor stats: {self.stats()}")
@@ -1,14 +1,27 @@
+import asyncio
 import logging
+import os
 import re
-from typing import List, Union
+from functools import lru_cache
+from typing import List, Union, Optional, Tuple
 
+import aiohttp
 from gql import Client, gql
+from gql.client import AsyncClientSession
 from gql.transport.aiohttp import AIOHTTPTransport
 from gql.transport.aiohttp import log as graphql_requests_logger
+from gql.transport.exceptions import TransportServerError
+from graphql import DocumentNode, print_schema
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.constants import ParseMode
 
+from DndService import DndService
+from file_id_registry import FILE_ID_REGISTRY
+from graphql_queries import CATEGORY_TO_QUERY_MAP
 from model.APIResource import APIResource
+from srd_cache import SRD_CACHE
+
+logger = logging.getLogger(__name__)
 
 graphql_requests_logger.setLevel(logging.WARNING)
 ABILITY_SCORE_CALLBACK = 'ability_score'
@@ -16,6 +29,19 @@ SPELL_LEARN_CALLBACK_DATA = "spells_learn"
 
 API = 'https://www.dnd5eapi.co'
 
+# Patterns used to split the HTML messages
+HTML_TAG_REGEX = re.compile(r'(<!--.*?-->|<[^>]*>)', re.DOTALL)
+HTML_TAG_NAME_REGEX = re.compile(r'<\s*([a-zA-Z][a-zA-Z0-9-]*)')
+HTML_ENTITY_MAX_LENGTH = 10
+
+# Local copy of the GraphQL schema: loaded at startup if present, written after the first introspection otherwise
+GRAPHQL_SCHEMA_PATH = os.getenv('DND_GRAPHQL_SCHEMA_PATH', 'files/dnd5eapi_schema.graphql')
+
+# Long-lived GraphQL client and session, opened in the application post_init
+_graphql_client: Optional[Client] = None
+_graphql_session: Optional[AsyncClientSession] = None
+_graphql_endpoint: Optional[str] = None
+
 
 def is_string_in_nested_lists(target: str, nested_lists: List[Union[str, List]]) -> bool:
     """
@@ -37,92 +63,127 @@ def is_string_in_nested_lists(target: str, nested_lists: List[Union[str, List]])
     return False
 
 
-async def split_text_into_chunks(text: str, update: Update, reply_markup: InlineKeyboardMarkup = None,
-                                 max_length: int = 4096, image: str = None,
-                                 parse_mode: ParseMode = ParseMode.HTML) -> None:
+def split_html_text(text: str, max_length: int = 4096) -> List[str]:
     """
     Split a given text into chunks that do not exceed the maximum Telegram message length,
-    ensuring that HTML tags are not cut in half.
+    ensuring that HTML tags and entities are not cut in half.
+    The tags still open at the end of a chunk are closed and then reopened, with their attributes,
+    at the beginning of the next one. The reopened and the closing tags are counted in the chunk length.
 
     Args:
         text (str): The text to be split.
-        update (Update): The bot update object.
-        reply_markup (InlineKeyboardMarkup): Optional keyboard markup for the messages.
         max_length (int): The maximum length of each chunk (default is 4096).
-        image: (str): The image to be used for the message.
-        parse_mode: (ParseMode): Optional parse mode for telegram messages.
 
     Returns:
-        None
+        List[str]: The chunks.
+
+    Raises:
+        ValueError: If the open tags, reopened and closed, don't leave room for the next tag or entity.
     """
     if len(text) <= max_length:
-        await update.effective_message.reply_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
-        return
-
-    tag_regex = re.compile(r'(<!--.*?-->|<[^>]*>)')
-    chunks = []
-    current_chunk = ""
-    current_length = 0
-    open_tags = []
-
-    def close_open_tags(tags):
-        return ''.join([f"</{tag}>" for tag in tags[::-1]])
-
-    def open_tags_html(tags):
-        return ''.join([f"<{tag}>" for tag in tags])
-
-    def extract_tag_name(tag):
-        return tag[1:-1].split(' ')[0].replace('/', '')
-
-    for part in tag_regex.split(text):
-        if not part:
+        return [text]
+
+    chunks: List[str] = []
+    parts: List[str] = []
+    length = 0
+    # (opening tag, closing tag) of the tags currently open
+    open_tags: List[Tuple[str, str]] = []
+    closing_length = 0
+    # length of the tags reopened at the beginning of the current chunk
+    reopened_length = 0
+
+    def flush() -> None:
+        nonlocal parts, length, reopened_length
+        if length > reopened_length:
+            parts.extend(closing for _, closing in reversed(open_tags))
+            chunks.append(''.join(parts))
+        parts = [opening for opening, _ in open_tags]
+        length = reopened_length = sum(len(opening) for opening, _ in open_tags)
+
+    def make_room(needed: int) -> None:
+        """Start a new chunk if the current one can't contain needed more characters."""
+        if length + closing_length + needed > max_length:
+            flush()
+            if length + closing_length + needed > max_length:
+                raise ValueError(f"The open tags don't fit in a message of {max_length} characters")
+
+    for token in HTML_TAG_REGEX.split(text):
+        if not token:
             continue
 
-        if part.startswith('<') and part.endswith('>'):
-            tag_name = extract_tag_name(part)
-
-            if current_length + len(part) > max_length:
-                closing_tags = close_open_tags(open_tags)
-                chunks.append(current_chunk + closing_tags)
-                current_chunk = open_tags_html(open_tags)
-                current_length = len(current_chunk)
-
-            if part.startswith('</'):
-                if open_tags and open_tags[-1] == tag_name:
-                    open_tags.pop()
-            elif not part.endswith('/>'):
-                if current_length + len(part) > max_length:
-                    chunks.append(current_chunk)
-                    current_chunk = ""
-                    current_length = 0
-                open_tags.append(tag_name)
-
-            current_chunk += part
-            current_length += len(part)
-        else:
-            while len(part) > 0:
-                remaining_length = max_length - current_length
-                if len(part) <= remaining_length:
-                    current_chunk += part
-                    current_length += len(part)
-                    part = ""
+        if token[0] == '<' and token[-1] == '>':
+            if token.startswith('</'):
+                if open_tags and open_tags[-1][1] == token.replace(' ', ''):
+                    opening, closing = open_tags.pop()
+                    closing_length -= len(closing)
+                    if length == reopened_length:
+                        # the tag was only reopened, drop it instead of sending it empty
+                        parts.pop()
+                        length -= len(opening)
+                        reopened_length -= len(opening)
+                        continue
                 else:
-                    split_point = part.rfind(' ', 0, remaining_length)
-                    if split_point == -1:
-                        split_point = remaining_length
-
-                    current_chunk += part[:split_point]
-                    part = part[split_point:].strip()
-
-                    closing_tags = close_open_tags(open_tags)
-                    chunks.append(current_chunk + closing_tags)
-                    current_chunk = open_tags_html(open_tags)
-                    current_length = len(current_chunk)
+                    # a closing tag without its opening tag, it isn't counted in closing_length
+                    make_room(len(token))
+                parts.append(token)
+                length += len(token)
+                continue
+
+            tag_name = HTML_TAG_NAME_REGEX.match(token)
+            closing = f"</{tag_name.group(1)}>" if tag_name and not token.endswith('/>') else ''
+            make_room(len(token) + len(closing))
+            parts.append(token)
+            length += len(token)
+            if closing:
+                open_tags.append((token, closing))
+                closing_length += len(closing)
+            continue
 
-    if current_chunk:
-        closing_tags = close_open_tags(open_tags)
-        chunks.append(current_chunk + closing_tags)
+        while token:
+            room = max_length - length - closing_length
+            if len(token) <= room:
+                parts.append(token)
+                length += len(token)
+                break
+
+            split_point = 0
+            if room > 0:
+                # prefer a new line, then a space, otherwise cut the word
+                split_point = token.rfind('\n', 0, room + 1)
+                if split_point < room // 2:
+                    split_point = token.rfind(' ', 0, room + 1)
+                if split_point <= 0:
+                    split_point = room
+                # don't cut an HTML entity like &amp;
+                entity_start = token.rfind('&', max(0, split_point - HTML_ENTITY_MAX_LENGTH), split_point)
+                if entity_start >= 0 and token.find(';', entity_start, split_point) == -1:
+                    split_point = entity_start
+
+            if split_point > 0:
+                parts.append(token[:split_point])
+                length += split_point
+                token = token[split_point:].lstrip()
+            elif length == reopened_length:
+                # nothing fits even in a chunk with only the reopened tags
+                raise ValueError(f"The open tags don't fit in a message of {max_length} characters")
+            flush()
+
+    flush()
+    return chunks
+
+
+async def send_text_chunks(chunks: List[str], update: Update, reply_markup: InlineKeyboardMarkup = None,
+                           image: str = None, parse_mode: ParseMode = ParseMode.HTML) -> None:
+    """
+    Send the chunks of a text as consecutive messages, the keyboard is attached to the last one.
 
+    Args:
+        chunks (List[str]): The chunks returned by split_html_text.
+        update (Update): The bot update object.
+        reply_markup (InlineKeyboardMarkup): Optional keyboard markup for the messages.
+        image: (str): The image to be used for the message.
+        parse_mode: (ParseMode): Optional parse mode for telegram messages.
+    """
     for index, chunk in enumerate(chunks):
         if index == len(chunks) - 1:
             await update.effective_message.reply_text(chunk, parse_mode=parse_mode, reply_markup=reply_markup)
@@ -131,10 +192,31 @@ async def split_text_into_chunks(text: str, update: Update, reply_markup: Inline
 
     if image:
         message = await update.effective_message.reply_text("Caricamento foto...")
-        await update.effective_message.reply_photo(API + image)
+        await FILE_ID_REGISTRY.send(API + image, update.effective_message.reply_photo)
         await message.delete()
 
 
+async def split_text_into_chunks(text: str, update: Update, reply_markup: InlineKeyboardMarkup = None,
+                                 max_length: int = 4096, image: str = None,
+                                 parse_mode: ParseMode = ParseMode.HTML) -> None:
+    """
+    Split a given text into chunks that do not exceed the maximum Telegram message length and send them.
+
+    Args:
+        text (str): The text to be split.
+        update (Update): The bot update object.
+        reply_markup (InlineKeyboardMarkup): Optional keyboard markup for the messages.
+        max_length (int): The maximum length of each chunk (default is 4096).
+        image: (str): The image to be used for the message.
+        parse_mode: (ParseMode): Optional parse mode for telegram messages.
+
+    Returns:
+        None
+    """
+    await send_text_chunks(split_html_text(text, max_length), update, reply_markup=reply_markup, image=image,
+                           parse_mode=parse_mode)
+
+
 def generate_resource_list_keyboard(resources: List[APIResource],
                                     draw_navigation_buttons: bool = True) -> InlineKeyboardMarkup:
     """
@@ -200,9 +282,100 @@ def format_camel_case_to_title(input_string: str) -> str:
     return formatted_string
 
 
+@lru_cache(maxsize=None)
+def parse_graphql_query(query: str) -> DocumentNode:
+    """
+    Parse a GraphQL query string only once and reuse the resulting document.
+
+    :param query: The GraphQL query as a string.
+    :return: The parsed GraphQL document.
+    """
+    return gql(query)
+
+
+def _load_graphql_schema() -> Optional[str]:
+    """
+    Load the GraphQL schema from the local file.
+
+    :return: The schema in SDL format, None if the file is not available.
+    """
+    if not os.path.isfile(GRAPHQL_SCHEMA_PATH):
+        return None
+
+    with open(GRAPHQL_SCHEMA_PATH, encoding='utf-8') as file:
+        return file.read()
+
+
+def _store_graphql_schema(client: Client) -> None:
+    """
+    Store the GraphQL schema fetched from the transport in the local file.
+
+    :param client: The connected GraphQL client.
+    """
+    if client.schema is None:
+        return
+
+    try:
+        os.makedirs(os.path.dirname(GRAPHQL_SCHEMA_PATH) or '.', exist_ok=True)
+        with open(GRAPHQL_SCHEMA_PATH, 'w', encoding='utf-8') as file:
+            file.write(print_schema(client.schema))
+    except OSError as e:
+        logger.warning(f"Unable to store the GraphQL schema in {GRAPHQL_SCHEMA_PATH}: {e}")
+
+
+async def open_graphql_session(endpoint: str) -> None:
+    """
+    Open the long-lived GraphQL session used by async_graphql_query.
+    The schema is loaded from the local file or fetched once from the endpoint and every query
+    in CATEGORY_TO_QUERY_MAP is parsed in advance.
+
+    :param endpoint: The GraphQL endpoint URL.
+    """
+    global _graphql_client, _graphql_session, _graphql_endpoint
+
+    if _graphql_session is not None:
+        return
+
+    for query in CATEGORY_TO_QUERY_MAP.values():
+        parse_graphql_query(query)
+
+    schema = _load_graphql_schema()
+    transport = AIOHTTPTransport(url=endpoint, timeout=int(DndService.TOTAL_TIMEOUT))
+    client = Client(transport=transport, schema=schema, fetch_schema_from_transport=schema is None)
+
+    try:
+        session = await client.connect_async(reconnecting=False)
+    except Exception as e:
+        # The queries still work through a short-lived client, so the bot can start anyway
+        logger.error(f"Unable to open the GraphQL session on {endpoint}: {e}")
+        return
+
+    if schema is None:
+        _store_graphql_schema(client)
+
+    _graphql_client, _graphql_session, _graphql_endpoint = client, session, endpoint
+    logger.info("GraphQL session opened")
+
+
+async def close_graphql_session() -> None:
+    """
+    Close the long-lived GraphQL session.
+    """
+    global _graphql_client, _graphql_session, _graphql_endpoint
+
+    if _graphql_client is not None:
+        await _graphql_client.close_async()
+        logger.info("GraphQL session closed")
+
+    _graphql_client, _graphql_session, _graphql_endpoint = None, None, None
+
+
 async def async_graphql_query(endpoint, query, variables=None, headers=None):
     """
     Perform an asynchronous GraphQL query using the gql library.
+    The long-lived session is used when it's open on the same endpoint and no custom headers are required.
+    Responses are cached by query and variables and served stale if the endpoint is unreachable.
+    If a local SRD snapshot is loaded and contains the resource the response comes from it.
 
     :param endpoint: The GraphQL endpoint URL.
     :param query: The GraphQL query as a string.
@@ -210,12 +383,35 @@ async def async_graphql_query(endpoint, query, variables=None, headers=None):
     :param headers: A dictionary of headers to include in the request (default is None).
     :return: The JSON response from the GraphQL server.
     """
-    transport = AIOHTTPTransport(
-        url=endpoint,
-        headers=headers
-    )
-
-    async with Client(transport=transport, fetch_schema_from_transport=True) as session:
-        gql_query = gql(query)
-        response = await session.execute(gql_query, variable_values=variables)
-        return response
+    if DndService.snapshot is not None:
+        try:
+            return DndService.snapshot.get_graphql(query, variables)
+        except LookupError as e:
+            logger.info(f"{e}, requesting it to the GraphQL endpoint")
+
+    key = SRD_CACHE.make_key(endpoint, query, variables)
+    cache_entry = SRD_CACHE.get(key)
+    if cache_entry is not None and SRD_CACHE.is_fresh(cache_entry):
+        return cache_entry.value
+
+    gql_query = parse_graphql_query(query)
+
+    try:
+        if _graphql_session is not None and endpoint == _graphql_endpoint and not headers:
+            response = await _graphql_session.execute(gql_query, variable_values=variables)
+        else:
+            transport = AIOHTTPTransport(
+                url=endpoint,
+                headers=headers
+            )
+
+            async with Client(transport=transport, fetch_schema_from_transport=True) as session:
+                response = await session.execute(gql_query, variable_values=variables)
+    except (aiohttp.ClientError, asyncio.TimeoutError, TransportServerError) as e:
+        if cache_entry is None:
+            raise
+        logger.warning(f"Serving stale GraphQL content for {variables}: {e}")
+        return SRD_CACHE.serve_stale(cache_entry)
+
+    SRD_CACHE.set(key, response)
+    return response
@@ -0,0 +1,108 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+def load_updates(path: str) -> List[Dict]:
+    """
+    Load the recorded updates, either a JSON list (e.g. the result of getUpdates) or one update per line.
+
+    Args:
+        path (str): Path of the recorded updates.
+
+    Returns:
+        List[Dict]: The updates.
+    """
+    with open(path, encoding='utf-8') as file:
+        content = file.read().strip()
+
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError:
+        return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+    if isinstance(data, dict):
+        return data.get('result', [data])
+    return data
+
+
+def percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+async def post_updates(url: str, updates: List[Dict], repeat: int, concurrency: int,
+                       secret_token: Optional[str]) -> None:
+    """
+    Post the recorded updates to the webhook and log the throughput and the latency.
+
+    Args:
+        url (str): The webhook URL, e.g. http://127.0.0.1:8443/telegram
+        updates (List[Dict]): The recorded updates.
+        repeat (int): How many times every update is posted.
+        concurrency (int): Maximum number of concurrent requests.
+        secret_token (str): The secret token configured in the bot, if any.
+    """
+    headers = {SECRET_TOKEN_HEADER: secret_token} if secret_token else {}
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async with aiohttp.ClientSession(headers=headers) as session:
+        async def post(update_id: int, update: Dict) -> None:
+            nonlocal errors
+            # every posted update needs its own update_id
+            update = {**update, 'update_id': update_id}
+            async with semaphore:
+                started_at = time.perf_counter()
+                try:
+                    async with session.post(url, json=update) as response:
+                        await response.read()
+                        if response.status != 200:
+                            errors += 1
+                            logger.warning(f"Update {update_id}: HTTP {response.status}")
+                except aiohttp.ClientError as e:
+                    errors += 1
+                    logger.warning(f"Update {update_id}: {e}")
+                latencies.append(time.perf_counter() - started_at)
+
+        started_at = time.perf_counter()
+        await asyncio.gather(*(post(update_id, update)
+                               for update_id, update in enumerate(updates * repeat, start=1)))
+        elapsed = time.perf_counter() - started_at
+
+    logger.info(f"{len(latencies)} updates posted in {elapsed:.2f}s: {len(latencies) / elapsed:.1f} updates/s, "
+                f"{errors} errors")
+    logger.info(f"Latency p50 {percentile(latencies, 50) * 1000:.1f}ms, "
+                f"p95 {percentile(latencies, 95) * 1000:.1f}ms, "
+                f"p99 {percentile(latencies, 99) * 1000:.1f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Post recorded updates to the bot webhook to measure its throughput")
+    parser.add_argument('updates', help="JSON file with the recorded updates (getUpdates result or one per line)")
+    parser.add_argument('--url', default='http://127.0.0.1:8443/telegram', help="Webhook URL")
+    parser.add_argument('--secret', default=None, help="Secret token set in DND_WEBHOOK_SECRET")
+    parser.add_argument('--repeat', type=int, default=1, help="How many times every update is posted")
+    parser.add_argument('--concurrency', type=int, default=40, help="Maximum number of concurrent requests")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    updates = load_updates(args.updates)
+    if not updates:
+        parser.error(f"No updates found in {args.updates}")
+
+    asyncio.run(post_updates(args.url, updates, args.repeat, args.concurrency, args.secret))
+
+
+if __name__ == '__main__':
+    main()
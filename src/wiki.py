@@ -14,10 +14,11 @@ from model.Alignment import Alignment
 from model.Condition import Condition
 from model.DamageType import DamageType
 from model.models import GraphQLBaseModel
+from render_cache import RENDER_CACHE, RenderedPage
 from src.class_submenus import CLASS_SUBMENU
 from src.equipment_categories_submenus import EQUIPMENT_CATEGORIES_SUBMENU
-from util import format_camel_case_to_title, chunk_list, generate_resource_list_keyboard, split_text_into_chunks, \
-    async_graphql_query
+from util import format_camel_case_to_title, chunk_list, generate_resource_list_keyboard, split_html_text, \
+    send_text_chunks, async_graphql_query
 
 logger = logging.getLogger(__name__)
 
@@ -136,6 +137,39 @@ def process_keyboard_by_category(category: str, class_: Union[APIResource, Graph
         return []
 
 
+def render_page(category: str, resource: Union[APIResource, GraphQLBaseModel], parse_mode: str) -> RenderedPage:
+    """
+    Render a resource into a page ready to be sent, splitting its text into Telegram sized chunks.
+
+    Args:
+        category (str): The category of the resource.
+        resource (Union[APIResource, GraphQLBaseModel]): The parsed resource.
+        parse_mode (str): The parse mode of the text.
+
+    Returns:
+        RenderedPage: The rendered page.
+    """
+    details = str(resource)
+    keyboard = process_keyboard_by_category(category, resource)
+
+    return RenderedPage(text=details,
+                        chunks=split_html_text(details),
+                        parse_mode=parse_mode,
+                        reply_markup=InlineKeyboardMarkup(keyboard) if keyboard else None,
+                        image=getattr(resource, 'image', None))
+
+
+async def send_page(query, update: Update, page: RenderedPage) -> None:
+    """Show a rendered page editing the menu message, or with new messages if it's too long or has an image."""
+    await query.answer()
+
+    if len(page.chunks) == 1 and not page.image:
+        await query.edit_message_text(page.text, parse_mode=page.parse_mode, reply_markup=page.reply_markup)
+    else:
+        await send_text_chunks(page.chunks, update, reply_markup=page.reply_markup, image=page.image,
+                               parse_mode=page.parse_mode)
+
+
 async def wiki_main_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     if update.callback_query:
         query = update.callback_query
@@ -272,21 +306,15 @@ async def handle_pagination(query, context, direction):
 
 async def handle_standard_category(query, update, category, path):
     """Handle standard categories."""
-    async with DndService() as dnd_service:
-        resource_details = await dnd_service.get_resource_detail(f"{category}/{path}")
-
-    resource = parse_resource(category, resource_details)
-    details = str(resource)
-
-    keyboard = process_keyboard_by_category(category, resource)
-    reply_markup = InlineKeyboardMarkup(keyboard) if keyboard else None
+    page = RENDER_CACHE.get(category, path, ParseMode.HTML)
+    if page is None:
+        async with DndService() as dnd_service:
+            resource_details = await dnd_service.get_resource_detail(f"{category}/{path}")
 
-    await query.answer()
+        resource = parse_resource(category, resource_details)
+        page = RENDER_CACHE.set(category, path, render_page(category, resource, ParseMode.HTML))
 
-    if len(details) <= 4096:
-        await query.edit_message_text(details, parse_mode=ParseMode.HTML, reply_markup=reply_markup)
-    else:
-        await split_text_into_chunks(details, update, reply_markup=reply_markup)
+    await send_page(query, update, page)
 
 
 async def handle_not_standard_category(query, context, resource_details):
@@ -311,23 +339,18 @@ async def handle_graphql_category(query, update, category, data):
         variables = {'index': data.split('/')[3]}
     else:
         variables = {'index': data.split('/')[1]}
-    resource_details = await async_graphql_query(GRAPHQL_ENDPOINT, CATEGORY_TO_QUERY_MAP[category], variables=variables)
-    key = list(resource_details.keys())[0]
-    resource = parse_resource(category, resource_details, key)
-    details = str(resource)
-
-    keyboard = process_keyboard_by_category(category, resource)
-    reply_markup = InlineKeyboardMarkup(keyboard) if keyboard else None
-
-    await query.answer()
 
     parse_mode = ParseMode.HTML if category in HTML_PARSING_CATEGORIES else ParseMode.MARKDOWN
 
-    if len(details) > 4096 or hasattr(resource, 'image'):
-        await split_text_into_chunks(details, update, reply_markup=reply_markup, parse_mode=parse_mode,
-                                     image=getattr(resource, 'image', None))
-    else:
-        await query.edit_message_text(details, parse_mode=parse_mode, reply_markup=reply_markup)
+    page = RENDER_CACHE.get(category, variables['index'], parse_mode)
+    if page is None:
+        resource_details = await async_graphql_query(GRAPHQL_ENDPOINT, CATEGORY_TO_QUERY_MAP[category],
+                                                     variables=variables)
+        key = list(resource_details.keys())[0]
+        resource = parse_resource(category, resource_details, key)
+        page = RENDER_CACHE.set(category, variables['index'], render_page(category, resource, parse_mode))
+
+    await send_page(query, update, page)
 
 
 async def details_menu_buttons_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -352,20 +375,15 @@ async def details_menu_buttons_query_handler(update: Update, context: ContextTyp
     else:
         category = data.split('/')[2]
         if category not in GRAPHQL_CATEOGRIES:
-            async with DndService() as dnd_service:
-                resource_details = await dnd_service.get_resource_by_class_resource(data)
-            resource = parse_resource(category, resource_details)
-
-            await query.answer()
-
-            details = str(resource)
-            keyboard = process_keyboard_by_category(category, resource)
-            reply_markup = InlineKeyboardMarkup(keyboard) if keyboard else None
-
-            if len(details) <= 4096:
-                await query.edit_message_text(details, parse_mode=ParseMode.HTML, reply_markup=reply_markup)
-            else:
-                await split_text_into_chunks(details, update, reply_markup=reply_markup)
+            path = data.split('/', 3)[3]
+            page = RENDER_CACHE.get(category, path, ParseMode.HTML)
+            if page is None:
+                async with DndService() as dnd_service:
+                    resource_details = await dnd_service.get_resource_by_class_resource(data)
+                resource = parse_resource(category, resource_details)
+                page = RENDER_CACHE.set(category, path, render_page(category, resource, ParseMode.HTML))
+
+            await send_page(query, update, page)
         else:
             await handle_graphql_category(query, update, category, data)
 